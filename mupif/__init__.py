@@ -107,6 +107,7 @@ from .units import Q
 #
 from .apierror import APIError
 from .bbox import BBox
+from .bvh import LinearBVH
 from .cell import Cell, Triangle_2d_lin, Triangle_2d_quad, Quad_2d_lin, Tetrahedron_3d_lin, Brick_3d_lin
 from .constantfield import ConstantField
 from .dataid import DataID
@@ -153,7 +154,7 @@ from . import monitor
 
 
 
-__all__ = ['U','Q','apierror','BareData','APIError','bbox','BBox','cell','BareData','Cell','Triangle_2d_lin','Triangle_2d_quad','Quad_2d_lin','Tetrahedron_3d_lin','Brick_3d_lin','cellgeometrytype','constantfield','ConstantField','data','dataid','DataID','baredata','NumpyArray','ObjectBase','BareData','field','FieldType','Field','function','Function','heavydata','HeavyDataBase','HeavyStruct','Hdf5RefQuantity','Hdf5OwningRefQuantity','HeavyUnstructuredMesh','integrationrule','IntegrationRule','GaussIntegrationRule','modelserverbase','ModelServerException','ModelServerNoResourcesException','ModelServerBase','RemoteModelServer','localizer','Localizer','mesh','MeshIterator','Mesh','UnstructuredMesh','metadatakeys','model','Model','RemoteModel','data','WithMetadata','Data','DataList','mupifquantity','ValueType','MupifQuantity','octree','Octant_py','Octree','operatorutil','OperatorInteraction','OperatorEMailInteraction','particle','Particle','ParticleSet','property','Property','ConstantProperty','stringproperty','String','pyrofile','PyroFile','pyroutil','Quantity','remoteapprecord','RemoteAppRecord','modelserver','ModelServer','TemporalProperty','timer','Timer','timestep','TimeStep','units','UnitProxy','util','vertex','BareData','Vertex','workflow','Workflow','workflowmonitor','lookuptable','LookupTable','MemoryLookupTable','multipiecewiselinfunction','MultiPiecewiseLinFunction','piecewiselinfunction','PiecewiseLinFunction','pbs_tool','hpc_tool','pyrolog','TemporalField','DirTemporalField','SingleFileTemporalField','dbrec','DbDictable','monitor','WithMetadata','Data','Process','DataList','Utility','RefQuantity','FieldBase','HeavyConvertible']
+__all__ = ['U','Q','apierror','BareData','APIError','bbox','BBox','bvh','LinearBVH','parallel','cell','BareData','Cell','Triangle_2d_lin','Triangle_2d_quad','Quad_2d_lin','Tetrahedron_3d_lin','Brick_3d_lin','cellgeometrytype','constantfield','ConstantField','data','dataid','DataID','baredata','NumpyArray','ObjectBase','BareData','field','FieldType','Field','function','Function','heavydata','HeavyDataBase','HeavyStruct','Hdf5RefQuantity','Hdf5OwningRefQuantity','HeavyUnstructuredMesh','integrationrule','IntegrationRule','GaussIntegrationRule','modelserverbase','ModelServerException','ModelServerNoResourcesException','ModelServerBase','RemoteModelServer','localizer','Localizer','mesh','MeshIterator','Mesh','UnstructuredMesh','metadatakeys','model','Model','RemoteModel','data','WithMetadata','Data','DataList','mupifquantity','ValueType','MupifQuantity','octree','Octant_py','Octree','operatorutil','OperatorInteraction','OperatorEMailInteraction','particle','Particle','ParticleSet','property','Property','ConstantProperty','stringproperty','String','pyrofile','PyroFile','pyroutil','Quantity','remoteapprecord','RemoteAppRecord','modelserver','ModelServer','TemporalProperty','timer','Timer','timestep','TimeStep','units','UnitProxy','util','vertex','BareData','Vertex','workflow','Workflow','workflowmonitor','lookuptable','LookupTable','MemoryLookupTable','multipiecewiselinfunction','MultiPiecewiseLinFunction','piecewiselinfunction','PiecewiseLinFunction','pbs_tool','hpc_tool','pyrolog','TemporalField','DirTemporalField','SingleFileTemporalField','dbrec','DbDictable','monitor','WithMetadata','Data','Process','DataList','Utility','RefQuantity','FieldBase','HeavyConvertible']
 
 # importing those modules would trigger warning, skip it here
 with warnings.catch_warnings():
@@ -201,8 +202,8 @@ def _registerOther():
         Pyro5.api.register_dict_to_class(c.__module__+'.'+c.__name__, baredata.enum_from_dict_with_name)
 
     # don't use numpy.ndarray.tobytes as it is not cross-plaform; npy files are
-    Pyro5.api.register_class_to_dict(numpy.ndarray, lambda arr: {'__class__': 'numpy.ndarray', 'npy': (numpy.save(buf := io.BytesIO(), arr, allow_pickle=False), buf.getvalue())[1]})
-    Pyro5.api.register_dict_to_class('numpy.ndarray', lambda name, dic: numpy.load(io.BytesIO(serpent.tobytes(buf) if isinstance(buf := dic['npy'], dict) else buf), allow_pickle=False))
+    Pyro5.api.register_class_to_dict(numpy.ndarray, baredata.ndarray_to_dict)
+    Pyro5.api.register_dict_to_class('numpy.ndarray', lambda name, dic: baredata.ndarray_from_dict(dic))
 
     def _tryExpose(f):
         if daemon := getattr(f, '_pyroDaemon'):
@@ -231,6 +232,7 @@ def _registerOther():
 
 def _pyroMonkeyPatch():
     import Pyro5.api
+    import Pyro5.callcontext
     # workaround for https://github.com/irmen/Pyro5/issues/44
     if not hasattr(Pyro5.api.Proxy, '__len__'):
         Pyro5.api.Proxy.__bool__: lambda self: True
@@ -240,6 +242,19 @@ def _pyroMonkeyPatch():
         Pyro5.api.Proxy.__delitem__ = lambda self, index: self.__getattr__('__delitem__')(index)
         # Pyro5.api.Proxy.__enter__ = lambda self: self.__getattr__('__enter__')()
         # Pyro5.api.Proxy.__exit__ = lambda self,exc_type,exc_value,traceback: self.__getattr__('__exit__')(exc_type,exc_value,traceback)
+
+    # announce that binary arrays are accepted in replies (see baredata.binaryArraysAccepted)
+    # the annotation is added only for the duration of the call, as the context may belong to a call being served in this thread
+    if not hasattr(Pyro5.api.Proxy, '_mupifPyroInvoke'):
+        Pyro5.api.Proxy._mupifPyroInvoke = Pyro5.api.Proxy._pyroInvoke
+        def _pyroInvoke(self, *args, **kw):
+            ctx = Pyro5.callcontext.current_context
+            ann = ctx.annotations
+            if baredata.binaryArraysAnnotation in ann: return self._mupifPyroInvoke(*args, **kw)
+            ctx.annotations = {**ann, baredata.binaryArraysAnnotation: b'1'}
+            try: return self._mupifPyroInvoke(*args, **kw)
+            finally: ctx.annotations = ann
+        Pyro5.api.Proxy._pyroInvoke = _pyroInvoke
     
 
 # register all baredata types
@@ -7,7 +7,11 @@ import typing
 import numpy
 import numpy as np
 import Pyro5.api
+import Pyro5.callcontext
 import sys
+import io
+import os
+import functools
 
 import pydantic
 import pydantic_core
@@ -63,6 +67,60 @@ else:
         NumpyArrayFloat64 = NumpyArray
 
 
+#: use binary (npy) encoding of arrays in :obj:`BareData.to_dict` where the receiver supports it (see :obj:`binaryArraysAccepted`)
+useBinaryArrays = True
+#: Pyro annotation (sent by the client with every call) announcing that binary-encoded arrays are accepted in replies
+binaryArraysAnnotation = 'MNPY'
+
+
+def binaryArraysAccepted():
+    '''
+    Tell whether arrays may be dumped in binary form in the current context. This is only the case inside a Pyro call whose client announced support via :obj:`binaryArraysAnnotation` (older clients only understand the list format); local dumps (which might be stored as JSON) use the list format.
+    '''
+    if not useBinaryArrays: return False
+    ctx = Pyro5.callcontext.current_context
+    return ctx.client is not None and binaryArraysAnnotation in ctx.annotations
+
+
+#: "trusted fast mode": skip argument validation in methods decorated with :obj:`validateCall`, except when called by the Pyro daemon directly (i.e. as public entry point of a remote call); initialized from the ``MUPIF_TRUSTED`` environment variable, can be changed at runtime
+trustedMode = os.environ.get('MUPIF_TRUSTED', '0') not in ('', '0')
+
+
+def validateCall(func=None, /, **kw):
+    '''
+    Decorator equivalent to ``pydantic.validate_call`` (with the same keyword arguments), used on frequently called methods. When :obj:`trustedMode` is set, the call goes directly to the undecorated function, unless it is called by the Pyro daemon itself (public entry point, where arguments come from untrusted and possibly differently-typed serialized data); internal calls made while serving a remote call are not validated.
+    '''
+    def decorator(f):
+        validated = pydantic.validate_call(f, **kw)
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if trustedMode and sys._getframe(1).f_globals.get('__name__') != 'Pyro5.server':
+                return f(*args, **kwargs)
+            return validated(*args, **kwargs)
+        return wrapper
+    return decorator if func is None else decorator(func)
+
+
+def ndarray_to_dict(arr, binary=True):
+    '''
+    Dump numpy array to dictionary, either as npy-formatted buffer (``binary=True``, cross-platform and about the size of the data) or as nested list. Arrays with object dtype are always dumped as list.
+    '''
+    if binary and not arr.dtype.hasobject:
+        numpy.save(buf := io.BytesIO(), arr, allow_pickle=False)
+        return {'__class__': 'numpy.ndarray', 'npy': buf.getvalue()}
+    return {'__class__': 'numpy.ndarray', 'arr': arr.tolist(), 'dtype': str(arr.dtype)}
+
+
+def ndarray_from_dict(dic):
+    'Reconstruct numpy array dumped with :obj:`ndarray_to_dict`, in either format.'
+    if 'npy' in dic:
+        buf = dic['npy']
+        if isinstance(buf, dict): buf = serpent.tobytes(buf)  # serpent serializes bytes in a funny way
+        return numpy.load(io.BytesIO(buf), allow_pickle=False)
+    return numpy.array(dic['arr'], dtype=dic['dtype'])
+
+
 def addPydanticInstanceValidator(klass, makeKlass=None):
     def klass_validate(v):
         if isinstance(v, klass): return v
@@ -133,15 +191,20 @@ class BareData(ObjectBase):
         'No-op in BareData. Reimplement in derived classes which need special care before being serialized.'
         pass
 
-    def to_dict(self, clss=None):
+    def to_dict(self, clss=None, binaryArrays=None):
+        '''
+        Dump the instance to dictionary (recursively).
+
+        :param binaryArrays: dump numpy arrays in binary form (see :obj:`ndarray_to_dict`); if None, determined by :obj:`binaryArraysAccepted`.
+        '''
         def _handle_attr(attr, val, clssName):
             if isinstance(val, list): return [_handle_attr('%s[%d]' % (attr, i), v, clssName) for i, v in enumerate(val)]
             elif isinstance(val, tuple): return tuple([_handle_attr('%s[%d]' % (attr, i), v, clssName) for i, v in enumerate(val)])
             elif isinstance(val, dict): return dict([(k, _handle_attr('%s[%s]' % (attr, k), v, clssName)) for k, v in val.items()])
-            elif isinstance(val, BareData): return val.to_dict()
+            elif isinstance(val, BareData): return val.to_dict(binaryArrays=binaryArrays)
             elif isinstance(val, enum.Enum): return enum_to_dict(val)
             # explicitly don't handle subtypes
-            elif type(val) == numpy.ndarray: return {'__class__': 'numpy.ndarray', 'arr': val.tolist(), 'dtype': str(val.dtype)}
+            elif type(val) == numpy.ndarray: return ndarray_to_dict(val, binary=binaryArrays)
             elif astropy and isinstance(val, astropy.units.UnitBase): return {'__class__': 'astropy.units.Unit', 'unit': val.to_string()}
             elif astropy and isinstance(val, astropy.units.Quantity):
                 return {
@@ -155,6 +218,7 @@ class BareData(ObjectBase):
                 return val
         import enum
         if not isinstance(self, BareData): raise RuntimeError("Not a BareData.");
+        if binaryArrays is None: binaryArrays = binaryArraysAccepted()
         self.preDumpHook()
         ret = {}
         if clss is None:
@@ -175,7 +239,7 @@ class BareData(ObjectBase):
         if clss != BareData:
             for base in clss.__bases__:
                 if issubclass(base, BareData):
-                    ret.update(base.to_dict(self, clss=base))
+                    ret.update(base.to_dict(self, clss=base, binaryArrays=binaryArrays))
                 else:
                     pass
         return ret
@@ -187,6 +251,8 @@ class BareData(ObjectBase):
         This abuses the in-band transfer of types in Pyro serializers, thus returning the dictionary with appropriate keys (`__class__` in particular) will automatically deserialize it into an object on the other (local) side of the wire.
 
         This method does some check whether the object is exposed via Pyro (thus presumable accessed via a Proxy). This cannot be detected reliably, however, thus calling `copyRemote()` on local (unproxied) object will return dictionary rather than a copy of the object.
+
+        Arrays are transferred in binary form if the client supports it (see :obj:`binaryArraysAccepted`).
         """
         # daemon = getattr(self, '_pyroDaemon', None)
         # if not daemon:
@@ -195,7 +261,7 @@ class BareData(ObjectBase):
         return self.to_dict()
 
     def deepcopy(self):
-        if Pyro5.callcontext.current_context.client is None: return BareData.from_dict(self.to_dict())
+        if Pyro5.callcontext.current_context.client is None: return BareData.from_dict(self.to_dict(binaryArrays=useBinaryArrays))
         else: return self.to_dict()
         # return BareData.from_dict(self.to_dict())
 
@@ -223,7 +289,7 @@ class BareData(ObjectBase):
                 return astropy.units.Quantity(BareData.from_dict(dic['value']), astropy.units.Unit(dic['unit']))
             if issubclass(clss, numpy.ndarray):
                 if clss != numpy.ndarray: raise RuntimeError('Subclass of numpy.ndarray %s.%s not handled.' % (mod, classname))
-                return numpy.array(dic['arr'], dtype=dic['dtype'])
+                return ndarray_from_dict(dic)
             if issubclass(clss, pydantic.BaseModel): pass
             # print('here D')
             obj = clss.__new__(clss)
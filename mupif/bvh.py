@@ -0,0 +1,313 @@
+#
+#           MuPIF: Multi-Physics Integration Framework
+#               Copyright (C) 2010-2015 Borek Patzak
+#
+#    Czech Technical University, Faculty of Civil Engineering,
+#  Department of Structural Mechanics, 166 29 Prague, Czech Republic
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA  02110-1301  USA
+#
+from . import bbox
+from . import localizer
+import Pyro5.api
+import numpy as np
+import logging
+
+log = logging.getLogger(__name__)
+
+# default maximum number of items in leaf nodes
+defaultLeafSize = 8
+# batched queries are processed in chunks of this many boxes (limits memory of intermediate arrays)
+queryChunk = 2**16
+# number of bits per axis in Morton codes, by space dimension
+mortonBits = {1: 63, 2: 32, 3: 21}
+# arrays making up the hierarchy (as stored by LinearBVH.toHdf5Group)
+_bvhArrays = ('items', 'itemLo', 'itemHi', 'nodeLo', 'nodeHi', 'nodeItems', 'nodeChildren')
+
+
+def _spreadBits(x, dim):
+    """
+    Insert dim-1 zero bits between bits of x (uint64 array), so that codes for separate axes can be interleaved.
+    """
+    x = x.astype(np.uint64)
+    if dim == 1:
+        return x
+    if dim == 2:
+        x &= np.uint64(0xffffffff)
+        for shift, mask in ((16, 0x0000ffff0000ffff), (8, 0x00ff00ff00ff00ff), (4, 0x0f0f0f0f0f0f0f0f), (2, 0x3333333333333333), (1, 0x5555555555555555)):
+            x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+        return x
+    if dim == 3:
+        x &= np.uint64(0x1fffff)
+        for shift, mask in ((32, 0x1f00000000ffff), (16, 0x1f0000ff0000ff), (8, 0x100f00f00f00f00f), (4, 0x10c30c30c30c30c3), (2, 0x1249249249249249)):
+            x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+        return x
+    raise ValueError(f'Dimension must be 1, 2 or 3 (not {dim}).')
+
+
+def mortonCodes(points, lo, hi):
+    """
+    Compute Morton (Z-order) codes of points, after quantizing them within the box given by *lo* and *hi*.
+
+    :param numpy.ndarray points: (N,dim) array of coordinates
+    :param numpy.ndarray lo: (dim,) lower corner of the domain
+    :param numpy.ndarray hi: (dim,) upper corner of the domain
+    :return: (N,) array of codes
+    :rtype: numpy.ndarray (uint64)
+    """
+    dim = points.shape[1]
+    bits = mortonBits[dim]
+    span = np.asarray(hi, dtype=np.float64)-np.asarray(lo, dtype=np.float64)
+    span[span <= 0] = 1.
+    q = np.clip((points-lo)/span, 0., 1.)*float(2**bits-1)
+    ret = np.zeros(points.shape[0], dtype=np.uint64)
+    for d in range(dim):
+        ret |= _spreadBits(q[:, d].astype(np.uint64), dim) << np.uint64(d)
+    return ret
+
+
+def _expandRanges(begin, end):
+    """
+    Expand ranges [begin,end) into concatenated indices.
+
+    :return: (owner,index), where *owner* is the position of the range in *begin*/*end* for each index.
+    """
+    cnt = end-begin
+    owner = np.repeat(np.arange(begin.shape[0]), cnt)
+    first = np.cumsum(cnt)-cnt
+    return owner, np.arange(owner.shape[0])-first[owner]+begin[owner]
+
+
+def _rangeReduce(ufunc, a, begin, end):
+    """
+    Reduce rows of *a* over disjoint non-empty ranges [begin,end) (in any order).
+    """
+    if begin.shape[0] == 0:
+        return np.zeros((0,)+a.shape[1:], dtype=a.dtype)
+    # reduceat needs all indices inside *a*; only the last of sorted ranges may end at its end
+    order = np.argsort(begin, kind='stable')
+    idx = np.stack((begin[order], end[order]), axis=1).ravel()
+    if idx[-1] >= a.shape[0]:
+        idx = idx[:-1]
+    ret = np.empty((begin.shape[0],)+a.shape[1:], dtype=a.dtype)
+    ret[order] = ufunc.reduceat(a, idx, axis=0)[::2]
+    return ret
+
+
+def _datasetArray(ds, mmap):
+    """
+    Return contents of HDF5 dataset as numpy array; memory-mapped (read-only) if possible (contiguous storage in an on-disk file), read into memory otherwise.
+    """
+    if mmap and ds.size > 0 and ds.file.driver in ('sec2', 'stdio'):
+        offset = ds.id.get_offset()
+        if offset is not None:
+            return np.memmap(ds.file.filename, mode='r', dtype=ds.dtype, shape=ds.shape, offset=offset)
+    return ds[()]
+
+
+def _boxesIntersect(lo1, hi1, lo2, hi2):
+    'Row-wise test of box intersection, with the same semantics as :obj:`BBox.intersects` (touching boxes intersect).'
+    return np.all(lo1 <= hi2, axis=1) & np.all(lo2 <= hi1, axis=1)
+
+
+@Pyro5.api.expose
+class LinearBVH(localizer.Localizer):
+    """
+    Bounding volume hierarchy stored in flat numpy arrays. Items (given by their bounding boxes) are sorted along the Morton (Z-order) curve of their centers; each node then holds a contiguous range of sorted items sharing the same Morton code prefix, i.e. items whose centers lie in the same cell of an (implicit) octree. Nodes are split by successive prefix bits until they contain at most *leafSize* items; splits which would create a single child are skipped. The tree is built depth-by-depth with vectorized operations, without creating any per-item python objects.
+
+    Nodes are stored root-first (the root is node 0), in the order of creation:
+
+    * nodeLo, nodeHi: (M,dim) node bounding boxes
+    * nodeItems: (M,2) ranges of (sorted) items contained in each node
+    * nodeChildren: (M,2) ranges of children nodes (empty for leaves)
+    * items: original item numbers in Morton order, with their bounding boxes in itemLo, itemHi
+
+    Items are integers (positions in the bounding box array passed to the constructor). The structure is static: it cannot be modified once built.
+
+    .. automethod:: __init__
+    """
+
+    def __init__(self, bboxes, leafSize=None):
+        """
+        Build the hierarchy from bounding boxes of all items.
+
+        :param numpy.ndarray bboxes: (N,2,dim) array, where bboxes[i,0] and bboxes[i,1] are the lower-left and upper-right corners of the i-th item
+        :param int leafSize: maximum number of items in leaf nodes (module default if not given); leaves may be larger only if items have identical codes
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float64)
+        if bboxes.ndim != 3 or bboxes.shape[1] != 2 or bboxes.shape[2] not in mortonBits:
+            raise ValueError(f'bboxes must have shape (N,2,dim) with dim 1, 2 or 3 (not {bboxes.shape}).')
+        leafSize = leafSize or defaultLeafSize
+        n, self.dim = bboxes.shape[0], bboxes.shape[2]
+        lo, hi = bboxes[:, 0, :], bboxes[:, 1, :]
+        if n == 0:
+            self.items = np.zeros((0,), dtype=np.int64)
+            self.itemLo, self.itemHi = lo, hi
+            self.nodeLo, self.nodeHi = lo, hi
+            self.nodeItems = self.nodeChildren = np.zeros((0, 2), dtype=np.int64)
+            return
+        codes = mortonCodes(.5*(lo+hi), lo.min(axis=0), hi.max(axis=0))
+        self.items = np.argsort(codes, kind='stable').astype(np.int64)
+        codes = codes[self.items]
+        self.itemLo, self.itemHi = lo[self.items], hi[self.items]
+        # per-depth arrays, concatenated at the end
+        nodeLo, nodeHi, nodeItems = [self.itemLo.min(axis=0)[None, :]], [self.itemHi.max(axis=0)[None, :]], [np.array([[0, n]], dtype=np.int64)]
+        parents, children = [], []
+        nNodes = 1
+        active = np.array([0] if n > leafSize else [], dtype=np.int64)
+        activeItems = nodeItems[0][:len(active)]
+        bits = mortonBits[self.dim]
+        for depth in range(1, bits+1):
+            if active.shape[0] == 0:
+                break
+            owner, idx = _expandRanges(activeItems[:, 0], activeItems[:, 1])
+            prefix = codes[idx] >> np.uint64(self.dim*(bits-depth))
+            # split active ranges where the prefix changes
+            start = np.ones(idx.shape[0], dtype=bool)
+            start[1:] = (prefix[1:] != prefix[:-1]) | (owner[1:] != owner[:-1])
+            segPos = np.nonzero(start)[0]
+            segOwner = owner[segPos]
+            segItems = np.stack((idx[segPos], np.append(idx[segPos[1:]-1]+1, idx[-1]+1)), axis=1)
+            split = np.bincount(segOwner, minlength=active.shape[0]) > 1
+            new = split[segOwner]
+            segOwner, segItems = segOwner[new], segItems[new]
+            newIds = nNodes+np.arange(segItems.shape[0], dtype=np.int64)
+            nNodes += segItems.shape[0]
+            nodeItems.append(segItems)
+            nodeLo.append(_rangeReduce(np.minimum, self.itemLo, segItems[:, 0], segItems[:, 1]))
+            nodeHi.append(_rangeReduce(np.maximum, self.itemHi, segItems[:, 0], segItems[:, 1]))
+            # children of each split node are consecutive
+            first = np.searchsorted(segOwner, np.nonzero(split)[0])
+            parents.append(active[split])
+            children.append(np.stack((newIds[first], newIds[first]+np.bincount(segOwner, minlength=active.shape[0])[split]), axis=1))
+            # nodes not split at this depth stay active
+            big = (segItems[:, 1]-segItems[:, 0]) > leafSize
+            active = np.concatenate((active[~split], newIds[big]))
+            activeItems = np.concatenate((activeItems[~split], segItems[big]))
+        self.nodeLo, self.nodeHi, self.nodeItems = np.concatenate(nodeLo), np.concatenate(nodeHi), np.concatenate(nodeItems)
+        self.nodeChildren = np.zeros((nNodes, 2), dtype=np.int64)
+        if parents:
+            self.nodeChildren[np.concatenate(parents)] = np.concatenate(children)
+        log.debug(f'LinearBVH: {n} items, {nNodes} nodes.')
+
+    def toHdf5Group(self, group):
+        """
+        Store the hierarchy in the given HDF5 group. Datasets are contiguous and uncompressed, so that :obj:`makeFromHdf5group` can memory-map them.
+
+        :param h5py.Group group: (empty) group to store the data in
+        """
+        for name in _bvhArrays:
+            group.create_dataset(name, data=getattr(self, name))
+        group.attrs['dim'] = self.dim
+        group.attrs['__class__'] = self.__class__.__name__
+        group.attrs['__module__'] = self.__class__.__module__
+
+    @staticmethod
+    def makeFromHdf5group(h5grp, mmap=True):
+        """
+        Create new :obj:`LinearBVH` from data written by :obj:`toHdf5Group`, without rebuilding it.
+
+        :param h5py.Group h5grp: group with stored data
+        :param bool mmap: memory-map arrays from the file rather than reading them (only possible for files on disk); the arrays stay valid after the file is closed
+        :return: new instance
+        :rtype: LinearBVH
+        """
+        for name in _bvhArrays:
+            if name not in h5grp: raise IOError(f'{h5grp.file.filename}::{h5grp.name}: {name} is missing')
+        ret = LinearBVH.__new__(LinearBVH)  # bypass building in __init__
+        ret.dim = int(h5grp.attrs['dim'])
+        for name in _bvhArrays:
+            setattr(ret, name, _datasetArray(h5grp[name], mmap=mmap))
+        return ret
+
+    def insert(self, item, bbox=None):
+        """
+        Not supported, :obj:`LinearBVH` is built in bulk; create a new instance instead.
+        """
+        raise NotImplementedError('LinearBVH is static, build a new instance instead of inserting items.')
+
+    def delete(self, item):
+        """
+        Not supported, :obj:`LinearBVH` is built in bulk; create a new instance instead.
+        """
+        raise NotImplementedError('LinearBVH is static, build a new instance instead of deleting items.')
+
+    def getItemsInBBox(self, bbox: bbox.BBox):
+        """
+        See :obj:`Localizer.getItemsInBBox`.
+
+        :return: numbers of items which intersect the bounding box
+        :rtype: set
+        """
+        offsets, items = self.getItemsInBBoxBatch(np.array([bbox.coords_ll], dtype=np.float64), np.array([bbox.coords_ur], dtype=np.float64))
+        return set(items.tolist())
+
+    def getItemsInBBoxBatch(self, coords_ll, coords_ur):
+        """
+        See :obj:`Localizer.getItemsInBBoxBatch`. All boxes traverse the tree together, one level per step; nodes fully enclosed in the query box are accepted as a whole without descending further. Items of each box are sorted.
+        """
+        coords_ll = np.asarray(coords_ll, dtype=np.float64)
+        coords_ur = np.asarray(coords_ur, dtype=np.float64)
+        if coords_ll.ndim != 2 or coords_ll.shape != coords_ur.shape:
+            raise ValueError(f'coords_ll and coords_ur must be (N,dim) arrays of the same shape (not {coords_ll.shape} and {coords_ur.shape}).')
+        nq = coords_ll.shape[0]
+        if nq > 0 and coords_ll.shape[1] != self.dim:
+            raise ValueError(f'Query dimension {coords_ll.shape[1]} does not match localizer dimension {self.dim}.')
+        if nq == 0 or self.items.shape[0] == 0:
+            return np.zeros((nq+1,), dtype=np.int64), np.zeros((0,), dtype=np.int64)
+        qq, ii = [], []
+        for q0 in range(0, nq, queryChunk):
+            q, i = self._queryChunk(coords_ll[q0:q0+queryChunk], coords_ur[q0:q0+queryChunk])
+            qq.append(q+q0)
+            ii.append(i)
+        q, items = np.concatenate(qq), np.concatenate(ii)
+        order = np.lexsort((items, q))
+        offsets = np.zeros((nq+1,), dtype=np.int64)
+        np.cumsum(np.bincount(q, minlength=nq), out=offsets[1:])
+        return offsets, items[order]
+
+    def _queryChunk(self, qLo, qHi):
+        """
+        Traverse the tree for all query boxes.
+
+        :return: (queries,items) pairs (unsorted)
+        """
+        qi = np.arange(qLo.shape[0], dtype=np.int64)
+        nd = np.zeros(qLo.shape[0], dtype=np.int64)
+        accQ, accItems = [], []
+        # (query,leaf) pairs where leaf items must be tested one by one
+        leafQ, leafNd = [], []
+        while qi.shape[0] > 0:
+            hit = _boxesIntersect(self.nodeLo[nd], self.nodeHi[nd], qLo[qi], qHi[qi])
+            qi, nd = qi[hit], nd[hit]
+            # nodes fully inside the query box: take all their items
+            inside = np.all(qLo[qi] <= self.nodeLo[nd], axis=1) & np.all(self.nodeHi[nd] <= qHi[qi], axis=1)
+            accQ.append(qi[inside])
+            accItems.append(self.nodeItems[nd[inside]])
+            qi, nd = qi[~inside], nd[~inside]
+            leaf = self.nodeChildren[nd, 0] == self.nodeChildren[nd, 1]
+            leafQ.append(qi[leaf])
+            leafNd.append(nd[leaf])
+            qi, nd = qi[~leaf], nd[~leaf]
+            owner, nd = _expandRanges(self.nodeChildren[nd, 0], self.nodeChildren[nd, 1])
+            qi = qi[owner]
+        nd = np.concatenate(leafNd)
+        owner, it = _expandRanges(self.nodeItems[nd, 0], self.nodeItems[nd, 1])
+        qi = np.concatenate(leafQ)[owner]
+        hit = _boxesIntersect(self.itemLo[it], self.itemHi[it], qLo[qi], qHi[qi])
+        accItems = np.concatenate(accItems)
+        owner, acc = _expandRanges(accItems[:, 0], accItems[:, 1])
+        return np.concatenate((np.concatenate(accQ)[owner], qi[hit])), self.items[np.concatenate((acc, it[hit]))]
@@ -41,6 +41,18 @@ tolerance = 0.001
 # cache
 _cell_subclasses = {}
 
+# coefficients of the trilinear mapping of Brick_3d_lin (rows are a1…a8 in Brick_3d_lin.glob2loc)
+_brickGlob2locSigns = np.array([
+    [+1, +1, +1, +1, +1, +1, +1, +1],
+    [-1, -1, +1, +1, -1, -1, +1, +1],
+    [-1, +1, +1, -1, -1, +1, +1, -1],
+    [+1, +1, +1, +1, -1, -1, -1, -1],
+    [+1, -1, +1, -1, +1, -1, +1, -1],
+    [-1, -1, +1, +1, +1, +1, -1, -1],
+    [-1, +1, +1, -1, +1, -1, -1, +1],
+    [+1, -1, +1, -1, -1, +1, -1, +1],
+], dtype=np.float64)
+
 
 @Pyro5.api.expose
 class Cell(baredata.BareData):
@@ -138,6 +150,29 @@ class Cell(baredata.BareData):
         :rtype: tuple
         """
 
+    @classmethod
+    def glob2locBatch(cls, vertexCoords, points):
+        """
+        Vectorized variant of ``glob2loc``, processing many (cell, point) pairs at once. Cells which do not implement this method are handled one-by-one by the caller.
+
+        :param numpy.ndarray vertexCoords: (N,nVerts,dim) array with vertex coordinates of N cells of this geometry type
+        :param numpy.ndarray points: (N,dim) array with global coordinates, one point per cell
+        :return: (inside,lc), where *inside* is (N,) boolean array flagging points inside their cell (within :obj:`tolerance`) and *lc* are local coordinates as (N,nLocal) array
+        :rtype: (numpy.ndarray,numpy.ndarray)
+        """
+        raise NotImplementedError(f'{cls.__name__}.glob2locBatch is not implemented.')
+
+    @classmethod
+    def evalNBatch(cls, lc):
+        """
+        Vectorized evaluation of shape functions.
+
+        :param numpy.ndarray lc: (N,nLocal) array of local coordinates, as returned by :obj:`glob2locBatch`
+        :return: (N,nVerts) array of shape function values
+        :rtype: numpy.ndarray
+        """
+        raise NotImplementedError(f'{cls.__name__}.evalNBatch is not implemented.')
+
     @classmethod
     def getGeometryType(cls):
         """
@@ -323,6 +358,31 @@ class Triangle_2d_lin(Cell):
         """
         return lc[0], lc[1], 1.-lc[0]-lc[1]
 
+    @classmethod
+    def glob2locBatch(cls, vertexCoords, points):
+        """
+        See :obj:`Cell.glob2locBatch`. Local coordinates are area coordinates, as in :obj:`glob2loc`.
+        """
+        x1, y1 = vertexCoords[:, 0, 0], vertexCoords[:, 0, 1]
+        x2, y2 = vertexCoords[:, 1, 0], vertexCoords[:, 1, 1]
+        x3, y3 = vertexCoords[:, 2, 0], vertexCoords[:, 2, 1]
+        xp, yp = points[:, 0], points[:, 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            area2 = x2*y3 + x1*y2 + y1*x3 - x2*y1 - x3*y2 - x1*y3
+            l1 = ((x2*y3 - x3*y2) + (y2 - y3)*xp + (x3 - x2)*yp)/area2
+            l2 = ((x3*y1 - x1*y3) + (y3 - y1)*xp + (x1 - x3)*yp)/area2
+            l3 = ((x1*y2 - x2*y1) + (y1 - y2)*xp + (x2 - x1)*yp)/area2
+            lc = np.column_stack((l1, l2, l3))
+            inside = np.all((lc >= -tolerance) & (lc <= 1.+tolerance), axis=1)
+        return inside, lc
+
+    @classmethod
+    def evalNBatch(cls, lc):
+        """
+        See :obj:`Cell.evalNBatch`.
+        """
+        return np.column_stack((lc[:, 0], lc[:, 1], 1.-lc[:, 0]-lc[:, 1]))
+
 
 @Pyro5.api.expose
 class Triangle_2d_quad(Cell):
@@ -555,6 +615,54 @@ class Triangle_2d_quad(Cell):
         return math.fabs( ( 4 * ( -( x4 * y1 ) + x6 * y1 + x4 * y2 - x5 * y2 + x5 * y3 - x6 * y3 ) + x2 * ( y1 - y3 - 4 * y4 + 4 * y5 ) +
                             x1 * ( -y2 + y3 + 4 * y4 - 4 * y6 ) + x3 * ( -y1 + y2 - 4 * y5 + 4 * y6 ) ) / 6 )
 
+    @classmethod
+    def evalNBatch(cls, lc):
+        """
+        See :obj:`Cell.evalNBatch`.
+        """
+        l1, l2 = lc[:, 0], lc[:, 1]
+        l3 = 1.0-l1-l2
+        return np.column_stack(((2.*l1-1.)*l1, (2.*l2-1.)*l2, (2.*l3-1.)*l3, 4.*l1*l2, 4.*l2*l3, 4.*l3*l1))
+
+    @classmethod
+    def glob2locBatch(cls, vertexCoords, points):
+        """
+        See :obj:`Cell.glob2locBatch`. Newton-Raphson iterations of :obj:`glob2loc` are run for all points simultaneously; points which do not converge are reported as outside.
+        """
+        x, y = vertexCoords[:, :, 0], vertexCoords[:, :, 1]
+        n = points.shape[0]
+        area = np.fabs((4*(-(x[:, 3]*y[:, 0]) + x[:, 5]*y[:, 0] + x[:, 3]*y[:, 1] - x[:, 4]*y[:, 1] + x[:, 4]*y[:, 2] - x[:, 5]*y[:, 2]) +
+                        x[:, 1]*(y[:, 0] - y[:, 2] - 4*y[:, 3] + 4*y[:, 4]) +
+                        x[:, 0]*(-y[:, 1] + y[:, 2] + 4*y[:, 3] - 4*y[:, 5]) +
+                        x[:, 2]*(-y[:, 0] + y[:, 1] - 4*y[:, 4] + 4*y[:, 5]))/6)
+        convergenceLimit = 1.e-6*np.sqrt(area)
+        lc = np.zeros((n, 2))
+        converged = np.zeros(n, dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for nite in range(10):
+                nn = cls.evalNBatch(lc)
+                res = points[:, :2]-np.column_stack((np.sum(nn*x, axis=1), np.sum(nn*y, axis=1)))
+                converged = np.sqrt(np.sum(res**2, axis=1)) < convergenceLimit
+                if converged.all():
+                    break
+                l1, l2 = lc[:, 0], lc[:, 1]
+                l3 = 1.0-l1-l2
+                # derivatives of shape functions, as in _evalDerivatives
+                dn0 = np.column_stack((4.*l1-1., np.zeros(n), -(4.*l3-1.), 4.*l2, -4.*l2, 4.*l3-4.*l1))
+                dn1 = np.column_stack((np.zeros(n), 4.*l2-1., -(4.*l3-1.), 4.*l1, 4.*l3-4.*l2, -4.*l1))
+                j00, j01 = np.sum(dn0*x, axis=1), np.sum(dn0*y, axis=1)
+                j10, j11 = np.sum(dn1*x, axis=1), np.sum(dn1*y, axis=1)
+                # solve jac.T·delta=res (explicit inverse of 2×2 matrix)
+                det = j00*j11-j01*j10
+                d0 = (j11*res[:, 0]-j10*res[:, 1])/det
+                d1 = (-j01*res[:, 0]+j00*res[:, 1])/det
+                upd = ~converged
+                lc[upd, 0] += d0[upd]
+                lc[upd, 1] += d1[upd]
+            lc3 = np.column_stack((lc[:, 0], lc[:, 1], 1.0-lc[:, 0]-lc[:, 1]))
+            inside = converged & np.all((lc3 >= -tolerance) & (lc3 <= 1.0+tolerance), axis=1)
+        return inside, lc3
+
 
 @Pyro5.api.expose
 class Quad_2d_lin(Cell):
@@ -745,6 +853,59 @@ class Quad_2d_lin(Cell):
         (inside, ac) = self.glob2loc(point)
         return inside
 
+    @classmethod
+    def evalNBatch(cls, lc):
+        """
+        See :obj:`Cell.evalNBatch`.
+        """
+        ksi, eta = lc[:, 0], lc[:, 1]
+        return np.column_stack((0.25*(1.+ksi)*(1.+eta), 0.25*(1.-ksi)*(1.+eta), 0.25*(1.-ksi)*(1.-eta), 0.25*(1.+ksi)*(1.-eta)))
+
+    @classmethod
+    def glob2locBatch(cls, vertexCoords, points):
+        """
+        See :obj:`Cell.glob2locBatch`. Follows :obj:`glob2loc` (closed-form solution of the quadratic equation, choosing the root closer to the parametric domain).
+        """
+        x, y = vertexCoords[:, :, 0], vertexCoords[:, :, 1]
+        xp, yp = points[:, 0], points[:, 1]
+        a1 = x[:, 0]+x[:, 1]+x[:, 2]+x[:, 3]
+        a2 = x[:, 0]-x[:, 1]-x[:, 2]+x[:, 3]
+        a3 = x[:, 0]+x[:, 1]-x[:, 2]-x[:, 3]
+        a4 = x[:, 0]-x[:, 1]+x[:, 2]-x[:, 3]
+        b1 = y[:, 0]+y[:, 1]+y[:, 2]+y[:, 3]
+        b2 = y[:, 0]-y[:, 1]-y[:, 2]+y[:, 3]
+        b3 = y[:, 0]+y[:, 1]-y[:, 2]-y[:, 3]
+        b4 = y[:, 0]-y[:, 1]+y[:, 2]-y[:, 3]
+        a = a2*b4-b2*a4
+        b = a1*b4+a2*b3-a3*b2-b1*a4-b4*4.0*xp+a4*4.0*yp
+        c = a1*b3-a3*b1-4.0*xp*b3+4.0*yp*a3
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # roots of the quadratic equation, see util.quadratic_real
+            linear = np.fabs(a) <= 1.e-10
+            t = b/a/2.
+            r = t**2-c/a
+            twoRoots = (~linear) & (r >= 0)
+            hasRoot = twoRoots | (linear & (np.fabs(b) > 1.e-10))
+            y1 = np.sqrt(np.where(twoRoots, r, 0.))
+            ksi1 = np.where(linear, -c/b, y1-t)
+            ksi2 = -y1-t
+
+            def _eta(ksi):
+                denom = b3+ksi*b4
+                return np.where(np.fabs(denom) <= 1.e-10, (4.0*xp-a1-ksi*a2)/(a3+ksi*a4), (4.0*yp-b1-ksi*b2)/denom)
+            eta1, eta2 = _eta(ksi1), _eta(ksi2)
+            degen2 = (np.fabs(b3+ksi2*b4) <= 1.e-10) & ((a3+ksi2*a4) <= 1.e-10)
+            ksi2, eta2 = np.where(degen2, ksi1, ksi2), np.where(degen2, eta1, eta2)
+
+            def _excess(v): return v-np.clip(v, -1., 1.)
+            diff1 = _excess(ksi1)**2+_excess(eta1)**2
+            diff2 = _excess(ksi2)**2+_excess(eta2)**2
+            use2 = twoRoots & (diff1 > diff2)
+            lc = np.column_stack((np.where(use2, ksi2, ksi1), np.where(use2, eta2, eta1)))
+            lc[~hasRoot] = 0.
+            inside = hasRoot & np.all((lc >= -1.-tolerance) & (lc <= 1.+tolerance), axis=1)
+        return inside, lc
+
     def getTransformationJacobian(self, coords):
         """
         Returns the transformation jacobian (the determinant of jacobian) of the receiver
@@ -879,6 +1040,40 @@ class Tetrahedron_3d_lin(Cell):
         ac = self.glob2loc(point)
         return tuple([vertexValues[0][i]*ac[0]+vertexValues[1][i]*ac[1]+vertexValues[2][i]*ac[2]+vertexValues[3][i]*ac[3] for i in range(len(vertexValues[0]))])
 
+    @classmethod
+    def glob2locBatch(cls, vertexCoords, points):
+        """
+        See :obj:`Cell.glob2locBatch`. Local coordinates are volume coordinates, as in :obj:`glob2loc`.
+        """
+        x1, y1, z1 = vertexCoords[:, 0, 0], vertexCoords[:, 0, 1], vertexCoords[:, 0, 2]
+        x2, y2, z2 = vertexCoords[:, 1, 0], vertexCoords[:, 1, 1], vertexCoords[:, 1, 2]
+        x3, y3, z3 = vertexCoords[:, 2, 0], vertexCoords[:, 2, 1], vertexCoords[:, 2, 2]
+        x4, y4, z4 = vertexCoords[:, 3, 0], vertexCoords[:, 3, 1], vertexCoords[:, 3, 2]
+        xp, yp, zp = points[:, 0], points[:, 1], points[:, 2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume6 = ((x4 - x1) * (y2 - y1) * (z3 - z1) - (x4 - x1) * (y3 - y1) * (z2 - z1) +
+                       (x3 - x1) * (y4 - y1) * (z2 - z1) - (x2 - x1) * (y4 - y1) * (z3 - z1) +
+                       (x2 - x1) * (y3 - y1) * (z4 - z1) - (x3 - x1) * (y2 - y1) * (z4 - z1))
+            l1 = ((x3 - x2) * (yp - y2) * (z4 - z2) - (xp - x2) * (y3 - y2) * (z4 - z2) +
+                  (x4 - x2) * (y3 - y2) * (zp - z2) - (x4 - x2) * (yp - y2) * (z3 - z2) +
+                  (xp - x2) * (y4 - y2) * (z3 - z2) - (x3 - x2) * (y4 - y2) * (zp - z2)) / volume6
+            l2 = ((x4 - x1) * (yp - y1) * (z3 - z1) - (xp - x1) * (y4 - y1) * (z3 - z1) +
+                  (x3 - x1) * (y4 - y1) * (zp - z1) - (x3 - x1) * (yp - y1) * (z4 - z1) +
+                  (xp - x1) * (y3 - y1) * (z4 - z1) - (x4 - x1) * (y3 - y1) * (zp - z1)) / volume6
+            l3 = ((x2 - x1) * (yp - y1) * (z4 - z1) - (xp - x1) * (y2 - y1) * (z4 - z1) +
+                  (x4 - x1) * (y2 - y1) * (zp - z1) - (x4 - x1) * (yp - y1) * (z2 - z1) +
+                  (xp - x1) * (y4 - y1) * (z2 - z1) - (x2 - x1) * (y4 - y1) * (zp - z1)) / volume6
+            lc = np.column_stack((l1, l2, l3, 1.0-l1-l2-l3))
+            inside = np.all((lc >= -tolerance) & (lc <= 1.0+tolerance), axis=1)
+        return inside, lc
+
+    @classmethod
+    def evalNBatch(cls, lc):
+        """
+        See :obj:`Cell.evalNBatch`.
+        """
+        return np.column_stack((lc[:, 0], lc[:, 1], lc[:, 2], 1.0-lc[:, 0]-lc[:, 1]-lc[:, 2]))
+
     def containsPoint(self, point):
         """
         Check if a cell contains a point.
@@ -1088,6 +1283,45 @@ class Brick_3d_lin(Cell):
 
         return tuple([n[0]*vertexValues[0][i]+n[1]*vertexValues[1][i]+n[2]*vertexValues[2][i]+n[3]*vertexValues[3][i]+n[4]*vertexValues[4][i]+n[5]*vertexValues[5][i]+n[6]*vertexValues[6][i]+n[7]*vertexValues[7][i] for i in range(len(vertexValues[0]))])
 
+    @classmethod
+    def glob2locBatch(cls, vertexCoords, points):
+        """
+        See :obj:`Cell.glob2locBatch`. Newton-Raphson iterations of :obj:`glob2loc` are run for all points simultaneously; points which do not converge are reported as outside.
+        """
+        # k[:,i,:] is (a_i,b_i,c_i) of glob2loc
+        k = np.einsum('ij,nja->nia', _brickGlob2locSigns, vertexCoords)
+        n = points.shape[0]
+        lc = np.zeros((n, 3))
+        converged = np.zeros(n, dtype=bool)
+        for nite in range(10):
+            u, v, w = lc[:, 0:1], lc[:, 1:2], lc[:, 2:3]
+            r = (k[:, 0]+u*k[:, 1]+v*k[:, 2]+w*k[:, 3]+u*v*k[:, 4]+u*w*k[:, 5]+v*w*k[:, 6]+u*v*w*k[:, 7]-8.0*points[:, :3])
+            converged = np.sum(r**2, axis=1) < 1.e-20
+            active = ~converged
+            if not active.any():
+                break
+            p = np.stack((
+                k[:, 1]+v*k[:, 4]+w*k[:, 5]+v*w*k[:, 7],
+                k[:, 2]+u*k[:, 4]+w*k[:, 6]+u*w*k[:, 7],
+                k[:, 3]+u*k[:, 5]+v*k[:, 6]+u*v*k[:, 7]
+            ), axis=2)
+            # singular jacobians would make the whole batch fail
+            active &= np.fabs(np.linalg.det(p)) > 0.
+            lc[active] -= np.linalg.solve(p[active], r[active][:, :, np.newaxis])[:, :, 0]
+        inside = converged & np.all((lc >= -1.-tolerance) & (lc <= 1.+tolerance), axis=1)
+        return inside, lc
+
+    @classmethod
+    def evalNBatch(cls, lc):
+        """
+        See :obj:`Cell.evalNBatch`.
+        """
+        u, v, w = lc[:, 0], lc[:, 1], lc[:, 2]
+        return 0.125*np.column_stack((
+            (1.-u)*(1.-v)*(1.+w), (1.-u)*(1.+v)*(1.+w), (1.+u)*(1.+v)*(1.+w), (1.+u)*(1.-v)*(1.+w),
+            (1.-u)*(1.-v)*(1.-w), (1.-u)*(1.+v)*(1.-w), (1.+u)*(1.+v)*(1.-w), (1.+u)*(1.-v)*(1.-w)
+        ))
+
     def containsPoint(self, point):
         """
         Check if a cell contains a point.
@@ -37,3 +37,4 @@ cgt2xdmfIndex = {CGT_TRIANGLE_1: 0x04, CGT_QUAD: 0x05, CGT_TETRA: 0x06, CGT_HEXA
 xdmfIndex2cgt = {v: k for k, v in cgt2xdmfIndex.items()}
 
 meshioName2cgt = {'triangle': CGT_TRIANGLE_1, 'quad': CGT_QUAD, 'tetra': CGT_TETRA, 'hexahedron': CGT_HEXAHEDRON, 'triangle6': CGT_TRIANGLE_2}
+cgt2meshioName = {v: k for k, v in meshioName2cgt.items()}
@@ -27,13 +27,24 @@ import jsonschema
 import pprint
 import copy
 import typing
-from .baredata import BareData, ObjectBase
+import functools
+from .baredata import BareData, ObjectBase, validateCall
 from typing import Optional
 from . import dataid
 
 import pydantic
 
 
+@functools.lru_cache(maxsize=4096)
+def _splitKey(key):
+    'Split dotted metadata key into tuple of keywords (cached, as the same keys are used over and over).'
+    return tuple(key.split('.'))
+
+
+# values which need not be copied when returned
+_immutableTypes = (str, int, float, bool, complex, bytes, type(None))
+
+
 @Pyro5.api.expose
 class WithMetadata(ObjectBase):
     """
@@ -42,31 +53,50 @@ class WithMetadata(ObjectBase):
 
     metadata: dict = pydantic.Field(default_factory=dict)
 
-    def getMetadata(self, key, default=None):
+    def _lookupMetadata(self, key):
+        'Return value for dotted *key* without copying; raise KeyError if not found.'
+        d = self.metadata
+        for k in _splitKey(key): d = d[k]
+        return d
+
+    def getMetadata(self, key, default=None, deepcopy=True):
         """
         Returns metadata associated to given key
         :param key: unique metadataID
         :param default: default value returned when key is not found (otherwise KeyError is thrown)
+        :param bool deepcopy: return copy of the value if it is a container (dict, list, …); if False, the value itself is returned, which must then not be modified
         :return: metadata associated to key, throws TypeError if key does not exist
         """
-        keys = key.split('.')
-        d = copy.deepcopy(self.metadata)
-        while True:
-            try:
-                d = d[keys[0]]
-            except KeyError:
-                if default is not None:
-                    return default
-                raise
-            if len(keys) == 1:
-                return d
-            keys = keys[1:]
-
-    def getAllMetadata(self):
+        try:
+            d = self._lookupMetadata(key)
+        except KeyError:
+            if default is not None:
+                return default
+            raise
+        if deepcopy and not isinstance(d, _immutableTypes):
+            return copy.deepcopy(d)
+        return d
+
+    def getMetadataMany(self, keys, default=None):
         """
+        Returns metadata associated to several keys at once (in a single call, for remote objects).
+        :param list[str] keys: metadataIDs
+        :param default: value for keys which are not found
+        :return: metadata associated to each key
         :rtype: dict
         """
-        return copy.deepcopy(self.metadata)
+        ret = {}
+        for key in keys:
+            try: ret[key] = self._lookupMetadata(key)
+            except KeyError: ret[key] = default
+        return copy.deepcopy(ret)
+
+    def getAllMetadata(self, deepcopy=True):
+        """
+        :param bool deepcopy: if False, the metadata dictionary itself is returned, which must then not be modified
+        :rtype: dict
+        """
+        return copy.deepcopy(self.metadata) if deepcopy else self.metadata
     
     def hasMetadata(self, key):
         """
@@ -75,24 +105,12 @@ class WithMetadata(ObjectBase):
         :return: true if key defined, false otherwise
         :rtype: bool
         """
-        keys = key.split('.')
-        elem = self.getAllMetadata()
-        i = 0
-        i_last = len(keys)-1
-        for keyword in keys:
-            if i == i_last:
-                last = True
-            else:
-                last = False
-
-            if not last:
-                if keyword in elem:
-                    elem = elem[keyword]
-            else:
-                return keyword in elem
-            i += 1
-
-        return False
+        elem = self.metadata
+        for keyword in _splitKey(key):
+            if not isinstance(elem, dict) or keyword not in elem:
+                return False
+            elem = elem[keyword]
+        return True
     
     def printMetadata(self, nonEmpty=False):
         """ 
@@ -115,41 +133,38 @@ class WithMetadata(ObjectBase):
         :param str key: unique metadataID
         :param val: any type
         """
-        keys = key.split('.')
+        self._setMetadataPath(_splitKey(key), val)
+
+    def setMetadataMany(self, dictionary):
+        """
+        Sets metadata associated to several keys at once (in a single call, for remote objects).
+        :param dict dictionary: metadataID → value mapping
+        """
+        for key, val in dictionary.items():
+            self._setMetadataPath(_splitKey(key), val)
+
+    def _setMetadataPath(self, keys, val):
         elem = self.metadata
-        i = 0
-        i_last = len(keys)-1
-        for keyword in keys:
-            if i == i_last:
-                last = True
-            else:
-                last = False
-
-            if not last:
-                if keyword in elem:
-                    elem = elem[keyword]
-                else:
-                    elem[keyword] = {}
-                    elem = elem[keyword]
-            else:
-                elem[keyword] = val
-            i += 1
+        for keyword in keys[:-1]:
+            if keyword not in elem:
+                elem[keyword] = {}
+            elem = elem[keyword]
+        elem[keys[-1]] = val
 
     def _iterInDictOfMetadataForUpdate(self, dictionary, base_key):
         if dictionary is None:
             return
-        for key, value in dictionary.items():
-            if base_key != "":
-                new_key = "%s.%s" % (base_key, key)
-            else:
-                new_key = "%s" % key
+        self._updateMetadataPath(dictionary, (_splitKey(base_key) if base_key != "" else ()))
 
+    def _updateMetadataPath(self, dictionary, base):
+        for key, value in dictionary.items():
+            path = base+_splitKey(str(key))
             if isinstance(value, dict):
-                self._iterInDictOfMetadataForUpdate(value, new_key)
+                self._updateMetadataPath(value, path)
             else:
-                self.setMetadata(new_key, value)
+                self._setMetadataPath(path, value)
 
-    @pydantic.validate_call
+    @validateCall
     def _updateMetadata(self, dictionary: Optional[dict]):
         """ 
         Updates metadata's dictionary with a given dictionary
@@ -163,7 +178,11 @@ class WithMetadata(ObjectBase):
         :param dict dictionary: Dictionary of metadata
         """
         if dictionary:
-            self._updateMetadata(dictionary=dictionary)
+            # plain dicts need no validation
+            if isinstance(dictionary, dict):
+                self._iterInDictOfMetadataForUpdate(dictionary, "")
+            else:
+                self._updateMetadata(dictionary=dictionary)
 
     def validateMetadata(self, template):
         """
@@ -31,9 +31,11 @@ from . import cellgeometrytype
 from . import mesh
 from . import uniformmesh
 from . import mupifquantity
+from . import util
 from .units import Quantity, Unit
-from .baredata import NumpyArray
+from .baredata import NumpyArray, validateCall
 from .heavydata import HeavyConvertible
+from . import heavydata
 
 import meshio
 import sys
@@ -51,7 +53,9 @@ import pydantic
 import pickle
 import logging
 import itertools
+import collections
 import os.path
+import scipy.sparse
 from .units import Unit
 from typing_extensions import Annotated
 
@@ -69,6 +73,93 @@ class FieldType(IntEnum):
     FT_cellBased = 2
 
 
+#: maximum number of mapping operators kept by :obj:`mappingOperator`
+mappingCacheSize = 16
+_mappingCache = collections.OrderedDict()
+
+#: when reading (non-heavy) fields from HDF5, memory-map contiguous uncompressed value datasets (copy-on-write) rather than reading them; off by default, since the mapped file must then not be modified or truncated while the field exists (the process would crash with SIGBUS)
+hdf5MemoryMap = False
+
+
+def _cellCentroids(coords, conn):
+    'Centroids of cells, given padded connectivity (as returned by :obj:`mupif.mesh.Mesh._getCellArrays`).'
+    valid = conn >= 0
+    return np.einsum('cv,cvd->cd', valid, coords[np.where(valid, conn, 0)])/np.count_nonzero(valid, axis=1)[:, np.newaxis]
+
+
+def mappingOperator(sourceMesh, targetMesh, sourceType, targetType, method=None, eps=0.0):
+    """
+    Return sparse operator mapping values of a field on *sourceMesh* to *targetMesh* (see :obj:`Field.mapTo`). Operators are cached by digests of both meshes (and the other arguments), thus the point location is only done once for every pair of meshes.
+
+    Target points are vertices of *targetMesh* for vertex-based target, and cell centroids for cell-based target. *method* is one of:
+
+    * ``'interpolate'``: vertex-based source is interpolated with shape functions of the (first) source cell containing the target point (default for vertex-based source);
+    * ``'average'``: cell-based source is averaged over all source cells containing the target point (default for cell-based source);
+    * ``'conservative'``: for cell-based source and target, the target cell value is the average of source cells weighted by their overlap with the target cell, so that the integral is (approximately) preserved; the overlap is estimated by sampling the target cell at its centroid and points halfway between the centroid and each vertex.
+
+    :return: (op,found), where *op* is ``scipy.sparse.csr_matrix`` of shape (numTarget,numSource) and *found* is boolean array flagging target points (rows of *op*) for which source data were found
+    :rtype: (scipy.sparse.csr_matrix,numpy.ndarray)
+    """
+    if method is None: method = ('interpolate' if sourceType == FieldType.FT_vertexBased else 'average')
+    if method not in ('interpolate', 'average', 'conservative'): raise ValueError(f"method must be one of 'interpolate', 'average', 'conservative' (not {method}).")
+    if (method == 'interpolate') != (sourceType == FieldType.FT_vertexBased): raise ValueError(f'{sourceType.name} field cannot be mapped with {method=}.')
+    if method == 'conservative' and targetType != FieldType.FT_cellBased: raise ValueError('Conservative mapping requires cell-based target.')
+    key = (sourceMesh.dataDigest(), targetMesh.dataDigest(), sourceType, targetType, method, eps)
+    if (ret := _mappingCache.get(key, None)) is not None:
+        _mappingCache.move_to_end(key)
+        return ret
+
+    # target points, and sampling matrix (target×point) where there is more than one point per target
+    if targetType == FieldType.FT_vertexBased:
+        pts, samp = targetMesh.getVertexCoords(), None
+    else:
+        tCoords, _, tConn = targetMesh._getCellArrays()
+        pts, samp = _cellCentroids(tCoords, tConn), None
+        if method == 'conservative':
+            nc, nv = tConn.shape
+            valid = np.column_stack((np.ones(nc, dtype=bool), tConn >= 0))
+            sub = .5*(pts[:, np.newaxis, :]+tCoords[np.where(tConn >= 0, tConn, 0)])
+            pts = np.concatenate((pts[:, np.newaxis, :], sub), axis=1)[valid]
+            samp = scipy.sparse.csr_matrix((np.ones(pts.shape[0]), (np.repeat(np.arange(nc), np.count_nonzero(valid, axis=1)), np.arange(pts.shape[0]))), shape=(nc, pts.shape[0]))
+    op, found = probeOperator(sourceMesh, pts, sourceType, eps=eps)
+    if samp is not None:
+        # average over samples which were found
+        samp = samp@scipy.sparse.diags(found.astype(np.float64))
+        op = samp@op
+    rowSums = np.asarray(op.sum(axis=1)).ravel()
+    found = rowSums > 0
+    op = (scipy.sparse.diags(np.where(found, 1./np.where(found, rowSums, 1.), 0.))@op).tocsr()
+    _mappingCache[key] = ret = (op, found)
+    while len(_mappingCache) > mappingCacheSize: _mappingCache.popitem(last=False)
+    return ret
+
+
+def probeOperator(mesh, points, fieldType, eps=0.0):
+    """
+    Return sparse operator evaluating any field of *fieldType* on *mesh* at *points* (in the same way as :obj:`Field.evaluateBatch`): values at points are the operator applied to (numVertices or numCells,nComp) array of field values. Points are located in the mesh only once, so the operator can be reused for all fields on the same mesh (e.g. time steps).
+
+    :param points: (N,dim) array of positions
+    :return: (op,found), where *op* is ``scipy.sparse.csr_matrix`` of shape (N,numVertices or numCells) and *found* is boolean array flagging points inside the mesh (rows of *op* for points outside are zero)
+    :rtype: (scipy.sparse.csr_matrix,numpy.ndarray)
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+    npts = points.shape[0]
+    loc = mesh.locatePoints(points, eps=eps)
+    if fieldType == FieldType.FT_vertexBased:
+        # first cell containing each point
+        pp, first = np.unique(loc.points, return_index=True)
+        verts, weights = loc.vertices[first], loc.weights[first]
+        valid = verts >= 0
+        op = scipy.sparse.csr_matrix((weights[valid], (np.repeat(pp, valid.shape[1])[valid.ravel()], verts[valid])), shape=(npts, mesh.getNumberOfVertices()))
+    else:
+        # average over all cells containing the point
+        cnt = np.bincount(loc.points, minlength=npts)
+        op = scipy.sparse.csr_matrix((1./cnt[loc.points], (loc.points, loc.cells)), shape=(npts, mesh.getNumberOfCells()))
+    found = np.zeros(npts, dtype=bool)
+    found[loc.points] = True
+    return op, found
+
+
 @Pyro5.api.expose
 class FieldBase(mupifquantity.MupifQuantity):
     fieldID: DataID
@@ -113,7 +204,7 @@ class FieldBase(mupifquantity.MupifQuantity):
         """
         return self.time
 
-    @pydantic.validate_call
+    @validateCall
     def evaluate(self, positions, eps: float = 0.0):
         """
         Evaluates the receiver at given spatial position(s).
@@ -136,7 +227,7 @@ class AnalyticalField(FieldBase):
         # quantity with null array; only the unit is relevant
         super().__init__(quantity=np.array([])*Unit(unit), **kw)
 
-    @pydantic.validate_call
+    @validateCall
     def evaluate(
             self,
             positions: typing.Union[
@@ -219,6 +310,7 @@ class Field(FieldBase,HeavyConvertible):
         :param tuple value: Value to be set for a given component, should have the same units as receiver
         """
         self.quantity.value[componentID] = value
+        self._dataDigest = None
 
     def getRecord(self, componentID):
         """Return value in one point (cell, vertex or similar)"""
@@ -282,7 +374,7 @@ class Field(FieldBase,HeavyConvertible):
         """
         return self.time
 
-    @pydantic.validate_call
+    @validateCall
     def evaluate(
             self,
             positions: typing.Union[
@@ -303,16 +395,92 @@ class Field(FieldBase,HeavyConvertible):
         :return: field value(s)
         :rtype: units.Quantity with given value or tuple of values
         """
-        # test if positions is a list of positions
-        if isinstance(positions, list):
-            ans = []
-            for pos in positions:
-                ans.append(self._evaluate(pos, eps))
-            return Quantity(value=ans, unit=self.getUnit())
+        # test if positions is a list of positions (or 2d array); those are evaluated at once
+        if isinstance(positions, list) or (isinstance(positions, (np.ndarray, Quantity)) and np.ndim(positions) == 2):
+            return self.evaluateBatch(positions, eps=eps)
         else:
             # single position passed
             return Quantity(value=self._evaluate(positions, eps), unit=self.getUnit())
 
+    def evaluateBatch(self, positions, eps: float = 0.0, returnMask: bool = False):
+        """
+        Evaluates the receiver at many spatial positions at once. Points are located in the mesh all together (see :obj:`mupif.mesh.Mesh.locatePoints`) and values are interpolated with vectorized shape functions, which is much faster than evaluating points one-by-one.
+
+        For vertex-based fields, the value is interpolated in the first cell containing the point; for cell-based fields, values of all cells containing the point are averaged (as in :obj:`evaluate`).
+
+        :param positions: (N,dim) array of positions (or anything convertible to such array, or :obj:`Quantity` with length units)
+        :param float eps: Optional tolerance for probing whether the point belongs to a cell (should really not be used)
+        :param bool returnMask: if False, ValueError is raised if any of the points is outside of the mesh; if True, values at such points are NaN and boolean mask (True for points outside) is returned along with the values
+        :return: (N,nComp) values (and the mask, if *returnMask* is True)
+        :rtype: units.Quantity or (units.Quantity,numpy.ndarray)
+        """
+        if isinstance(positions, Quantity):
+            if self.mesh.unit is None:
+                raise RuntimeError(f'position has unit "{positions.unit}" but mesh has no unit defined.')
+            positions = positions.to(self.mesh.unit).value
+        positions = np.atleast_2d(np.asarray(positions, dtype=np.float64))
+        loc = self.mesh.locatePoints(positions, eps=eps)
+        npts = positions.shape[0]
+        found = np.zeros(npts, dtype=bool)
+        found[loc.points] = True
+        if self.fieldType == FieldType.FT_vertexBased:
+            # first cell containing each point
+            pts, first = np.unique(loc.points, return_index=True)
+            verts, weights = loc.vertices[first], loc.weights[first]
+            # padding vertices (-1) have zero weight
+            rows, inv = np.unique(np.where(verts >= 0, verts, 0), return_inverse=True)
+            vals = self._valueRows(rows)
+            ans = np.full((npts, vals.shape[1]), np.nan, dtype=np.result_type(vals.dtype, np.float64))
+            ans[pts] = np.einsum('pv,pvc->pc', weights, vals[inv.reshape(verts.shape)])
+        else:
+            # average over all cells containing the point
+            rows, inv = np.unique(loc.cells, return_inverse=True)
+            vals = self._valueRows(rows)
+            ans = np.full((npts, vals.shape[1]), np.nan, dtype=np.result_type(vals.dtype, np.float64))
+            acc = np.zeros_like(ans)
+            np.add.at(acc, loc.points, vals[inv])
+            cnt = np.bincount(loc.points, minlength=npts)
+            ans[found] = acc[found]/cnt[found, np.newaxis]
+        if returnMask:
+            return Quantity(value=ans, unit=self.getUnit()), ~found
+        if not found.all():
+            raise ValueError(f'Field.evaluateBatch: no source cell found for {np.count_nonzero(~found)} of {npts} positions (first one is {tuple(positions[np.argmin(found)])})')
+        return Quantity(value=ans, unit=self.getUnit())
+
+    def _valueRows(self, rows):
+        'Return (len(rows),nComp) array of values at sorted unique *rows* (vertices or cells); only those rows are read from heavy (HDF5-backed) fields.'
+        if (ds := getattr(self.quantity, 'dataset', None)) is not None:
+            vals = heavydata.readRows(ds, rows)
+        else:
+            vals = np.asarray(self.value)[rows]
+        return vals.reshape(vals.shape[0], -1)
+
+    def mapTo(self, targetMesh, fieldType=None, method=None, eps: float = 0.0, returnMask: bool = False):
+        """
+        Map the receiver onto another mesh, returning a new :obj:`Field`. The mapping is a sparse matrix-vector product with operator built (and cached) by :obj:`mappingOperator`, so repeated mapping between the same meshes (e.g. every time step of a coupled simulation) does not search for points again.
+
+        :param mupif.mesh.Mesh targetMesh: target mesh
+        :param FieldType fieldType: type of the new field (same as the receiver if not given)
+        :param str method: mapping method, see :obj:`mappingOperator`
+        :param float eps: tolerance for locating target points in the receiver's mesh
+        :param bool returnMask: if False, ValueError is raised if some target points are outside of the receiver's mesh; if True, values there are NaN and boolean mask (True for points outside) is returned along with the field
+        :return: mapped field (and the mask, if *returnMask* is True)
+        :rtype: Field or (Field,numpy.ndarray)
+        """
+        if fieldType is None: fieldType = self.fieldType
+        op, found = mappingOperator(self.mesh, targetMesh, self.fieldType, fieldType, method=method, eps=eps)
+        vals = np.asarray(self.value[:])
+        ans = op@(vals[:, np.newaxis] if vals.ndim == 1 else vals.reshape(vals.shape[0], -1))
+        ans = ans.reshape((ans.shape[0],)+vals.shape[1:])
+        if not returnMask and not found.all():
+            raise ValueError(f'Field.mapTo: no source cell found for {np.count_nonzero(~found)} of {found.shape[0]} target points.')
+        if not found.all():
+            ans = ans.astype(np.result_type(ans.dtype, np.float64))
+            ans[~found] = np.nan
+        ret = Field(mesh=targetMesh, fieldID=self.fieldID, fieldType=fieldType, valueType=self.valueType, time=self.time, quantity=Quantity(value=ans, unit=self.getUnit()))
+        if returnMask: return ret, ~found
+        return ret
+
     def _evaluate(self, position, eps):
         """
         Evaluates the receiver at a single spatial position.
@@ -571,7 +739,13 @@ class Field(FieldBase,HeavyConvertible):
         plt.show(block=True)
 
     def dataDigest(self):
-        return mupifquantity.MupifQuantity.dataDigest(self, np.array([self.time.value]), np.frombuffer(bytes(self.time.unit), dtype=np.uint8))
+        """
+        See :obj:`MupifQuantity.dataDigest`. The digest is cached until :obj:`quantity` or :obj:`time` are re-assigned or :obj:`setRecord` is called; in-place modification of the value array is not detected.
+        """
+        c = getattr(self, '_dataDigest', None)
+        if c is None or c[0] != util.digestAlgorithm or c[1] is not self.quantity or c[2] is not self.time:
+            c = self._dataDigest = (util.digestAlgorithm, self.quantity, self.time, mupifquantity.MupifQuantity.dataDigest(self, np.array([self.time.value]), np.frombuffer(bytes(self.time.unit), dtype=np.uint8)))
+        return c[3]
 
     def toHdf5_split_files(self, fieldPrefix: str, meshPrefix: str, flat=True, heavy=False):
         import h5py
@@ -690,34 +864,34 @@ class Field(FieldBase,HeavyConvertible):
         fieldGrp.attrs['unit'] = numpy.void(pickle.dumps(self.getUnit(), protocol=0))
         fieldGrp.attrs['time'] = numpy.void(pickle.dumps(self.time, protocol=0))
         if self.fieldType == FieldType.FT_vertexBased:
-            val = numpy.empty(shape=(self.getMesh().getNumberOfVertices(), self.getRecordSize()), dtype=numpy.float64)
-            for vert in range(self.getMesh().getNumberOfVertices()):
-                val[vert] = self.getVertexValue(vert).getValue()
-            subGrp = 'vertex_values'
-            fieldGrp[subGrp] = val
+            n, subGrp = self.getMesh().getNumberOfVertices(), 'vertex_values'
         elif self.fieldType == FieldType.FT_cellBased:
-            # raise NotImplementedError("Saving cell-based fields to HDF5 is not yet implemented.")
-            val = numpy.empty(shape=(self.getMesh().getNumberOfCells(), self.getRecordSize()), dtype=numpy.float64)
-            for cell in range(self.getMesh().getNumberOfCells()):
-                val[cell] = self.getCellValue(cell)
-            subGrp = 'cell_values'
-            fieldGrp[subGrp] = val
+            n, subGrp = self.getMesh().getNumberOfCells(), 'cell_values'
         else:
             raise RuntimeError("Unknown fieldType %d." % self.fieldType)
+        # heavy quantity: read the whole dataset at once
+        if (ds := getattr(self.quantity, 'dataset', None)) is not None:
+            val = ds[()]
+        else:
+            val = numpy.asarray(self.quantity.value)
+        if val.dtype.kind not in 'biuf':
+            val = val.astype(numpy.float64)
+        # contiguous and uncompressed, so that it can be memory-mapped when read
+        fieldGrp.create_dataset(subGrp, data=val.reshape(n, self.getRecordSize()))
         if isinstance(self.mesh,uniformmesh.UniformRectilinearMesh):
             import h5py
             src=fieldGrp[subGrp]
             # extra dimension for the record, if not scalar
             shape=list(self.mesh.dims)
             if self.getRecordSize()>1: shape=[self.getRecordSize()]+shape
-            vl=h5py.VirtualLayout(shape=tuple(reversed(shape)),dtype=numpy.float64)
+            vl=h5py.VirtualLayout(shape=tuple(reversed(shape)),dtype=src.dtype)
             vl[:]=h5py.VirtualSource(src)
             fieldGrp.create_virtual_dataset(subGrp+'_3d_view',vl)
             if not self.mesh.is3d():
                 assert len(self.mesh.dims)==2
                 shape=list(self.mesh.dims)+[1]
                 if self.getRecordSize()>1: shape=[self.getRecordSize()]+shape
-                vl=h5py.VirtualLayout(shape=tuple(reversed(shape)),dtype=numpy.float64)
+                vl=h5py.VirtualLayout(shape=tuple(reversed(shape)),dtype=src.dtype)
                 vl[:]=h5py.VirtualSource(src)
                 fieldGrp.create_virtual_dataset(subGrp+'_2d_view',vl)
 
@@ -730,7 +904,24 @@ class Field(FieldBase,HeavyConvertible):
         fieldGrp[subGrp].attrs['unit'] = str(self.getUnit())
 
     @staticmethod
-    def makeFromHdf5_groups(*, fieldGrp, meshGrp=None, meshCache=None, heavy=False, h5own=False):
+    def _readHdf5Dataset(ds, mmap=None):
+        """
+        Return data of HDF5 dataset *ds* as array, read at once; the array is memory-mapped (copy-on-write) instead if *mmap* (:obj:`hdf5MemoryMap` if not given) is set and the dataset is contiguous and uncompressed in a regular file.
+
+        :rtype: numpy.ndarray
+        """
+        if mmap is None: mmap = hdf5MemoryMap
+        if mmap and ds.chunks is None and ds.compression is None and not ds.is_virtual and ds.external is None and ds.file.driver in ('sec2', 'stdio') and ds.dtype.kind in 'biuf' and ds.size > 0:
+            offset = ds.id.get_offset()
+            if offset is not None:
+                return np.memmap(ds.file.filename, mode='c', dtype=ds.dtype, shape=ds.shape, offset=offset)
+        return ds[()]
+
+    @staticmethod
+    def makeFromHdf5_groups(*, fieldGrp, meshGrp=None, meshCache=None, heavy=False, h5own=False, meshObj=None, mmap=None):
+        """
+        Restore Field from HDF5 group *fieldGrp* (see :obj:`toHdf5Group`). The mesh is *meshObj* if given, otherwise it is read from *meshGrp* if given, otherwise from the group linked from *fieldGrp* (*meshCache* maps HDF5 paths of meshes already read to mesh objects). Values of non-heavy fields are memory-mapped if *mmap* is set (see :obj:`_readHdf5Dataset`).
+        """
         import h5py
         f=fieldGrp
         if 'vertex_values' in f:
@@ -747,7 +938,9 @@ class Field(FieldBase,HeavyConvertible):
             time = None  # special case, handled at saving time
         else:
             time = pickle.loads(time)
-        if meshGrp is not None:
+        if meshObj is not None:
+            m = meshObj
+        elif meshGrp is not None:
             # creates HeavyUnstructuredMesh if that is the meshGrp storage format
             m = mesh.Mesh.makeFromHdf5group(meshGrp)
         else:
@@ -763,7 +956,7 @@ class Field(FieldBase,HeavyConvertible):
             elif isinstance(link, h5py.HardLink):
                 m = mesh.Mesh.makeFromHdf5group(f['mesh'])
         if not heavy:
-            quantity = Quantity(value=np.array(valDs).tolist(), unit=unit)
+            quantity = Quantity(value=Field._readHdf5Dataset(valDs, mmap=mmap), unit=unit, copy=False)
         else:
             from .heavydata import Hdf5RefQuantity, Hdf5OwningRefQuantity
             # hack
@@ -779,7 +972,7 @@ class Field(FieldBase,HeavyConvertible):
         return Field(mesh=m, fieldID=fieldID, quantity=quantity, time=time, valueType=valueType, fieldType=fieldType)
 
     @staticmethod
-    def makeFromHdf5(*, fileName: str = None, group: str = 'component1/part1', h5group=None, indices: typing.Optional[typing.List[int]] = None, heavy=False,h5own=False):
+    def makeFromHdf5(*, fileName: str = None, group: str = 'component1/part1', h5group=None, indices: typing.Optional[typing.List[int]] = None, heavy=False,h5own=False, mmap=None):
         """
         Restore Fields from HDF5 file.
 
@@ -788,6 +981,7 @@ class Field(FieldBase,HeavyConvertible):
         :return: list of new :obj:`Field` instances
         :param h5group:
         :param indices:
+        :param bool mmap: memory-map (copy-on-write) values of fields stored contiguously and uncompressed, rather than reading them (:obj:`hdf5MemoryMap` if not given); the file must then not be modified while the fields exist
         :rtype: [Field,Field,...]
 
         .. note:: This method has not been tested yet.
@@ -815,7 +1009,7 @@ class Field(FieldBase,HeavyConvertible):
         # construct all fields as mupif objects
         ret = []
         for f in fieldObjs:
-            ret.append(Field.makeFromHdf5_groups(fieldGrp=f, meshGrp=None, meshCache=meshes, heavy=heavy, h5own=h5own))
+            ret.append(Field.makeFromHdf5_groups(fieldGrp=f, meshGrp=None, meshCache=meshes, heavy=heavy, h5own=h5own, mmap=mmap))
         if fileName is not None:
             hdf.close()  # necessary for windows
         return ret
@@ -13,7 +13,7 @@ from .mupifquantity import ValueType
 from . import units, pyroutil, baredata
 from . import dataid
 from .property import Property
-from .pyrofile import PyroFile
+from .pyrofile import PyroFile, PyroFileReader
 import types
 import json
 import tempfile
@@ -131,40 +131,147 @@ class Hdf5RefQuantity(RefQuantity):
     # def quantity(self,q): self.dataset[:]=q.to(self.unit)
 
 
+#: when :obj:`HeavyDataBase` is reconstructed from a remote one (with :obj:`HeavyDataBase.h5uri`), read the remote HDF5 file by parts on demand rather than downloading it whole; the file is downloaded as soon as it is opened for writing, or explicitly via :obj:`HeavyDataBase.download`
+lazyRemoteAccess = False
+
+#: named storage profiles for heavy (HDF5) datasets, see :obj:`datasetStorageKw`; each profile defines *compression*, *compression_opts* and *shuffle* (passed to ``create_dataset``), *chunkBytes* (target chunk size; chunks consist of whole rows, ``None`` lets HDF5 choose the chunk shape) and *cacheBytes* (raw chunk cache size of the file, ``None`` for HDF5 default); the ``default`` profile keeps the settings historically used by each call site (passed to :obj:`datasetStorageKw` as *default*)
+storageProfiles = {
+    # settings of each call site, unchanged
+    'default': dict(cacheBytes=None),
+    # solver output: fast lzf compression (always available in h5py), large chunks
+    'fast-write': dict(compression='lzf', compression_opts=None, shuffle=False, chunkBytes=2**22, cacheBytes=2**26),
+    # long-term storage: best compression
+    'archival': dict(compression='gzip', compression_opts=9, shuffle=True, chunkBytes=2**20, cacheBytes=None),
+    # row-wise access: small uncompressed chunks, large chunk cache
+    'random-access': dict(compression=None, compression_opts=None, shuffle=False, chunkBytes=2**14, cacheBytes=2**26),
+}
+
+#: storage profile used when none is given explicitly and the HDF5 file does not record any; initialized from the ``MUPIF_HDF5_PROFILE`` environment variable
+defaultStorageProfile = os.environ.get('MUPIF_HDF5_PROFILE', 'default')
+
+#: HDF5 file attribute where the storage profile (for newly created datasets) is recorded
+storageProfileAttr = 'mupifStorageProfile'
+
+
+def getStorageProfile(profile=None, h5obj=None):
+    """
+    Resolve storage profile: *profile* if given, otherwise the one recorded in the HDF5 file of *h5obj* (file, group or dataset), otherwise :obj:`defaultStorageProfile`.
+
+    :return: (name,profile)
+    :rtype: (str,dict)
+    """
+    if profile is None and h5obj is not None:
+        profile = h5obj.file.attrs.get(storageProfileAttr, None)
+    if profile is None:
+        profile = defaultStorageProfile
+    if profile not in storageProfiles:
+        raise ValueError(f'Unknown storage profile {profile} (must be one of: {", ".join(storageProfiles.keys())}).')
+    return profile, storageProfiles[profile]
+
+
+def datasetStorageKw(h5obj, *, shape, dtype, maxshape=None, profile=None, default={}):
+    """
+    Keyword arguments for ``create_dataset`` (chunking, compression) according to the storage profile (see :obj:`getStorageProfile`).
+
+    :param h5obj: HDF5 file or group where the dataset will be created
+    :param shape: dataset shape; chunks are aligned with rows (the first axis)
+    :param dtype: dataset dtype
+    :param maxshape: dataset maxshape (chunks of fixed-size datasets may not exceed its shape)
+    :param profile: storage profile name
+    :param dict default: keyword arguments used with the ``default`` profile (settings of the call site)
+    :rtype: dict
+    """
+    name, prof = getStorageProfile(profile, h5obj)
+    if name == 'default':
+        return dict(default)
+    kw = dict(compression=prof['compression'], shuffle=prof['shuffle'])
+    if prof['compression_opts'] is not None:
+        kw['compression_opts'] = prof['compression_opts']
+    if prof['chunkBytes'] is None:
+        kw['chunks'] = True
+        return kw
+    rowBytes = max(np.dtype(dtype).itemsize*int(np.prod(shape[1:], dtype=np.int64)), 1)
+    rows = max(prof['chunkBytes']//rowBytes, 1)
+    if maxshape is None or maxshape[0] is not None:
+        rows = min(rows, max((shape if maxshape is None else maxshape)[0], 1))
+    kw['chunks'] = (rows,)+tuple(shape[1:])
+    return kw
+
+
+def readRows(ds, rows):
+    """
+    Read rows (along the first axis) of HDF5 dataset. Dense selections are read as one contiguous block and indexed in memory, which is much faster than HDF5 point selection.
+
+    :param ds: h5py dataset (or anything sliceable like it)
+    :param rows: sorted array of unique row indices
+    :rtype: numpy.ndarray
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    if rows.shape[0] == 0:
+        return np.zeros((0,)+tuple(ds.shape[1:]), dtype=ds.dtype)
+    lo, hi = int(rows[0]), int(rows[-1])+1
+    if hi-lo <= 2*rows.shape[0]:
+        return ds[lo:hi][rows-lo]
+    return ds[rows]
+
+
 HeavyDataBase_ModeChoice = typing.Literal['readonly', 'readwrite', 'overwrite', 'create', 'create-memory', 'copy-readwrite']
 
 
 @Pyro5.api.expose
 class HeavyDataBase(Data):
     """
-    Base class for various HDF5-backed objects with automatic HDF5 transfer when copied to remote location. This class is to be used internally only.
+    Base class for various HDF5-backed objects with automatic HDF5 transfer when copied to remote location (whole or on demand, see :obj:`lazyRemoteAccess`). This class is to be used internally only.
     """
     h5path: str = ''
     h5uri: typing.Optional[str] = None
     mode: HeavyDataBase_ModeChoice = 'readonly'
+    #: storage profile (see :obj:`storageProfiles`) used for newly created datasets and for the chunk cache, recorded in the file when created; ``None`` uses the profile recorded in the file, or :obj:`defaultStorageProfile`
+    storageProfile: typing.Optional[str] = None
 
     def __init__(self, **kw):
         super().__init__(**kw)  # calls the real ctor
         self._h5obj = None  # _h5obj # normally assigned in openStorage
+        self._remoteFile = None  # PyroFileReader, with lazy remote access
         self.pyroIds = []
         if self.h5uri is not None:
-            log.info(f'HDF5 transfer: starting…\n')
-            uri = Pyro5.api.URI(self.h5uri)
-            remote = Pyro5.api.Proxy(uri)
-            # sys.stderr.write(f'Remote is {remote}\n')
-            fd, self.h5path = tempfile.mkstemp(suffix='.h5', prefix='mupif-tmp-', text=False)
-
-            def _try_unlink():
-                try:
-                    os.unlink(self.h5path)
-                except PermissionError:
-                    pass  # can fail on Windows if the file is still open
-            atexit.register(_try_unlink)
-            log.debug(f'Temporary is {self.h5path}, will be deleted via atexit handler.')
-            PyroFile.copy(remote, self.h5path)
-            log.info(f'HDF5 transfer: finished, {os.stat(self.h5path).st_size} bytes.\n')
-            # local copy is not the original, the URI is no longer valid
-            self.h5uri = None
+            remote = Pyro5.api.Proxy(Pyro5.api.URI(self.h5uri))
+            # older PyroFile does not support range requests
+            if lazyRemoteAccess and hasattr(remote, 'getRange'):
+                self._remoteFile = PyroFileReader(remote)
+                log.info(f'HDF5 lazy access: {self._remoteFile.size} bytes remote.')
+            else:
+                self._download()
+
+    def download(self):
+        """
+        Download the lazily accessed remote HDF5 file (see :obj:`lazyRemoteAccess`) into a local temporary file, which becomes :obj:`h5path`. No-op if the data are local already.
+        """
+        if self._remoteFile is None: return
+        if self._h5obj:
+            raise RuntimeError('Cannot download while HDF5 file is open (call closeData() first).')
+        self._remoteFile.close()
+        self._remoteFile = None
+        self._download()
+
+    def _download(self):
+        log.info(f'HDF5 transfer: starting…\n')
+        uri = Pyro5.api.URI(self.h5uri)
+        remote = Pyro5.api.Proxy(uri)
+        # sys.stderr.write(f'Remote is {remote}\n')
+        fd, self.h5path = tempfile.mkstemp(suffix='.h5', prefix='mupif-tmp-', text=False)
+
+        def _try_unlink():
+            try:
+                os.unlink(self.h5path)
+            except PermissionError:
+                pass  # can fail on Windows if the file is still open
+        atexit.register(_try_unlink)
+        log.debug(f'Temporary is {self.h5path}, will be deleted via atexit handler.')
+        PyroFile.transfer(remote, self.h5path)
+        log.info(f'HDF5 transfer: finished, {os.stat(self.h5path).st_size} bytes.\n')
+        # local copy is not the original, the URI is no longer valid
+        self.h5uri = None
 
     def _returnProxy(self, v):
         if hasattr(self, '_pyroDaemon'):
@@ -181,6 +288,7 @@ class HeavyDataBase(Data):
             self.openStorage()
         if h5loc in self._h5obj:
             raise RuntimeError(f'Dataset {h5loc} already exists (shape {"×".join(self._h5obj[h5loc].shape)}).')
+        kw = datasetStorageKw(self._h5obj, shape=shape, dtype=kw.get('dtype', 'f4'), maxshape=kw.get('maxshape', None), profile=self.storageProfile) | kw
         return self._h5obj.create_dataset(h5loc, shape=shape, **kw)
 
     @pydantic.validate_call
@@ -190,10 +298,11 @@ class HeavyDataBase(Data):
         """
         if self._h5obj:
             raise RuntimeError(f'HDF5 file {self.h5path} open (must be closed before moving).')
+        self.download()
         shutil.move(self.h5path, new_h5path)
         self.h5path = new_h5path
 
-    @pydantic.validate_call
+    @baredata.validateCall
     def deepcopy(self):
         """
         Overrides BareData.deepcopy, enriching it with copy of the backing HDF5 file; it should correctly detect whether the call is local or remote.
@@ -202,6 +311,7 @@ class HeavyDataBase(Data):
             raise RuntimeError(f'HDF5 file {self.h5path} open (must be closed before deepcopy).')
         # local
         if Pyro5.callcontext.current_context.client is None:
+            self.download()
             fd, h5path_new = tempfile.mkstemp(suffix='.h5', prefix='mupif-tmp', text=False)
             shutil.copy(self.h5path, h5path_new)
             # creates new local object
@@ -212,7 +322,7 @@ class HeavyDataBase(Data):
             self.exposeData()
             return super().deepcopy()
 
-    @pydantic.validate_call
+    @baredata.validateCall
     def openStorage(self, mode: typing.Optional[HeavyDataBase_ModeChoice] = None):
         """
         """
@@ -220,6 +330,10 @@ class HeavyDataBase(Data):
             self.mode = mode
         # log.warning(f'Opening in mode {self.mode}')
 
+        # lazily accessed remote file can only be read
+        if self.mode != 'readonly':
+            self.download()
+
         # for copy-readwrite, do the copy and let readwrite handle th rest
         if self.mode == 'copy-readwrite':
             if self._h5obj and self._h5obj.mode != 'r':
@@ -237,7 +351,7 @@ class HeavyDataBase(Data):
                     if self._h5obj.mode != 'r':
                         raise RuntimeError(f'HDF5 file {self.h5path} already open for writing.')
                 else:
-                    self._h5obj = h5py.File(self.h5path, 'r')
+                    self._h5obj = h5py.File(self.h5path if self._remoteFile is None else self._remoteFile, 'r', **self._h5fileKw())
             elif self.mode == 'readwrite':
                 if self._h5obj:
                     if self._h5obj.mode != 'r+':
@@ -245,7 +359,9 @@ class HeavyDataBase(Data):
                 else:
                     if not os.path.exists(self.h5path):
                         raise RuntimeError(f'HDF5 file {self.h5path} does not exist (use mode="create" to create a new file.')
-                    self._h5obj = h5py.File(self.h5path, 'r+')
+                    self._h5obj = h5py.File(self.h5path, 'r+', **self._h5fileKw())
+                    if self.storageProfile is not None:
+                        self._h5obj.attrs[storageProfileAttr] = getStorageProfile(self.storageProfile)[0]
         elif self.mode in ('overwrite', 'create', 'create-memory'):
             if self._h5obj:
                 raise RuntimeError(f'HDF5 file {self.h5path} already open.')
@@ -257,7 +373,7 @@ class HeavyDataBase(Data):
                     log.warning(f'Data will eventually disappear with mode="create-memory" and h5path="" (empty).')
                 # hdf5 uses filename for lock management (even if the file is memory block only)
                 # therefore pass if something unique if filename is not given
-                self._h5obj = h5py.File(p, mode='x', driver='core', backing_store=doSave)
+                self._h5obj = h5py.File(p, mode='x', driver='core', backing_store=doSave, **self._h5fileKw())
             else:
                 assert self.mode in ('overwrite', 'create')
                 # overwrite, create
@@ -265,16 +381,22 @@ class HeavyDataBase(Data):
                     fd, self.h5path = tempfile.mkstemp(suffix='.h5', prefix='mupif-tmp-', text=False)
                     log.info(f'Using new temporary file {self.h5path}')
                 if self.mode == 'overwrite' or useTemp:
-                    self._h5obj = h5py.File(self.h5path, 'w')
+                    self._h5obj = h5py.File(self.h5path, 'w', **self._h5fileKw())
                 # 'create' mode should fail if file exists already
                 # it would fail also with new temporary file; *useTemp* is therefore handled as overwrite
                 else:
-                    self._h5obj = h5py.File(self.h5path, 'x')
+                    self._h5obj = h5py.File(self.h5path, 'x', **self._h5fileKw())
+            self._h5obj.attrs[storageProfileAttr] = getStorageProfile(self.storageProfile)[0]
             self.mode = 'readwrite'
         else:
             raise ValueError(f'Invalid mode {self.mode}: must be one of {HeavyDataBase_ModeChoice}')
         return self._h5obj
 
+    def _h5fileKw(self):
+        'Keyword arguments for h5py.File (chunk cache size) according to the storage profile; the profile recorded in the file is not known before opening, therefore only explicit or default profile is considered.'
+        cacheBytes = getStorageProfile(self.storageProfile)[1]['cacheBytes']
+        return {} if cacheBytes is None else dict(rdcc_nbytes=cacheBytes)
+
     def preDumpHook(self):
         # remote call will expose the data throgu the daemon so that the HDF5 container gets transferred automatically
         if Pyro5.callcontext.current_context.client is not None:
@@ -321,6 +443,7 @@ class HeavyDataBase(Data):
         """Return clone of the handle; the underlying storage is copied into *newPath* (or a temporary file, if not given). All handle attributes (besides :obj:`h5path`) are preserved."""
         if self._h5obj:
             raise RuntimeError(f'HDF5 file {self.h5path} is open (call closeData() first).')
+        self.download()
         if not newPath:
             _fd, newPath = tempfile.mkstemp(suffix='.h5', prefix='mupif-tmp-', text=False)
         shutil.copy(self.h5path, newPath)
@@ -1,12 +1,14 @@
-from .heavydata import HeavyDataBase, HeavyDataBase_ModeChoice, Hdf5RefQuantity, Hdf5OwningRefQuantity
+from .heavydata import HeavyDataBase, HeavyDataBase_ModeChoice, Hdf5RefQuantity, Hdf5OwningRefQuantity, datasetStorageKw, readRows
 from .field import FieldType, Field
 from .mupifquantity import ValueType
 from .dataid import DataID
 from .units import Unit, Quantity
 from .cell import Cell
 from .vertex import Vertex
-from .mesh import Mesh
+from .mesh import Mesh, PointLocation, _encodeMixedConnectivity, _decodeMixedConnectivity, _cellBBoxes, _locatePointsArrays
+from . import mesh as _mesh
 from .bbox import BBox
+from .bvh import LinearBVH, mortonCodes
 from . import util
 from . import octree
 from . import cellgeometrytype as CGT
@@ -18,6 +20,10 @@ from typing import ClassVar
 
 log=logging.getLogger(__name__)
 
+#: default number of cells in one tile, see :obj:`HeavyUnstructuredMesh.buildTiles`
+tileCells=2**17
+#: number of cells (vertices) read at once when streaming through the whole mesh
+streamChunk=2**20
 
 @Pyro5.api.expose
 class HeavyUnstructuredMesh(HeavyDataBase,Mesh):
@@ -25,21 +31,28 @@ class HeavyUnstructuredMesh(HeavyDataBase,Mesh):
     HDF5-backed unstructured mesh with mixed topology.
 
     Vertices and cells can be added to the mesh arbitrarily (grows dynamically).
+
+    With *outOfCore*, points are located tile by tile (see :obj:`buildTiles`), so that meshes larger than the memory can be probed; only the tile index and one tile are held in memory at a time.
     '''
     dim: int=3
     h5group: str='/'
+    outOfCore: bool=False
 
     GRP_VERTS: ClassVar[str]='vertices'
     GRP_CELL_OFFSETS: ClassVar[str]='cellOffsets'
     GRP_CELL_CONN: ClassVar[str]='connectivity'
     GRP_FIELDS: ClassVar[str]='fields'
+    GRP_LOCALIZER: ClassVar[str]='localizer'
+    GRP_TILES: ClassVar[str]='tiles'
 
     # see https://github.com/nschloe/meshio/blob/main/src/meshio/xdmf/common.py
     # and https://www.xdmf.org/index.php/XDMF_Model_and_Format#Arbitrary
     def __init__(self,*a,**kw):
         HeavyDataBase.__init__(self,*a,**kw)
+        remoteFile=self._remoteFile
         Mesh.__init__(self,*a,**kw)
         self._h5obj=None # this attribute is set in HeavyDataBase ctor but somehow does not survive... (is pydantic cleaning instance attributes? probably)
+        self._remoteFile=remoteFile
         self._h5grp=None
 
     def __repr__(self): return str(self)
@@ -69,18 +82,23 @@ class HeavyUnstructuredMesh(HeavyDataBase,Mesh):
         return self._h5grp[self.GRP_CELL_OFFSETS].shape[0]
 
     def dataDigest(self):
+        'See :obj:`Mesh.dataDigest`; the digest is cached until the mesh is modified or re-opened.'
         self._ensureData()
-        # FIXME: reads datasets into memory (should just pass buffers?)
-        return util.sha1digest([np.array(self._h5grp[g]) for g in (self.GRP_VERTS,self.GRP_CELL_OFFSETS,self.GRP_CELL_CONN)])
+        if self._dataDigest is None or self._dataDigest[0]!=util.digestAlgorithm:
+            # datasets are streamed through in chunks of streamChunk rows, the digest is the same as of whole arrays
+            dss=[self._h5grp[g] for g in (self.GRP_VERTS,self.GRP_CELL_OFFSETS,self.GRP_CELL_CONN)]
+            self._dataDigest=(util.digestAlgorithm,util.dataDigest(ds[i:i+streamChunk] for ds in dss for i in range(0,ds.shape[0],streamChunk)))
+        return self._dataDigest[1]
 
     def getVertex(self,i):
         self._ensureData()
         return Vertex(number=i,label=None,coords=tuple(self._h5grp[self.GRP_VERTS][i]))
-    def getGlobalBBox(self):
+    def getVertexCoords(self):
+        'See :obj:`Mesh.getVertexCoords`. The vertex dataset is read at once.'
         self._ensureData()
-        verts=self._h5grp[self.GRP_VERTS]
-        mn,mx=np.min(verts,axis=0),np.max(verts,axis=0)
-        return BBox(coords_ll=tuple(mn),coords_ur=tuple(mx))
+        if getattr(self,'_vertexCoords',None) is None:
+            self._vertexCoords=np.array(self._h5grp[self.GRP_VERTS],dtype=np.float64)
+        return self._vertexCoords
     def getCell(self,i):
         self._ensureData()
         if self.GRP_CELL_OFFSETS in self._h5grp: offset=self._h5grp[self.GRP_CELL_OFFSETS][i]
@@ -91,39 +109,206 @@ class HeavyUnstructuredMesh(HeavyDataBase,Mesh):
         conn=self._h5grp[self.GRP_CELL_CONN][offset+1:offset+1+nVerts]
         return CellType(number=i,label=None,vertices=tuple(conn),mesh=self)
 
+    def _getCellArrays(self):
+        'See :obj:`Mesh._getCellArrays`. The mixed-topology connectivity is decoded with array operations, without creating any cells.'
+        self._ensureData()
+        if getattr(self,'_cellArrays',None) is None:
+            coords=self.getVertexCoords()
+            types,padded=_decodeMixedConnectivity(self._h5grp[self.GRP_CELL_OFFSETS][()],self._h5grp[self.GRP_CELL_CONN][()])
+            self._cellArrays=(coords,types,padded)
+        return self._cellArrays
+
+    def _setDirty(self):
+        super()._setDirty()
+        self._tileIndex=None
+        self._dropTempTiles()
+
+    def closeData(self):
+        self._dropTempTiles()
+        super().closeData()
+
+    def _readCellRange(self,c0,c1):
+        'Read cells *c0*…*c1* (exclusive) as (types,cellVertices) arrays, see :obj:`_getCellArrays`.'
+        OFF,CONN=self._h5grp[self.GRP_CELL_OFFSETS],self._h5grp[self.GRP_CELL_CONN]
+        if c1<=c0: return np.zeros((0,),dtype=np.int64),np.zeros((0,0),dtype=np.int64)
+        offsets=OFF[c0:c1]
+        conn=CONN[offsets[0]:(OFF[c1] if c1<OFF.shape[0] else CONN.shape[0])]
+        return _decodeMixedConnectivity(offsets-offsets[0],conn)
+
+    def _readCellCoords(self,conn):
+        'Read coordinates of vertices used by *conn* (padded with -1); return (vertices,coords,localConn), where *vertices* are (sorted) global vertex indices, *coords* their coordinates and *localConn* is *conn* indexing into *vertices*.'
+        valid=conn>=0
+        verts,inv=np.unique(conn[valid],return_inverse=True)
+        local=np.full(conn.shape,-1,dtype=np.int64)
+        local[valid]=inv
+        return verts,readRows(self._h5grp[self.GRP_VERTS],verts).astype(np.float64),local
+
+    def buildTiles(self,cellsPerTile=None):
+        '''
+        Partition the mesh spatially into tiles of *cellsPerTile* cells (:obj:`tileCells` by default), stored in the backing storage (in the *tiles* subgroup), for out-of-core point location (see *outOfCore*). Cells are ordered along the Morton curve of their centroids and split into contiguous tiles; each tile stores its cells (types, connectivity, global numbers), the vertices used (global numbers and coordinates) and its cell localizer. Bounding boxes of tiles form the tile index, which is the only data held in memory between queries.
+
+        The mesh is streamed through in chunks of :obj:`streamChunk` cells; only Morton codes of all cells (8 bytes per cell) are held in memory while building. Tiles are deleted whenever the mesh is modified.
+
+        If the backing storage is open read-only, tiles are stored in a temporary file instead, which is removed when the storage is closed (or re-opened); build tiles with the storage open for writing to keep them for subsequent use.
+        '''
+        self._ensureData()
+        cpt=cellsPerTile or tileCells
+        grp=self._h5grp
+        VERTS=grp[self.GRP_VERTS]
+        nv,nc=VERTS.shape[0],self.getNumberOfCells()
+        self._tileIndex=None
+        self._dropTempTiles()
+        if self._h5obj.mode=='r':
+            import h5py
+            import tempfile
+            fd,tmpPath=tempfile.mkstemp(suffix='.h5',prefix='mupif-tiles-')
+            os.close(fd)
+            log.info(f'Storage {self.h5path} is read-only, building tiles in temporary file {tmpPath}.')
+            self._tempTiles=h5py.File(tmpPath,'w')
+            tg=self._tempTiles.create_group(self.GRP_TILES)
+        else:
+            if self.GRP_TILES in grp: del grp[self.GRP_TILES]
+            tg=grp.create_group(self.GRP_TILES)
+        lo,hi=np.full(self.dim,np.inf),np.full(self.dim,-np.inf)
+        for v0 in range(0,nv,streamChunk):
+            c=VERTS[v0:v0+streamChunk]
+            lo,hi=np.minimum(lo,c.min(axis=0)),np.maximum(hi,c.max(axis=0))
+        # pass 1: Morton codes of cell centroids
+        codes=np.empty(nc,dtype=np.uint64)
+        nvMax=0
+        for c0 in range(0,nc,streamChunk):
+            c1=min(c0+streamChunk,nc)
+            types,conn=self._readCellRange(c0,c1)
+            verts,coords,local=self._readCellCoords(conn)
+            valid=local>=0
+            centroids=np.einsum('cv,cvd->cd',valid,coords[np.where(valid,local,0)])/np.count_nonzero(valid,axis=1)[:,np.newaxis]
+            codes[c0:c1]=mortonCodes(centroids,lo,hi)
+            nvMax=max(nvMax,conn.shape[1])
+        order=np.argsort(codes,kind='stable')
+        del codes
+        nTiles=(nc+cpt-1)//cpt
+        tileOf=np.empty(nc,dtype=np.int64)
+        tileOf[order]=np.arange(nc)//cpt
+        del order
+        # pass 2: distribute cells to tiles, in storage order
+        for t in range(nTiles):
+            tt=tg.create_group(str(t))
+            tt.create_dataset('cells',shape=(0,),maxshape=(None,),dtype='i8',chunks=(min(cpt,2**16),))
+            tt.create_dataset('conn',shape=(0,nvMax),maxshape=(None,nvMax),dtype='i8',chunks=(min(cpt,2**16),max(nvMax,1)))
+            tt.create_dataset('types',shape=(0,),maxshape=(None,),dtype='i8',chunks=(min(cpt,2**16),))
+        for c0 in range(0,nc,streamChunk):
+            c1=min(c0+streamChunk,nc)
+            types,conn=self._readCellRange(c0,c1)
+            conn=np.pad(conn,((0,0),(0,nvMax-conn.shape[1])),constant_values=-1)
+            tiles=tileOf[c0:c1]
+            perm=np.argsort(tiles,kind='stable')
+            uTiles,starts=np.unique(tiles[perm],return_index=True)
+            for t,s0,s1 in zip(uTiles,starts,list(starts[1:])+[perm.shape[0]]):
+                sel=perm[s0:s1]
+                tt=tg[str(t)]
+                n0=tt['cells'].shape[0]
+                for name,data in (('cells',c0+sel),('types',types[sel]),('conn',conn[sel])):
+                    tt[name].resize((n0+sel.shape[0],)+tt[name].shape[1:])
+                    tt[name][n0:]=data
+        # pass 3: localize tiles
+        boxes=np.zeros((nTiles,2,self.dim),dtype=np.float64)
+        for t in range(nTiles):
+            tt=tg[str(t)]
+            cells,types,conn=tt['cells'][()],tt['types'][()],tt['conn'][()]
+            verts,coords,local=self._readCellCoords(conn)
+            for name in ('cells','types','conn'): del tt[name]
+            for name,data in (('cells',cells),('types',types),('conn',local),('vertices',verts),('coords',coords)): tt.create_dataset(name,data=data)
+            bb=_cellBBoxes(coords,local)
+            LinearBVH(bb).toHdf5Group(tt.create_group(self.GRP_LOCALIZER))
+            boxes[t]=(bb[:,0].min(axis=0),bb[:,1].max(axis=0))
+        tg.create_dataset('bboxes',data=boxes)
+        tg.attrs['cellsPerTile']=cpt
+        tg.attrs['nVertsMax']=nvMax
+
+    def _tilesGroup(self):
+        'Return group with tiles (in the backing storage or in the temporary file, see :obj:`buildTiles`), or None if there are no tiles.'
+        if self.GRP_TILES in self._h5grp: return self._h5grp[self.GRP_TILES]
+        if (tmp:=getattr(self,'_tempTiles',None)) is not None: return tmp[self.GRP_TILES]
+        return None
+
+    def _dropTempTiles(self):
+        'Close and remove temporary file with tiles, if any.'
+        if (tmp:=getattr(self,'_tempTiles',None)) is None: return
+        tmpPath=tmp.filename
+        tmp.close()
+        os.remove(tmpPath)
+        self._tempTiles=None
+
+    def _getTileIndex(self):
+        'Return (tile bounding boxes, localizer of tiles), building tiles first if necessary.'
+        self._ensureData()
+        if self._tilesGroup() is None: self.buildTiles()
+        if getattr(self,'_tileIndex',None) is None:
+            boxes=self._tilesGroup()['bboxes'][()]
+            self._tileIndex=(boxes,LinearBVH(boxes))
+        return self._tileIndex
+
+    def _loadTile(self,t):
+        'Return (cells,types,conn,vertices,coords,localizer) of tile *t*.'
+        tt=self._tilesGroup()[str(t)]
+        return tuple(tt[name][()] for name in ('cells','types','conn','vertices','coords'))+(LinearBVH.makeFromHdf5group(tt[self.GRP_LOCALIZER]),)
+
+    def locatePoints(self,points,eps=0.0,workers=None):
+        '''
+        See :obj:`Mesh.locatePoints`. With *outOfCore*, candidate tiles of all points are found via the tile index, and points are then located tile by tile, loading one tile at a time (tiles are built by :obj:`buildTiles` on first use, in a temporary file if the storage is read-only); the result is the same as with in-core location.
+        '''
+        if not self.outOfCore: return super().locatePoints(points,eps=eps,workers=workers)
+        points=np.asarray(points,dtype=np.float64)
+        if points.ndim!=2: raise ValueError(f'points must be a 2d array (not {points.ndim}d).')
+        boxes,index=self._getTileIndex()
+        nvMax=int(self._tilesGroup().attrs['nVertsMax'])
+        offsets,tiles=index.getItemsInBBoxBatch(points-eps,points+eps)
+        pPt=np.repeat(np.arange(points.shape[0]),np.diff(offsets))
+        perm=np.argsort(tiles,kind='stable')
+        uTiles,starts=np.unique(tiles[perm],return_index=True)
+        parts=[PointLocation(points=np.zeros((0,),dtype=np.int64),cells=np.zeros((0,),dtype=np.int64),vertices=np.zeros((0,nvMax),dtype=np.int64),weights=np.zeros((0,nvMax)))]
+        for t,s0,s1 in zip(uTiles,starts,list(starts[1:])+[perm.shape[0]]):
+            pts=pPt[perm[s0:s1]]
+            cells,types,conn,verts,coords,loc=self._loadTile(t)
+            l=_locatePointsArrays(coords,types,conn,loc,points[pts],eps=eps)
+            valid=l.vertices>=0
+            parts.append(PointLocation(points=pts[l.points],cells=cells[l.cells],vertices=np.where(valid,verts[np.where(valid,l.vertices,0)],-1),weights=l.weights))
+        ret=PointLocation(*(np.concatenate(a) for a in zip(*parts)))
+        # same order as in-core location: by points, then by cells
+        order=np.lexsort((ret.cells,ret.points))
+        return PointLocation(*(a[order] for a in ret))
+
     def getCellLocalizer(self):
+        '''
+        See :obj:`Mesh.getCellLocalizer`. With :obj:`mupif.mesh.useLinearBVH`, the localizer is stored in the backing storage (in the *localizer/<dataDigest>* subgroup) when first built, and memory-mapped from there next time; stored localizer is deleted whenever the mesh is modified via :obj:`appendVertices` or :obj:`appendCells`.
+        '''
         if self._cellOctree: return self._cellOctree
-        bb=self.getGlobalBBox()
-        # move all this to the octree ctor?
-        minc, maxc = bb.coords_ll, bb.coords_ur
-        size = max(y-x for x, y in zip(minc, maxc))
-        mask = [(y-x) > 0.0 for x, y in zip(minc, maxc)]
-        self._cellOctree = octree.Octree(minc, size, tuple(mask))
-        verts=np.array(self._h5grp[self.GRP_VERTS])
-        chunkSize=10000
-        offGrp=self._h5grp[self.GRP_CELL_OFFSETS]
-        import tqdm
-        with tqdm.tqdm(total=offGrp.shape[0],unit=' cells',desc='octree') as pbar:
-            for chunkStart in range(0,offGrp.shape[0],chunkSize):
-                c0=offGrp[chunkStart]
-                c1=(offGrp[chunkStart+chunkSize] if offGrp.shape[0]>chunkStart+chunkSize else None)
-                dta=np.array(self._h5grp[self.GRP_CELL_CONN][c0:c1])
-                self._cellOctree.insertCellArrayChunk(verts,dta,chunkStart,mesh=self)
-                pbar.update(dta.shape[0])
-        assert c1 is None # the last chunk must take the rest of the array
-        return self._cellOctree
+        if _mesh.useLinearBVH:
+            self._ensureData()
+            loc=self.GRP_LOCALIZER+'/'+self.dataDigest()
+            if loc in self._h5grp:
+                self._cellOctree=LinearBVH.makeFromHdf5group(self._h5grp[loc])
+                return self._cellOctree
+            super().getCellLocalizer()
+            if self._h5obj.mode!='r':
+                HeavyUnstructuredMesh._invalidateLocalizer_static(self._h5grp)
+                self._cellOctree.toHdf5Group(self._h5grp.create_group(loc))
+            return self._cellOctree
+        return super().getCellLocalizer()
 
     @staticmethod
     def _prepStorage_static(h5grp,dim):
-        kw=dict(chunks=True,compression='gzip',compression_opts=9)
         HUM=HeavyUnstructuredMesh
-        if HUM.GRP_VERTS not in h5grp: h5grp.create_dataset(HUM.GRP_VERTS,shape=(0,dim),maxshape=(None,dim),dtype='f8',**kw)
-        if HUM.GRP_CELL_OFFSETS not in h5grp: h5grp.create_dataset(HUM.GRP_CELL_OFFSETS,shape=(0,),maxshape=(None,),dtype='i8',**kw)
-        if HUM.GRP_CELL_CONN not in h5grp: h5grp.create_dataset(HUM.GRP_CELL_CONN,shape=(0,),maxshape=(None,),dtype='i8',**kw)
+        for grp,shape,dtype in ((HUM.GRP_VERTS,(0,dim),'f8'),(HUM.GRP_CELL_OFFSETS,(0,),'i8'),(HUM.GRP_CELL_CONN,(0,),'i8')):
+            if grp in h5grp: continue
+            maxshape=(None,)+shape[1:]
+            h5grp.create_dataset(grp,shape=shape,maxshape=maxshape,dtype=dtype,**datasetStorageKw(h5grp,shape=shape,dtype=dtype,maxshape=maxshape,default=dict(chunks=True,compression='gzip',compression_opts=9)))
 
     def openData(self, mode: HeavyDataBase_ModeChoice):
         'Opens the backing storage (HDF5 file) and prepares'
         self.openStorage(mode=mode)
+        # the file might have been changed in the meantime
+        self._setDirty()
         self._h5grp=self._h5obj.require_group(self.h5group)
         #extant=(self.h5group in self._h5obj and self.GRP_VERTS in self._h5obj[self.h5group])
         #if not extant:
@@ -135,15 +320,23 @@ class HeavyUnstructuredMesh(HeavyDataBase,Mesh):
         assert self.GRP_CELL_OFFSETS in self._h5grp
 
 
+    @staticmethod
+    def _invalidateLocalizer_static(h5grp):
+        'Remove localizer(s) stored by :obj:`getCellLocalizer` and tiles stored by :obj:`buildTiles`.'
+        if HeavyUnstructuredMesh.GRP_LOCALIZER in h5grp: del h5grp[HeavyUnstructuredMesh.GRP_LOCALIZER]
+        if HeavyUnstructuredMesh.GRP_TILES in h5grp: del h5grp[HeavyUnstructuredMesh.GRP_TILES]
+
     def appendVertices(self, coords: np.ndarray):
         self._ensureData()
-        return self.appendVertices_static(self._h5obj,self.dim,coords)
+        self._setDirty()
+        return self.appendVertices_static(self._h5grp,self.dim,coords)
         
     @staticmethod
     def appendVertices_static(h5grp, dim: int, coords: np.ndarray):
         'TODO: add to UnstructuredMesh API (and Mesh as abstract) as well'
         # print('appendVertices coords: ',coords)
         if coords.shape[1]!=dim: raise RuntimeError(f'Dimension mismatch: HeavyUnstructuredMesh.dim={dim}, coords.shape[1]={coords.shape[1]}.')
+        HeavyUnstructuredMesh._invalidateLocalizer_static(h5grp)
         _VERTS=h5grp[HeavyUnstructuredMesh.GRP_VERTS]
         l0,l1=_VERTS.shape[0],_VERTS.shape[0]+coords.shape[0]
         _VERTS.resize((l1,dim))
@@ -151,40 +344,58 @@ class HeavyUnstructuredMesh(HeavyDataBase,Mesh):
 
     def appendCells(self,types,conn):
         self._ensureData()
+        self._setDirty()
         return self.appendCells_static(self._h5grp,types,conn)
 
+    def appendMixedCells(self,offsets,conn):
+        self._ensureData()
+        self._setDirty()
+        return self.appendMixedCells_static(self._h5grp,offsets,conn)
+
     @staticmethod
     def appendCells_static(h5grp,types,conn):
-        'TODO: add to UnstructuredMesh API (and Mesh as abstract) as well'
-        _OFF,_CONN=h5grp[HeavyUnstructuredMesh.GRP_CELL_OFFSETS],h5grp[HeavyUnstructuredMesh.GRP_CELL_CONN]
-        assert len(types)==len(conn)
-        numCells=h5grp[HeavyUnstructuredMesh.GRP_CELL_OFFSETS].shape[0]
-        if numCells==0: off=0
+        '''
+        Append cells to the storage; the XDMF connectivity is assembled with array operations and written as one slab.
+
+        :param types: cell geometry type of each cell; a single type for a homogeneous block of cells
+        :param conn: (M,nVerts) array of vertex indices for a homogeneous block; (M,nVertsMax) array padded with -1 or a sequence of M sequences otherwise
+        '''
+        if np.ndim(types)==0:
+            conn=np.asarray(conn,dtype=np.int64)
+            nVerts=CGT.cgt2numVerts[types]
+            if conn.ndim!=2 or conn.shape[1]!=nVerts: raise RuntimeError(f'Cells of type {types} should have {nVerts} vertices but array of shape {conn.shape} was given.')
+            # homogeneous block: XDMF type followed by vertices, row by row
+            mixed=np.empty((conn.shape[0],nVerts+1),dtype=np.int64)
+            mixed[:,0]=CGT.cgt2xdmfIndex[types]
+            mixed[:,1:]=conn
+            offsets=np.arange(conn.shape[0],dtype=np.int64)*(nVerts+1)
+            mixed=mixed.reshape(-1)
         else:
-            lastOff=_OFF[numCells-1]
-            # must convert xdmf cell type back to mupif cell type
-            lastLen=1+CGT.cgt2numVerts[CGT.xdmfIndex2cgt[_CONN[lastOff]]]
-            off=lastOff+lastLen
-            # print(f'adding {len(types)} cells, offset is {off} (lastOff={lastOff},lastLen={lastLen})')
-        # check number of vertices first
-        for t,cc in zip(types,conn):
-            if len(cc)!=CGT.cgt2numVerts[t]: raise RuntimeError(f'Cell of type {t} should have {CGT.cgt2numVerts[t]} vertices but {len(cc)} was given.')
-        l0=_OFF.shape[0]
-        # resize datasets
-        dConn,dOff=sum([1+CGT.cgt2numVerts[t] for t in types]),len(types)
-        # print(f'extending conn {_CONN.shape[0]} by {dConn}, offset {_OFF.shape[0]} by {dOff}')
-        _CONN.resize((_CONN.shape[0]+dConn,))
-        _OFF.resize((_OFF.shape[0]+dOff,))
-        import sys
-        # assign data
-        for i,(t,cc) in enumerate(zip(types,conn)):
-            _OFF[l0+i]=off
-            _CONN[off:off+1+len(cc)]=[CGT.cgt2xdmfIndex[t]]+list(cc)
-            #  sys.stderr.write(f'{len(cc)}')
-            off+=len(cc)+1
-            # sys.stdout.write(f'[{off};{off/9}]')
-        # print(f'new offset is {off}, shape is {_CONN.shape}')
-        assert off==_CONN.shape[0]
+            if len(types)!=len(conn): raise RuntimeError(f'Number of cell types ({len(types)}) and cells ({len(conn)}) do not match.')
+            try: offsets,mixed=_encodeMixedConnectivity(types,conn)
+            except ValueError as e: raise RuntimeError(str(e)) from None
+        HeavyUnstructuredMesh.appendMixedCells_static(h5grp,offsets,mixed)
+
+    @staticmethod
+    def appendMixedCells_static(h5grp,offsets,conn):
+        '''
+        Append cells already encoded in the XDMF mixed-topology layout (e.g. read from another XDMF/HDF5 file), without decoding them.
+
+        :param offsets: (M,) positions of cells in *conn* (relative to its beginning)
+        :param conn: connectivity, each cell as its XDMF type followed by vertex indices
+        '''
+        offsets,conn=np.asarray(offsets,dtype=np.int64),np.asarray(conn,dtype=np.int64)
+        if offsets.ndim!=1 or conn.ndim!=1: raise RuntimeError(f'Offsets and connectivity must be 1d arrays (shapes {offsets.shape} and {conn.shape} given).')
+        if offsets.shape[0]>0 and (offsets[0]!=0 or np.any(np.diff(offsets)<=0) or offsets[-1]>=conn.shape[0]): raise RuntimeError('Offsets must start at 0 and be increasing within connectivity.')
+        HeavyUnstructuredMesh._invalidateLocalizer_static(h5grp)
+        _OFF,_CONN=h5grp[HeavyUnstructuredMesh.GRP_CELL_OFFSETS],h5grp[HeavyUnstructuredMesh.GRP_CELL_CONN]
+        # cells are stored contiguously, new ones start at the end of the connectivity
+        l0,off=_OFF.shape[0],_CONN.shape[0]
+        _OFF.resize((l0+offsets.shape[0],))
+        _CONN.resize((off+conn.shape[0],))
+        if offsets.shape[0]==0: return
+        _OFF[l0:]=offsets+off
+        _CONN[off:]=conn
 
     def writeXDMF(self,xdmf=None,fields=[]):
         'Write crude XDMF file for inspection — without copying any of the heavy data.'
@@ -235,23 +446,26 @@ class HeavyUnstructuredMesh(HeavyDataBase,Mesh):
         h5grp.attrs['unit']=('' if unit is None else str(unit))
         # for now, don't allow adding mesh to an existing one
         # (it would be possible, only vertex number would have to be offset; usefulness = ?)
-        def seq(s,what):
-            chunked=_chunker(s,chunk)
+        def seq(n,what):
+            'Yield slices of *chunk* items out of *n*.'
+            slices=(slice(i,min(i+chunk,n)) for i in range(0,n,chunk))
             if not progress:
-                for c in chunked: yield c
+                yield from slices
                 return
-            import tqdm, math, warnings
+            import tqdm, warnings
             warnings.simplefilter('ignore',tqdm.TqdmWarning)
-            with tqdm.tqdm(total=len(s),unit=what,desc='meshio import') as pbar:
-                for c in chunked:
-                    yield c
-                    pbar.update(len(c))
-        for vv in seq(mesh.points,what=' verts'):
-            HeavyUnstructuredMesh.appendVertices_static(h5grp,dim=dim,coords=np.vstack(vv))
+            with tqdm.tqdm(total=n,unit=what,desc='meshio import') as pbar:
+                for s in slices:
+                    yield s
+                    pbar.update(s.stop-s.start)
+        points=np.asarray(mesh.points)
+        for s in seq(points.shape[0],what=' verts'):
+            HeavyUnstructuredMesh.appendVertices_static(h5grp,dim=dim,coords=points[s])
         for block in mesh.cells:
             cgt=CGT.meshioName2cgt[block.type]
-            for cc in seq(block.data,what=' '+block.type):
-                HeavyUnstructuredMesh.appendCells_static(h5grp,types=len(cc)*[cgt],conn=cc)
+            data=np.asarray(block.data)
+            for s in seq(data.shape[0],what=' '+block.type):
+                HeavyUnstructuredMesh.appendCells_static(h5grp,types=cgt,conn=data[s])
 
     def makeHeavyField(self,*,fieldID,fieldType,valueType,unit,h5path='',dtype='f8',h5mode='create',fieldTime=0*Unit('s')):
         '''
@@ -278,13 +492,12 @@ class HeavyUnstructuredMesh(HeavyDataBase,Mesh):
         n=(self.getNumberOfVertices() if fieldType==FieldType.FT_vertexBased else self.getNumberOfCells())
         if valueType.getNumberOfComponents()==1: shape=(n,)
         else: shape=(n,valueType.getNumberOfComponents())
-        kw=dict(chunks=True,compression='gzip',compression_opts=9)
         if not h5path:
-            ds=self._h5grp.create_dataset(self.GRP_FIELDS+'/'+fieldID.name,shape=shape,**kw)
+            ds=self._h5grp.create_dataset(self.GRP_FIELDS+'/'+fieldID.name,shape=shape,dtype=dtype,**datasetStorageKw(self._h5grp,shape=shape,dtype=dtype,profile=self.storageProfile,default=dict(chunks=True,compression='gzip',compression_opts=9)))
             hq=Hdf5RefQuantity(dataset=ds,unit=unit)
         else:
-            hq=Hdf5OwningRefQuantity(mode=h5mode,h5path=h5path,h5loc=self.GRP_FIELDS+'/'+fieldID.name,unit=unit)
-            hq.allocateDataset(shape=shape,unit=unit,**kw)
+            hq=Hdf5OwningRefQuantity(mode=h5mode,h5path=h5path,h5loc=self.GRP_FIELDS+'/'+fieldID.name,unit=unit,storageProfile=self.storageProfile)
+            hq.allocateDataset(shape=shape,unit=unit,dtype=dtype,**datasetStorageKw(None,shape=shape,dtype=dtype,profile=self.storageProfile,default=dict(chunks=True,compression='gzip',compression_opts=9)))
         hq.dataset.attrs['fieldType']=fieldType.name
         hq.dataset.attrs['valueType']=valueType.name
         hq.dataset.attrs['time']=str(fieldTime)
@@ -326,16 +539,6 @@ class HeavyUnstructuredMesh(HeavyDataBase,Mesh):
 
 
 
-def _chunker(it,size):
-    rv = [] 
-    for i,el in enumerate(it,1) :
-        rv.append(el)
-        if i % size == 0 :
-            yield rv
-            rv = []
-    if rv : yield rv
-
-
 if __name__=='__main__':
     # crude testing code, look away
     if 1:
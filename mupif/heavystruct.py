@@ -10,7 +10,7 @@ import Pyro5.api
 # from .data import Data
 from . import units, pyroutil, baredata, field
 from . import dataid
-from .heavydata import HeavyDataBase, HeavyDataBase_ModeChoice, HeavyConvertible
+from .heavydata import HeavyDataBase, HeavyDataBase_ModeChoice, HeavyConvertible, datasetStorageKw
 from .pyrofile import PyroFile
 import types
 import json
@@ -803,7 +803,7 @@ def _cookSchema(desc, prefix='', schemaName='', fakeModule='', datasetName='', n
             dsname=self.__class__.datasetName
             if dsname not in self.ctx.h5group: # create new dataset, initialize, return
                 if size==0: return # request to reset but nothing is here
-                self.ctx.dataset=self.ctx.h5group.create_dataset(dsname,shape=(size,),maxshape=(None,),dtype=ret.dtypes,compression='gzip')
+                self.ctx.dataset=self.ctx.h5group.create_dataset(dsname,shape=(size,),maxshape=(None,),dtype=ret.dtypes,**datasetStorageKw(self.ctx.h5group,shape=(size,),dtype=ret.dtypes,maxshape=(None,),default=dict(compression='gzip')))
                 self.ctx.dataset.attrs['schema']=self.schemaName
                 _initrows(ds=self.ctx.dataset,rowmin=0,rowmax=size-1)
                 return
@@ -823,14 +823,118 @@ def _cookSchema(desc, prefix='', schemaName='', fakeModule='', datasetName='', n
                     # sys.stderr.write(f'Resizing {self.ctx.dataset}, {prevSize} → {size}: deleting {p}\n')
                     if p in self.ctx.h5group: del self.ctx.h5group[p]
                     else: pass # sys.stderr.write(f'{self.ctx.h5group}: does not contain {p}, not deleted')
+    def _T_rowSelection(self,rows):
+        '''
+        Normalize *rows* (None, int, slice, integer or boolean array) to a selection of the backing dataset.
+        Index arrays are returned as (unique sorted indices, inverse) tuple, since HDF5 point selections must be increasing.
+        '''
+        if rows is None: return (slice(None) if self.row is None else self.row)
+        if self.row is not None: raise IndexError(f'Context already indexed with row={self.row}, *rows* must not be given.')
+        if isinstance(rows,(slice,numbers.Integral)): return rows
+        n=self.ctx.dataset.shape[0]
+        rows=np.asarray(rows)
+        if rows.dtype==bool:
+            if rows.shape!=(n,): raise IndexError(f'Boolean row mask has shape {rows.shape}, should be ({n},).')
+            rows=np.nonzero(rows)[0]
+        if rows.ndim!=1 or not np.issubdtype(rows.dtype,np.integer): raise IndexError('Row index array must be 1d array of integers or booleans.')
+        rows=np.where(rows<0,rows+n,rows)
+        if rows.size>0 and (rows.min()<0 or rows.max()>=n): raise IndexError(f'Row index out of range 0…{n}.')
+        return np.unique(rows,return_inverse=True)
+    def _T_readRows(src,sel):
+        'Read selection *sel* (as returned by _T_rowSelection) from *src* (dataset or its fields wrapper) as one structured array.'
+        if not isinstance(sel,tuple): return src[sel]
+        uniq,inv=sel
+        if uniq.size==0: return src[0:0]
+        lo,hi=int(uniq[0]),int(uniq[-1])+1
+        # dense selections are read as one contiguous block, which is much faster than HDF5 point selection
+        if hi-lo<=2*uniq.size: data=src[lo:hi][uniq-lo]
+        else: data=src[uniq]
+        return data[inv]
+    def _T_writeRows(ds,sel,data):
+        'Write structured array *data* (as read by _T_readRows with the same *sel*) back to *ds*.'
+        if not isinstance(sel,tuple):
+            ds[sel]=data
+            return
+        uniq,inv=sel
+        if uniq.size==0: return
+        # with duplicate indices, the last value wins
+        last=np.empty(uniq.size,dtype=np.intp)
+        last[inv]=np.arange(inv.size)
+        lo,hi=int(uniq[0]),int(uniq[-1])+1
+        if hi-lo<=2*uniq.size:
+            block=ds[lo:hi]
+            block[uniq-lo]=data[last]
+            ds[lo:hi]=block
+        else: ds[uniq]=data[last]
+    def _T_columnNames(names,*,ret=ret):
+        'Return fully-qualified names of value columns given by *names* (relative to the context), or all value columns if *names* is None.'
+        if names is None: return list(ret.units.keys())
+        if isinstance(names,str): names=[names]
+        fqs=[(f'{prefix}.{n}' if prefix else n) for n in names]
+        for fq in fqs:
+            if fq not in ret.units: raise KeyError(f"'{fq}' is not a value column in schema {schemaName} (value columns: {', '.join(ret.units.keys())}).")
+        return fqs
+    def T_getColumns(self,names=None,rows=None,*,ret=ret):
+        '''
+        Read value columns for many rows at once, as a single HDF5 read of the structured dataset.
+
+        :param names: column names (relative to this context, e.g. ``'identity.element'`` for the top-level context), or None for all value columns
+        :param rows: None (all rows, or the row of this context, if set), int, slice, array of integer indices (in any order, possibly repeated) or boolean mask
+        :return: dictionary of column name → numpy array (or ``Quantity`` for columns with units); values are returned as stored, i.e. strings as bytes and choices as their numeric codes
+        :rtype: dict
+        '''
+        _T_assertDataset(self,msg=f'when reading columns')
+        fqs=_T_columnNames(names)
+        if not fqs: return {}
+        sel=_T_rowSelection(self,rows)
+        data=_T_readRows(self.ctx.dataset.fields(fqs),sel)
+        res={}
+        for fq in fqs:
+            val,unit=data[fq],ret.units[fq]
+            res[fq[len(prefix)+1:] if prefix else fq]=(val if unit is None else units.Quantity(value=val,unit=unit))
+        return res
+    def T_setColumns(self,columns,rows=None,*,ret=ret):
+        '''
+        Write value columns for many rows at once; rows are read and written back as one structured array, regardless of the column types.
+
+        :param columns: dictionary of column name → value(s); values with units are converted to the unit of the column; scalars are broadcast over all selected rows
+        :param rows: row selection, see ``getColumns``
+        '''
+        _T_assertWritable(self,msg=f'when writing columns')
+        _T_assertDataset(self,msg=f'when writing columns')
+        fqs=_T_columnNames(list(columns.keys()))
+        sel=_T_rowSelection(self,rows)
+        ds=self.ctx.dataset
+        data=_T_readRows(ds,sel)
+        for fq,val in zip(fqs,columns.values()):
+            if (unit:=ret.units[fq]) is not None: val=units.Quantity(val).to(unit).value
+            if data.dtype[fq].kind=='O' and not isinstance(val,(str,bytes)):
+                # variable-length items: build object array by hand, so that numpy does not try to stack them
+                if isinstance(data,np.void): data[fq]=val
+                else:
+                    if len(val)!=len(data): raise ValueError(f"'{fq}': {len(val)} values given for {len(data)} rows.")
+                    obj=np.empty(len(val),dtype=object)
+                    for i,v in enumerate(val): obj[i]=v
+                    data[fq]=obj
+            else: data[fq]=val
+        _T_writeRows(ds,sel,data)
+    def T_getColumn(self,name,rows=None):
+        'Read single value column, see ``getColumns``.'
+        return list(self.getColumns(names=[name],rows=rows).values())[0]
+    def T_setColumn(self,name,value,rows=None):
+        'Write single value column, see ``setColumns``.'
+        self.setColumns({name:value},rows=rows)
     def T_inject(self,other):
         self.from_dump(other.to_dump())
     def T_to_dump(self,*,ret=ret):
         _T_assertDataset(self,msg=f'when dumping')
+        # all value columns are read at once
+        row0=(0 if self.row is None else self.row)
+        if ret.units: data=self.ctx.dataset.fields(list(ret.units.keys()))[slice(None) if self.row is None else slice(row0,row0+1)]
         def _onerow(row):
             d={'_schema':{"name":schemaName,"version":schemaVersion}}
             for fq,unit in ret.units.items(): #
-                d[fq]=(self.ctx.dataset[row,fq],unit)
+                d[fq]=(data[fq][row-row0],unit)
             for fq,(subpath,schema) in ret.subpaths.items():
                 SchemaT=self.ctx.schemaRegistry[schema]
                 subpath=subpath.replace('{ROW}',str(row))
@@ -843,8 +947,7 @@ def _cookSchema(desc, prefix='', schemaName='', fakeModule='', datasetName='', n
         else: return [_onerow(r) for r in range(self.ctx.dataset.shape[0])]
     def T_from_dump(self,dump,*,ret=ret):
         _T_assertWritable(self,msg=f'when applying dump')
-        def _onerow(row,di):
-            rowdata=self.ctx.dataset[row]
+        def _onerow(row,rowdata,di):
             s2n,s2v=di['_schema']['name'],di['_schema']['version']
             if s2n!=self.schemaName: raise ValueError(f'Schema mismatch: source {s2n}, target {self.schemaName}')
             if s2v!=self.schemaVersion: log.warning('Schema {s2n} version mismatch: source {s2v}, target {self.schemaVersion}')
@@ -863,16 +966,21 @@ def _cookSchema(desc, prefix='', schemaName='', fakeModule='', datasetName='', n
                 else:
                     raise ValueError(f'Key {fq} not in target schema {self.schemaName}, in {self.ctx.h5group}.')
                     # key not in target schema
-            self.ctx.dataset[row]=rowdata
+        # rows are modified in memory and written back as one structured array
         if self.row is not None:
             assert isinstance(dump,dict)
             _T_assertDataset(self,msg=f'when applying dump with row={self.row}')
-            _onerow(self.row,dump)
+            data=self.ctx.dataset[self.row]
+            _onerow(self.row,data,dump)
+            self.ctx.dataset[self.row]=data
         else:
             assert isinstance(dump,list)
             self.resize(len(dump),reset=True)
+            if len(dump)==0: return
             _T_assertDataset(self,msg=f'when applying dump')
-            for row,di in enumerate(dump): _onerow(row,di)
+            data=self.ctx.dataset[:]
+            for row,di in enumerate(dump): _onerow(row,data[row],di)
+            self.ctx.dataset[:]=data
 
     def T_iter(self):
         _T_assertDataset(self,msg=f'when iterating')
@@ -884,6 +992,11 @@ def _cookSchema(desc, prefix='', schemaName='', fakeModule='', datasetName='', n
     meth['__len__']=T_len
     meth['row']=None
     meth['ctx']=None
+    # columnar bulk access, for all contexts (column names are relative to the context)
+    meth['getColumns']=T_getColumns
+    meth['setColumns']=T_setColumns
+    meth['getColumn']=T_getColumn
+    meth['setColumn']=T_setColumn
     # __del__ note: it would be nice to use context destructor to unregister contexts from Pyro
     # (those which registered automatically). Since the daemon is holding one reference, however,
     # the dtor will never be called, unfortunately
@@ -948,17 +1061,17 @@ def _make_grains(h5name):
                 #m=g.getMolecules()[im]
                 # print('molecule: ',m)
                 m.getIdentity().setMolecularWeight(random.randint(1,10)*u.yg)
-                m.getAtoms().resize(size=random.randint(30,60))
-                for a in m.getAtoms():
-                    #for ia in range(len(m.getAtoms())):
-                    #a=m.getAtoms()[ia]
-                    a.getIdentity().setElement(random.choice(['H','N','Cl','Na','Fe']))
-                    a.getProperties().getTopology().setPosition((1,2,3)*u.nm)
-                    a.getProperties().getTopology().setVelocity((24,5,77)*u.m/u.s)
-                    # not yet, see https://stackoverflow.com/q/67192725/761090
-                    struct=np.array([random.randint(1,20) for i in range(random.randint(5,20))],dtype='l')
-                    a.getProperties().getTopology().setStructure(struct)
-                    atomCounter+=1
+                atoms=m.getAtoms()
+                nAtoms=random.randint(30,60)
+                atoms.resize(size=nAtoms)
+                # columnar access: all atoms of the molecule are written at once
+                atoms.setColumns({
+                    'identity.element':np.array([random.choice(['H','N','Cl','Na','Fe']) for i in range(nAtoms)],dtype='a2'),
+                    'properties.topology.position':np.tile((1,2,3),(nAtoms,1))*u.nm,
+                    'properties.topology.velocity':np.tile((24,5,77),(nAtoms,1))*u.m/u.s,
+                    'properties.topology.structure':[np.array([random.randint(1,20) for i in range(random.randint(5,20))],dtype='l') for a in range(nAtoms)],
+                })
+                atomCounter+=nAtoms
     t1=time.time()
     log.info(f'{atomCounter} atoms created in {t1-t0:g} sec ({atomCounter/(t1-t0):g}/sec).')
 
@@ -977,12 +1090,8 @@ def _read_grains(h5name):
             log.info(f'Grain #{g.row} has {len(g.getMolecules())} molecules.')
             for m in g.getMolecules():
                 m.getIdentity().getMolecularWeight()
-                for a in m.getAtoms():
-                    a.getIdentity().getElement()
-                    a.getProperties().getTopology().getPosition()
-                    a.getProperties().getTopology().getVelocity()
-                    a.getProperties().getTopology().getStructure()
-                    atomCounter += 1
+                cols = m.getAtoms().getColumns(['identity.element', 'properties.topology.position', 'properties.topology.velocity', 'properties.topology.structure'])
+                atomCounter += len(cols['identity.element'])
     t1 = time.time()
     log.info(f'{atomCounter} atoms read in {t1-t0:g} sec ({atomCounter/(t1-t0):g}/sec).')
 
@@ -1111,7 +1220,7 @@ Each parent group defines a special property ``schema_fragment`` which returns t
     def __init__(self, **kw):
         super().__init__(**kw)
 
-    @pydantic.validate_call
+    @baredata.validateCall
     def openData(self,mode=typing.Optional[HeavyDataBase_ModeChoice]):
         '''
         Return top context for the underlying HDF5 data. The context is automatically published through Pyro5 daemon, if the :obj:`HeavyStruct` instance is also published (this is true recursively, for all subcontexts). The contexts are unregistered when :obj:`HeavyStruct.closeData` is called (directly or via context manager).
@@ -22,6 +22,7 @@
 #
 from builtins import object
 import Pyro5.api
+import numpy as np
 
 
 @Pyro5.api.expose
@@ -52,6 +53,25 @@ class Localizer(object):
         """
         return []
 
+    def getItemsInBBoxBatch(self, coords_ll, coords_ur):
+        """
+        Batched variant of :obj:`getItemsInBBox`, querying many bounding boxes at once. This generic implementation calls :obj:`getItemsInBBox` for every box; derived classes should provide something faster.
+
+        :param numpy.ndarray coords_ll: (N,dim) array of lower-left corners
+        :param numpy.ndarray coords_ur: (N,dim) array of upper-right corners
+        :return: (offsets,items) in CSR layout: items (as integers) in the i-th box are ``items[offsets[i]:offsets[i+1]]``
+        :rtype: (numpy.ndarray,numpy.ndarray)
+        """
+        from . import bbox
+        offsets = np.zeros(len(coords_ll)+1, dtype=np.int64)
+        items = []
+        for i, (ll, ur) in enumerate(zip(coords_ll, coords_ur)):
+            # older localizers may return objects rather than their numbers
+            found = sorted([getattr(it, 'number', it) for it in self.getItemsInBBox(bbox.BBox(tuple(ll), tuple(ur)))])
+            items.extend(found)
+            offsets[i+1] = offsets[i]+len(found)
+        return offsets, np.array(items, dtype=np.int64)
+
     def evaluate(self, functor):
         """
         Returns the list of all objects for which the functor is satisfied.
@@ -2,6 +2,9 @@ from . import data
 import Pyro5.api
 import typing
 import pydantic
+import numpy as np
+import scipy.spatial
+import scipy.interpolate
 
 from .units import Quantity
 from .units import Unit
@@ -34,6 +37,11 @@ class LookupTable(data.Data):
 @Pyro5.api.expose
 class MemoryLookupTable(LookupTable):
     """
+    Lookup table stored in memory. A record matches the parameters if all parameters are within *tolerance* from the record's parameters; the first matching record is returned.
+
+    Records are converted to a numpy array and indexed by a KD-tree over the parameter columns on first evaluation, so that the lookup takes logarithmic rather than linear time; the index is rebuilt after :obj:`_setData` (modifying *data* in-place afterwards is not detected). Many parameter tuples can be looked up at once with :obj:`evaluateBatch`.
+
+    If *interpolate* is True, values for parameters not matching any record are interpolated linearly between records: multilinearly if the records form a full tensor-product grid, otherwise piecewise-linearly over Delaunay triangulation of the parameter space; *default_value* is only returned outside of the data range.
 
     .. automethod:: __init__
     """
@@ -42,12 +50,14 @@ class MemoryLookupTable(LookupTable):
     units: typing.List[Unit] = []  # first element stores unit of the value, the rest of the elements stores units of the particular parameters
     default_value: float = None
     tolerance: float = 0.0001
+    interpolate: bool = False  # interpolate between records if no record matches
 
     def __init__(self, *, metadata={}, **kw):
         super().__init__(metadata=metadata, **kw)
 
         self.n_records = len(self.data)
         self.n_params = len(self.data[0])-1
+        self._index = None
 
     def _setData(self, data):
         if len(data):
@@ -56,6 +66,83 @@ class MemoryLookupTable(LookupTable):
                 if len(record) != len_check:
                     raise ValueError("All data must have the same length!")
             self.data = data
+            self.n_records = len(data)
+            self.n_params = len_check-1
+            self._index = None
+
+    def _getIndex(self):
+        """
+        Return (table,tree) where *table* is (n_records,1+n_params) array of the data and *tree* is KD-tree over the parameter columns; build them if necessary.
+        """
+        if getattr(self, '_index', None) is None:
+            table = np.array(self.data, dtype=np.float64).reshape(-1, self.n_params+1)
+            self._index = (table, scipy.spatial.cKDTree(table[:, 1:]))
+            self._interpolator = None
+        return self._index
+
+    def _getInterpolator(self):
+        """
+        Return function interpolating values from (N,n_params) array of parameters (NaN outside of the data range).
+        """
+        table, tree = self._getIndex()
+        if self._interpolator is not None: return self._interpolator
+        params, values = table[:, 1:], table[:, 0]
+        axes, inv = zip(*[np.unique(params[:, j], return_inverse=True) for j in range(self.n_params)])
+        shape = tuple(len(a) for a in axes)
+        flat = np.ravel_multi_index(tuple(i.ravel() for i in inv), shape)
+        # first record for each grid node, as in the lookup
+        nodes, first = np.unique(flat, return_index=True)
+        if len(nodes) == np.prod(shape):
+            grid = np.empty(shape)
+            grid.ravel()[nodes] = values[first]
+            if min(shape) < 2:
+                # RegularGridInterpolator needs at least two nodes along each axis: drop degenerate axes
+                keep = [j for j in range(self.n_params) if shape[j] > 1]
+                interp = scipy.interpolate.RegularGridInterpolator([axes[j] for j in keep], grid.reshape([shape[j] for j in keep]), bounds_error=False, fill_value=np.nan) if keep else (lambda x: np.full(x.shape[0], grid.ravel()[0]))
+                degenerate = [(j, axes[j][0]) for j in range(self.n_params) if shape[j] == 1]
+
+                def fn(x):
+                    out = np.asarray(interp(x[:, keep]), dtype=np.float64)
+                    for j, a in degenerate: out[np.abs(x[:, j]-a) > self.tolerance] = np.nan
+                    return out
+                self._interpolator = fn
+            else:
+                self._interpolator = scipy.interpolate.RegularGridInterpolator(axes, grid, bounds_error=False, fill_value=np.nan)
+        else:
+            if self.n_params < 2: raise ValueError('Interpolation of scattered data requires at least two parameters.')
+            self._interpolator = scipy.interpolate.LinearNDInterpolator(params, values, fill_value=np.nan)
+        return self._interpolator
+
+    def evaluateBatch(self, params, returnMask=False):
+        """
+        Returns values for many parameter tuples at once.
+
+        :param params: sequence of n_params Quantities (scalars or arrays of length N, one for each parameter), or (N,n_params) array of parameter values in table units
+        :param bool returnMask: if True, also return boolean mask of tuples for which no value was found (and *default_value*, or NaN if not given, was used)
+        :return: (N,) values (and the mask, if *returnMask* is True)
+        :rtype: Quantity or (Quantity,numpy.ndarray)
+        """
+        if isinstance(params, np.ndarray) and params.dtype != object:
+            x = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        else:
+            if len(params) != self.n_params:
+                raise ValueError("Unexpected number of given parameters.")
+            x = np.stack(np.broadcast_arrays(*[np.atleast_1d(np.asarray(params[j].inUnitsOf(self.units[j+1]).value, dtype=np.float64)) for j in range(self.n_params)]), axis=1)
+        if x.shape[1] != self.n_params:
+            raise ValueError("Unexpected number of given parameters.")
+        table, tree = self._getIndex()
+        out = np.full(x.shape[0], np.nan)
+        if table.shape[0]:
+            # within tolerance in all parameters = Chebyshev distance (p=inf); take the first matching record
+            for i, recs in enumerate(tree.query_ball_point(x, r=self.tolerance, p=np.inf)):
+                if recs: out[i] = table[min(recs), 0]
+            if self.interpolate and np.isnan(out).any():
+                miss = np.isnan(out)
+                out[miss] = self._getInterpolator()(x[miss])
+        mask = np.isnan(out)
+        if self.default_value is not None: out[mask] = self.default_value
+        ret = Quantity(out, self.units[0])
+        return (ret, mask) if returnMask else ret
 
     def evaluate(self, params):
         """
@@ -65,12 +152,6 @@ class MemoryLookupTable(LookupTable):
         """
         if len(params) != self.n_params:
             raise ValueError("Unexpected number of given parameters.")
-        for record in self.data:
-            match = True
-            for j in range(0, self.n_params):
-                if params[j].inUnitsOf(self.units[j+1]).value < record[j+1]-self.tolerance or params[j].inUnitsOf(self.units[j+1]).value > record[j+1]+self.tolerance:
-                    match = False
-                    break
-            if match is True:
-                return Quantity(record[0], self.units[0])
-        return self.default_value
+        val, mask = self.evaluateBatch(params, returnMask=True)
+        if mask[0]: return self.default_value
+        return Quantity(val.value[0], self.units[0])
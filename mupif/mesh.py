@@ -24,6 +24,8 @@ from __future__ import annotations
 
 from . import apierror
 from . import octree
+from . import bvh
+from . import parallel
 from . import bbox
 from . import baredata
 from . import vertex
@@ -43,6 +45,7 @@ import typing
 from . import cellgeometrytype
 import pickle
 import deprecated
+import collections
 import numpy as np
 
 import pydantic
@@ -54,6 +57,125 @@ CELLS = 1
 # debug flag
 debug = 0
 
+# use array-based bvh.LinearBVH (built in bulk) as vertex and cell localizer; octree.Octree is used otherwise
+useLinearBVH = True
+
+# lookup tables for (de)coding the XDMF mixed-topology connectivity with numpy fancy indexing
+_xdmf2cgt=numpy.full(max(cellgeometrytype.xdmfIndex2cgt.keys())+1,-1,dtype=numpy.int64)
+for _x,_c in cellgeometrytype.xdmfIndex2cgt.items(): _xdmf2cgt[_x]=_c
+_cgt2xdmf=numpy.full(max(cellgeometrytype.cgt2xdmfIndex.keys())+1,-1,dtype=numpy.int64)
+for _c,_x in cellgeometrytype.cgt2xdmfIndex.items(): _cgt2xdmf[_c]=_x
+_cgtNumVerts=numpy.zeros(max(cellgeometrytype.cgt2numVerts.keys())+1,dtype=numpy.int64)
+for _c,_n in cellgeometrytype.cgt2numVerts.items(): _cgtNumVerts[_c]=_n
+
+
+def _encodeMixedConnectivity(types, cellVertices, csrOffsets=None):
+    '''
+    Encode cells into the XDMF mixed-topology layout (each cell is stored as its XDMF type followed by vertex indices), as used by :obj:`~mupif.heavymesh.HeavyUnstructuredMesh`.
+
+    :param types: (M,) cell geometry types
+    :param cellVertices: (M,nVertsMax) array of vertex indices padded with -1, or a sequence of M sequences; flat array of vertex indices of all cells if *csrOffsets* is given
+    :param csrOffsets: (M+1,) array; vertices of the i-th cell are cellVertices[csrOffsets[i]:csrOffsets[i+1]] (CSR layout)
+    :return: (offsets,connectivity), where offsets[i] is the position of the i-th cell in connectivity
+    :rtype: (numpy.ndarray,numpy.ndarray)
+    '''
+    types=numpy.asarray(types,dtype=numpy.int64)
+    nv=_cgtNumVerts[types]
+    if csrOffsets is not None:
+        csrOffsets,cellVertices=numpy.asarray(csrOffsets,dtype=numpy.int64),numpy.asarray(cellVertices,dtype=numpy.int64)
+        if csrOffsets.shape!=(types.shape[0]+1,) or csrOffsets[-1]!=cellVertices.shape[0]: raise ValueError(f'CSR offsets must have {types.shape[0]+1} items, the last one being {cellVertices.shape[0]}.')
+        if numpy.any(numpy.diff(csrOffsets)!=nv): raise ValueError('Number of cell vertices does not match cell types.')
+        offsets=csrOffsets[:-1]+numpy.arange(types.shape[0])
+        conn=numpy.empty((cellVertices.shape[0]+types.shape[0],),dtype=numpy.int64)
+        verts=numpy.ones(conn.shape[0],dtype=bool)
+        verts[offsets]=False
+        conn[offsets]=_cgt2xdmf[types]
+        conn[verts]=cellVertices
+        return offsets,conn
+    if not isinstance(cellVertices,numpy.ndarray) or cellVertices.ndim!=2:
+        padded=numpy.full((len(cellVertices),max([len(cv) for cv in cellVertices],default=0)),-1,dtype=numpy.int64)
+        for i,cv in enumerate(cellVertices): padded[i,:len(cv)]=cv
+        cellVertices=padded
+    if cellVertices.shape[0]!=types.shape[0]: raise ValueError(f'Number of cell types ({types.shape[0]}) and cells ({cellVertices.shape[0]}) do not match.')
+    ix=numpy.arange(cellVertices.shape[1])
+    mask=ix[numpy.newaxis,:]<nv[:,numpy.newaxis]
+    if numpy.any(numpy.count_nonzero(cellVertices>=0,axis=1)!=nv) or numpy.any(cellVertices[mask]<0): raise ValueError('Number of cell vertices does not match cell types.')
+    offsets=numpy.concatenate(([0],numpy.cumsum(nv+1)[:-1])).astype(numpy.int64)
+    conn=numpy.empty((int(numpy.sum(nv+1)),),dtype=numpy.int64)
+    conn[offsets]=_cgt2xdmf[types]
+    conn[(offsets[:,numpy.newaxis]+1+ix)[mask]]=cellVertices[mask]
+    return offsets,conn
+
+
+def _decodeMixedConnectivity(offsets, conn):
+    '''
+    Decode XDMF mixed-topology connectivity (inverse of :obj:`_encodeMixedConnectivity`).
+
+    :return: (types,cellVertices), where cellVertices is (M,nVertsMax) array padded with -1
+    :rtype: (numpy.ndarray,numpy.ndarray)
+    '''
+    offsets,conn=numpy.asarray(offsets),numpy.asarray(conn)
+    if offsets.shape[0]==0: return numpy.zeros((0,),dtype=numpy.int64),numpy.zeros((0,0),dtype=numpy.int64)
+    types=_xdmf2cgt[conn[offsets]]
+    nv=_cgtNumVerts[types]
+    ix=numpy.arange(nv.max())
+    return types,numpy.where(ix[numpy.newaxis,:]<nv[:,numpy.newaxis],conn[numpy.minimum(offsets[:,numpy.newaxis]+1+ix,conn.shape[0]-1)],-1)
+
+
+#: Result of :obj:`Mesh.locatePoints`: all (point, cell) pairs where the point lies inside the cell; *points* and *cells* are (K,) index arrays, *vertices* and *weights* are (K,nVertsMax) arrays with cell vertex numbers (padded with -1) and respective shape function values (padded with 0).
+PointLocation = collections.namedtuple('PointLocation', 'points cells vertices weights')
+
+
+def _cellBBoxes(coords, conn, relPad=1e-5):
+    'Implementation of :obj:`Mesh.getCellBBoxes` on mesh arrays (as returned by :obj:`Mesh._getCellArrays`).'
+    if conn.shape[0] == 0:
+        return np.zeros((0, 2, coords.shape[1]), dtype=np.float64)
+    mn = coords[conn[:, 0]]
+    mx = mn.copy()
+    # process vertex slots one by one to avoid the (numCells,nVertsMax,dim) temporary
+    for j in range(1, conn.shape[1]):
+        c = coords[np.where(conn[:, j] >= 0, conn[:, j], conn[:, 0])]
+        np.minimum(mn, c, out=mn)
+        np.maximum(mx, c, out=mx)
+    if relPad:
+        sz = mx-mn
+        sz = np.where(sz == 0, np.max(sz, axis=1)[:, np.newaxis], sz)
+        mn -= relPad*sz
+        mx += relPad*sz
+    return np.stack((mn, mx), axis=1)
+
+
+def _locatePointsArrays(coords,types,conn,loc,points,eps=0.0,mesh=None):
+    '''
+    Implementation of :obj:`Mesh.locatePoints` on mesh arrays (as returned by :obj:`Mesh._getCellArrays`) and cell localizer *loc*, so that it can run in worker processes without the mesh object. *mesh* is only needed for cells without vectorized implementation (which are processed one by one); NotImplementedError is raised if there are such cells and *mesh* is not given.
+    '''
+    nvMax=conn.shape[1]
+    offsets,cands=loc.getItemsInBBoxBatch(points-eps,points+eps)
+    pPt=np.repeat(np.arange(points.shape[0]),np.diff(offsets))
+    pCell=cands
+    inside=np.zeros(pPt.shape[0],dtype=bool)
+    weights=np.zeros((pPt.shape[0],nvMax),dtype=np.float64)
+    pTypes=types[pCell]
+    for cgt in np.unique(pTypes):
+        sel=np.nonzero(pTypes==cgt)[0]
+        klass=cell.Cell.getClassForCellGeometryType(cgt)
+        nv=cellgeometrytype.cgt2numVerts[cgt]
+        try:
+            ins,lc=klass.glob2locBatch(coords[conn[pCell[sel],:nv]],points[pPt[sel]])
+            inside[sel]=ins
+            weights[sel,:nv]=klass.evalNBatch(lc)
+        except NotImplementedError:
+            if mesh is None: raise
+            # cell type without vectorized implementation: process one by one
+            # (interpolating unit vectors yields shape function values)
+            for i in sel:
+                c=mesh.getCell(pCell[i])
+                pt=tuple(points[pPt[i]])
+                if c.containsPoint(pt):
+                    inside[i]=True
+                    weights[i,:nv]=c.interpolate(pt,np.eye(nv))
+    return PointLocation(points=pPt[inside],cells=pCell[inside],vertices=conn[pCell[inside]],weights=weights[inside])
+
 
 @Pyro5.api.expose
 class MeshIterator(object):
@@ -138,6 +260,9 @@ class Mesh(baredata.BareData):
         'Invalidate (reset) cached data'
         self._vertexOctree=None
         self._cellOctree=None
+        self._vertexCoords=None
+        self._cellArrays=None
+        self._dataDigest=None
 
     @classmethod
     def loadFromLocalFile(cls, fileName):
@@ -189,17 +314,14 @@ class Mesh(baredata.BareData):
 
     def getVertices(self):
         """
-        Return all vertex coordinates as 2D (Nx3) numpy.array; each i-th row contains 3d coordinates of the i-th vertex.
+        Return all vertex coordinates as 2D (Nx3) numpy.array; each i-th row contains 3d coordinates of the i-th vertex (see also :obj:`getVertexCoords`).
 
         :return: vertices
         :rtype: numpy.array
-
-        .. note:: This method has not been tested yet.
         """
-        nv = self.getNumberOfVertices()
-        ret = numpy.empty((nv, 3), dtype=numpy.float64)
-        for i in range(0, nv):
-            ret[i] = numpy.array(self.getVertex(i).getCoordinates())
+        coords = self.getVertexCoords()
+        ret = numpy.zeros((coords.shape[0], 3), dtype=numpy.float64)
+        ret[:, :coords.shape[1]] = coords
         return ret
 
     def getCell(self, i):
@@ -235,18 +357,27 @@ class Mesh(baredata.BareData):
             cc[i, :len(vv)] = vv  # excess elements in the row stay at -1
         return tt, cc
 
+    def getCellsCSR(self):
+        """
+        Return all cells in the CSR layout, without creating any cell objects (when the mesh stores cells as arrays).
+
+        :return: (cell_types,offsets,vertices); vertex indices of the i-th cell are vertices[offsets[i]:offsets[i+1]]
+        :rtype: (numpy.array,numpy.array,numpy.array)
+        """
+        coords, types, conn = self._getCellArrays()
+        valid = conn >= 0
+        offsets = numpy.zeros((types.shape[0]+1,), dtype=numpy.int64)
+        numpy.cumsum(numpy.count_nonzero(valid, axis=1), out=offsets[1:])
+        return types.copy(), offsets, conn[valid]
+
     def toMeshioPointsCells(self):
-        import numpy as np
-        ret = {}
-        for ic in range(self.getNumberOfCells()):
-            c = self.getCell(ic)
-            t = c.getMeshioGeometryStr()
-            ids = [v.getNumber() for v in c.getVertices()]
-            if t in ret:
-                ret[t].append(ids)
-            else:
-                ret[t] = [ids]
-        return self.getVertices(), [(vert_type, np.array(ids)) for vert_type, ids in ret.items()]
+        coords, types, conn = self._getCellArrays()
+        # group cells by type, in the order of first appearance
+        tt, first = numpy.unique(types, return_index=True)
+        cells = []
+        for t in tt[numpy.argsort(first)]:
+            cells.append((cellgeometrytype.cgt2meshioName[t], conn[types == t, :cellgeometrytype.cgt2numVerts[t]]))
+        return self.getVertices(), cells
 
     def toMeshioMesh(self):
         import meshio
@@ -258,17 +389,19 @@ class Mesh(baredata.BareData):
 
     @staticmethod
     def makeFromMeshioPointsCells(points, cells):
+        """
+        Create :obj:`UnstructuredMesh` with compact storage (see :obj:`UnstructuredMesh.setupCompact`) from meshio points and cell blocks.
+        """
         ret = UnstructuredMesh()
-        vv = [vertex.Vertex(number=row, label=None, coords=tuple(points[row])) for row in range(points.shape[0])]
-        cc = []
-        cgt = cellgeometrytype
-        c0 = 0
-        from . import cell
+        types, offsets, verts = [], [numpy.zeros((1,), dtype=numpy.int64)], []
+        off = 0
         for block in cells:
-            klass = cell.Cell.getClassForCellGeometryType(cgt.meshioName2cgt[block.type])
-            cc += [klass(mesh=ret, number=c0+row, label=None, vertices=tuple(block.data[row])) for row in range(block.data.shape[0])]
-            c0 += block.data.shape[0]
-        ret.setup(vertexList=vv, cellList=cc)
+            t, data = cellgeometrytype.meshioName2cgt[block.type], numpy.asarray(block.data, dtype=numpy.int64)
+            types.append(numpy.full((data.shape[0],), t, dtype=numpy.int64))
+            offsets.append(off+data.shape[1]*numpy.arange(1, data.shape[0]+1, dtype=numpy.int64))
+            verts.append(data.reshape(-1))
+            off += data.size
+        ret.setupCompact(numpy.asarray(points), numpy.concatenate(types) if types else numpy.zeros((0,), dtype=numpy.int64), numpy.concatenate(verts) if verts else numpy.zeros((0,), dtype=numpy.int64), cellOffsets=numpy.concatenate(offsets))
         return ret
 
     def asVtkUnstructuredGrid(self):
@@ -359,21 +492,46 @@ class Mesh(baredata.BareData):
     def giveVertexLocalizer(self): return self.getVertexLocalizer()
 
     def getGlobalBBox(self):
-        vvv = self.vertices()
-        c0 = next(iter(vvv)).getCoordinates()  # use the first bbox as base
-        bb = bbox.BBox(c0, c0)  # ope-pointed bbox
-        # XXX replace by call to getVertices()
-        for vert in vvv:
-            bb.merge(vert.getCoordinates())  # extend it with all other cells
-        return bb
+        """
+        :return: bounding box of all vertices
+        :rtype: BBox
+        """
+        coords = self.getVertexCoords()
+        return bbox.BBox(tuple(np.min(coords, axis=0)), tuple(np.max(coords, axis=0)))
+
+    def getVertexCoords(self):
+        """
+        Return coordinates of all vertices as one array. The result is cached until the mesh is modified, and should not be modified by the caller.
+
+        :return: (numVertices,dim) array; i-th row are coordinates of the i-th vertex
+        :rtype: numpy.ndarray
+        """
+        if getattr(self, '_vertexCoords', None) is None:
+            self._vertexCoords = np.array([self.getVertex(i).getCoordinates() for i in range(self.getNumberOfVertices())], dtype=np.float64)
+        return self._vertexCoords
+
+    def getCellBBoxes(self, relPad=1e-5):
+        """
+        Return bounding boxes of all cells as one array, computed with array reductions over the connectivity (no cell objects are created).
+
+        :param float relPad: relative padding of boxes, same as in :obj:`Cell.getBBox`
+        :return: (numCells,2,dim) array; [i,0] and [i,1] are lower-left and upper-right corners of the i-th cell bounding box
+        :rtype: numpy.ndarray
+        """
+        coords, types, conn = self._getCellArrays()
+        return _cellBBoxes(coords, conn, relPad=relPad)
 
     def getVertexLocalizer(self):
         """
         :return: Returns the vertex localizer.
-        :rtype: Octree
+        :rtype: Localizer
         """
         if self._vertexOctree: 
             return self._vertexOctree
+        elif useLinearBVH:
+            coords=self.getVertexCoords()
+            self._vertexOctree=bvh.LinearBVH(np.stack((coords,coords),axis=1))
+            return self._vertexOctree
         else:
             bb = self.getGlobalBBox()
             minc, maxc = bb.coords_ll, bb.coords_ur
@@ -385,10 +543,9 @@ class Mesh(baredata.BareData):
                 t0 = time.clock()
                 print("Mesh: setting up vertex octree ...\nminc=", minc, "size:", size, "mask:", mask, "\n")
             # add mesh vertices into octree
-            for iv, vertex in enumerate(self.vertices()):
-                if debug:
-                    print(f'  {iv=}, {vertex=}')
-                self._vertexOctree.insert(iv, vertex.getBBox())
+            for iv, c in enumerate(self.getVertexCoords()):
+                c = tuple(c)
+                self._vertexOctree.insert(iv, bbox.BBox(c, c))
             if debug:
                 print("done in ", time.clock() - t0, "[s]")
 
@@ -399,12 +556,15 @@ class Mesh(baredata.BareData):
         Get the cell localizer.
 
         :return: Returns the cell localizer.
-        :rtype: Octree
+        :rtype: Localizer
         """
         if debug:
             t0 = time.time()
         if self._cellOctree: 
             return self._cellOctree
+        elif useLinearBVH:
+            self._cellOctree = bvh.LinearBVH(self.getCellBBoxes())
+            return self._cellOctree
         else:
             if debug:
                 print('Start at: ', time.time()-t0)
@@ -430,12 +590,42 @@ class Mesh(baredata.BareData):
             print('Octree ctor: ', time.time()-t0)
             print("Mesh: setting up cell octree ...\nminc=", minc, "size:", size, "mask:", mask, "\n")
         import tqdm
-        for ic, cell in enumerate(tqdm.tqdm(self.cells(), unit=' cells', total=self.getNumberOfCells())):
-            self._cellOctree.insert(ic, cell.getBBox())
+        for ic, bb in enumerate(tqdm.tqdm(self.getCellBBoxes(), unit=' cells', total=self.getNumberOfCells())):
+            self._cellOctree.insert(ic, bbox.BBox(tuple(bb[0]), tuple(bb[1])))
         if debug:
             print("done in ", time.time() - t0, "[s]")
         return self._cellOctree
 
+    def _getCellArrays(self):
+        '''
+        Return (vertexCoords,cellTypes,cellVertices) arrays describing the mesh geometry, as used by vectorized algorithms (:obj:`locatePoints`). *vertexCoords* is (numVertices,dim) array, *cellTypes* are cell geometry types and *cellVertices* vertex indices of each cell, padded with -1 (similar to :obj:`getCells`). The result is cached until the mesh is modified.
+        '''
+        if getattr(self,'_cellArrays',None) is None:
+            coords=self.getVertexCoords()
+            cells=[self.getCell(i) for i in range(self.getNumberOfCells())]
+            # cell.vertices are vertex indices (getCells returns vertex numbers); generic cells have no geometry type (-1)
+            types=np.array([(-1 if c.getGeometryType() is None else c.getGeometryType()) for c in cells],dtype=np.int64)
+            conn=np.full((len(cells),max([len(c.vertices) for c in cells],default=0)),-1,dtype=np.int64)
+            for i,c in enumerate(cells): conn[i,:len(c.vertices)]=c.vertices
+            self._cellArrays=(coords,types,conn)
+        return self._cellArrays
+
+    def locatePoints(self, points, eps=0.0, workers=None):
+        '''
+        Find cells containing given points, and interpolation weights (shape function values) of those cells' vertices at the respective points. All points are processed at once: candidate cells are found via :obj:`Localizer.getItemsInBBoxBatch` of the cell localizer, and containment and shape functions are evaluated vectorized per cell geometry type (:obj:`Cell.glob2locBatch`, :obj:`Cell.evalNBatch`).
+
+        :param numpy.ndarray points: (N,dim) array of point coordinates
+        :param float eps: tolerance for selecting candidate cells by their bounding box
+        :param int workers: number of worker processes to distribute points to (see :obj:`mupif.parallel.locatePoints`); :obj:`mupif.parallel.workers` if not given, 0 to process all points in this process
+        :return: all (point,cell) pairs where the point lies within the cell, ordered by point index
+        :rtype: PointLocation
+        '''
+        points=np.asarray(points,dtype=np.float64)
+        if points.ndim!=2: raise ValueError(f'points must be a 2d array (not {points.ndim}d).')
+        if parallel.useParallel(points.shape[0],workers): return parallel.locatePoints(self,points,eps=eps,workers=workers)
+        coords,types,conn=self._getCellArrays()
+        return _locatePointsArrays(coords,types,conn,self.getCellLocalizer(),points,eps=eps,mesh=self)
+
 
     def asHdf5Object(self, parentgroup, heavyMesh=None):
         raise NotImplementedError('This method is abstract, derived classes must override.')
@@ -466,6 +656,7 @@ class UnstructuredMesh(Mesh,HeavyConvertible):
 
     * vertexList: list of vertices
     * cellList: list of interpolation cells
+    * vertexCoords, vertexLabels, cellTypes, cellOffsets, cellConnectivity, cellLabels: compact (array-based) storage, used instead of vertexList and cellList if vertexCoords is not None (see :obj:`setupCompact`)
     * _vertexOctree: vertex spatial localizer
     * _cellOctree: cell spatial localizer
     * _vertexDict: vertex dictionary
@@ -479,6 +670,13 @@ class UnstructuredMesh(Mesh,HeavyConvertible):
     vertexList: typing.List[vertex.Vertex]=pydantic.Field(default_factory=lambda: [])
     cellList: typing.List[cell.Cell]=pydantic.Field(default_factory=lambda: [])
 
+    vertexCoords: typing.Optional[baredata.NumpyArray]=None  #: (numVertices,dim) vertex coordinates (compact storage)
+    vertexLabels: typing.Optional[baredata.NumpyArray]=None  #: (numVertices,) vertex labels, or None if no vertex has label (compact storage)
+    cellTypes: typing.Optional[baredata.NumpyArray]=None  #: (numCells,) cell geometry types (compact storage)
+    cellOffsets: typing.Optional[baredata.NumpyArray]=None  #: (numCells,) position of each cell in cellConnectivity (compact storage)
+    cellConnectivity: typing.Optional[baredata.NumpyArray]=None  #: XDMF mixed-topology connectivity, same layout as in :obj:`~mupif.heavymesh.HeavyUnstructuredMesh` (compact storage)
+    cellLabels: typing.Optional[baredata.NumpyArray]=None  #: (numCells,) cell labels, or None if no cell has label (compact storage)
+
     def __init__(self, **kw):
         super().__init__(**kw)
         self._vertexDict = None
@@ -487,6 +685,8 @@ class UnstructuredMesh(Mesh,HeavyConvertible):
     def _postDump(self):
         """Called when the instance is being reconstructed."""
         # print('Mesh._postDump…')
+        # cells of compact mesh are created on demand, with the mesh set already
+        if self.isCompact(): return
         for i in range(self.getNumberOfCells()):
             object.__setattr__(self.getCell(i), 'mesh', self)
 
@@ -514,11 +714,73 @@ class UnstructuredMesh(Mesh,HeavyConvertible):
             self.cellList = list(cellList)
         else:
             raise TypeError("Incompatible type of given cellList.")
+        self.vertexCoords = self.vertexLabels = self.cellTypes = self.cellOffsets = self.cellConnectivity = self.cellLabels = None
+        self._vertexDict = self._cellDict = None
+        self._setDirty()
+
+    def setupCompact(self, vertexCoords, cellTypes, cellVertices, vertexLabels=None, cellLabels=None, cellOffsets=None):
+        """
+        Initializes the receiver with compact (array-based) storage: vertices and cells are not stored as objects, but are created on demand by :obj:`getVertex` and :obj:`getCell`. This takes a fraction of memory of :obj:`setup` and makes serialization much faster. Vertex and cell numbers are equal to their index.
+
+        :param vertexCoords: (numVertices,dim) array of vertex coordinates
+        :param cellTypes: (numCells,) array of cell geometry types (see :obj:`mupif.cellgeometrytype`)
+        :param cellVertices: vertex indices of cells, as (numCells,nVertsMax) array padded with -1 (as returned by :obj:`getCells`), or a sequence of sequences
+        :param vertexLabels: optional (numVertices,) array of vertex labels
+        :param cellLabels: optional (numCells,) array of cell labels
+        :param cellOffsets: (numCells+1,) array, if *cellVertices* are in the CSR layout (flat array of vertices of all cells, as returned by :obj:`getCellsCSR`)
+        """
+        coords = np.ascontiguousarray(vertexCoords, dtype=np.float64)
+        if coords.ndim != 2: raise ValueError(f'vertexCoords must be 2d array (not {coords.ndim}d).')
+        offsets, conn = _encodeMixedConnectivity(cellTypes, cellVertices, csrOffsets=cellOffsets)
+        if conn.shape[0] > 0:
+            verts = np.ones(conn.shape[0], dtype=bool)
+            verts[offsets] = False
+            if np.any(conn[verts] >= coords.shape[0]): raise ValueError(f'Cell vertex index out of range (mesh has {coords.shape[0]} vertices).')
+        for what, labels, n in ('vertex', vertexLabels, coords.shape[0]), ('cell', cellLabels, offsets.shape[0]):
+            if labels is not None and len(labels) != n: raise ValueError(f'Number of {what} labels ({len(labels)}) does not match number of {what}s ({n}).')
+        self.vertexList, self.cellList = [], []
+        self.vertexCoords, self.cellTypes, self.cellOffsets, self.cellConnectivity = coords, np.asarray(cellTypes, dtype=np.int64), offsets, conn
+        self.vertexLabels = (None if vertexLabels is None else np.asarray(vertexLabels))
+        self.cellLabels = (None if cellLabels is None else np.asarray(cellLabels))
+        self._vertexDict = self._cellDict = None
+        self._setDirty()
+
+    @staticmethod
+    def _compactLabels(labels):
+        'Convert list of labels to array for compact storage; None if there are no labels.'
+        if all(l is None for l in labels): return None
+        if any(l is None for l in labels): return np.array(labels, dtype=object)
+        return np.array(labels, dtype=np.int64)
+
+    def isCompact(self):
+        """
+        :return: True if the receiver uses compact storage (see :obj:`setupCompact`)
+        :rtype: bool
+        """
+        return self.vertexCoords is not None
+
+    def compact(self):
+        """
+        Convert the receiver to compact storage (see :obj:`setupCompact`) in-place; no-op if the storage is compact already. All cells must be of known geometry types. Vertices and cells are renumbered by their index.
+        """
+        if self.isCompact(): return
+        coords, types, conn = self._getCellArrays()
+        if np.any(types < 0): raise ValueError('Cells without geometry type cannot be stored in compact form.')
+        self.setupCompact(coords, types, conn, vertexLabels=self._compactLabels([v.label for v in self.vertexList]), cellLabels=self._compactLabels([c.label for c in self.cellList]))
+
+    def _expand(self):
+        'Convert the receiver from compact storage to vertex and cell objects (used when the mesh is about to be modified).'
+        if not self.isCompact(): return
+        self.setup([self.getVertex(i) for i in range(self.getNumberOfVertices())], [self.getCell(i) for i in range(self.getNumberOfCells())])
 
     def copy(self):
         """
         See :func:`mesh.copy`
         """
+        if self.isCompact():
+            ans = UnstructuredMesh()
+            ans.setupCompact(self.vertexCoords.copy(), self.cellTypes, self._getCellArrays()[2], vertexLabels=(None if self.vertexLabels is None else self.vertexLabels.copy()), cellLabels=(None if self.cellLabels is None else self.cellLabels.copy()))
+            return ans
         vertexList = []
         cellList = []
         for i in self.vertices():
@@ -533,53 +795,84 @@ class UnstructuredMesh(Mesh,HeavyConvertible):
         """
         See :func:`Mesh.getNumberOfVertices`
         """
+        if self.vertexCoords is not None: return self.vertexCoords.shape[0]
         return len(self.vertexList)
 
     def getNumberOfCells(self):
         """
         See :func:`Mesh.getNumberOfCells`
         """
+        if self.vertexCoords is not None: return self.cellOffsets.shape[0]
         return len(self.cellList)
 
     def getVertex(self, i):
         """
-        See :func:`Mesh.getVertex`
+        See :func:`Mesh.getVertex`. With compact storage, a new :obj:`Vertex` is created.
         """
+        if self.vertexCoords is not None:
+            return vertex.Vertex(number=int(i), label=(None if self.vertexLabels is None else self.vertexLabels[i]), coords=tuple(self.vertexCoords[i].tolist()))
         return self.vertexList[i]
 
     def getCell(self, i):
         """
-        See :func:`Mesh.getCell`
+        See :func:`Mesh.getCell`. With compact storage, a new :obj:`Cell` is created.
         """
+        if self.vertexCoords is not None:
+            cgt, off = int(self.cellTypes[i]), self.cellOffsets[i]
+            return cell.Cell.getClassForCellGeometryType(cgt)(mesh=self, number=int(i), label=(None if self.cellLabels is None else self.cellLabels[i]), vertices=tuple(self.cellConnectivity[off+1:off+1+cellgeometrytype.cgt2numVerts[cgt]].tolist()))
         return self.cellList[i]
 
+    def getVertexCoords(self):
+        """
+        See :func:`Mesh.getVertexCoords`.
+        """
+        if self.vertexCoords is not None: return self.vertexCoords
+        return super().getVertexCoords()
+
+    def _getCellArrays(self):
+        'See :obj:`Mesh._getCellArrays`. With compact storage, the connectivity is only decoded.'
+        if self.vertexCoords is None: return super()._getCellArrays()
+        if getattr(self, '_cellArrays', None) is None:
+            self._cellArrays = (self.vertexCoords,)+_decodeMixedConnectivity(self.cellOffsets, self.cellConnectivity)
+        return self._cellArrays
+
+    def getCells(self):
+        """
+        See :func:`Mesh.getCells`. With compact storage, the result is obtained from arrays directly.
+        """
+        if self.vertexCoords is None: return super().getCells()
+        coords, types, conn = self._getCellArrays()
+        return types.copy(), conn.copy()
+
     def __buildVertexLabelMap__(self):
         """
         Create a custom dictionary between vertex's label and Vertex instance.
         """
         self._vertexDict = {}
+        if self.isCompact(): labels = ([None]*self.getNumberOfVertices() if self.vertexLabels is None else self.vertexLabels.tolist())
+        else: labels = [v.label for v in self.vertexList]
         # loop over vertex lists in both meshes
-        for v in range(len(self.vertexList)):
-            if self.vertexList[v].label in self._vertexDict:
+        for v, label in enumerate(labels):
+            if label in self._vertexDict:
                 if debug:
-                    print("UnstructuredMesh::buildVertexLabelMap: multiple entry detected, vertex label ",
-                          self.vertexList[v].label)
+                    print("UnstructuredMesh::buildVertexLabelMap: multiple entry detected, vertex label ", label)
             else:
-                self._vertexDict[self.vertexList[v].label] = v
+                self._vertexDict[label] = v
 
     def __buildCellLabelMap__(self):
         """
         Create a custom dictionary between cell's label and Cell instance.
         """
         self._cellDict = {}
+        if self.isCompact(): labels = ([None]*self.getNumberOfCells() if self.cellLabels is None else self.cellLabels.tolist())
+        else: labels = [c.label for c in self.cellList]
         # loop over vertex lists in both meshes
-        for v in range(len(self.cellList)):
-            if self.cellList[v].label in self._cellDict:
+        for v, label in enumerate(labels):
+            if label in self._cellDict:
                 if debug:
-                    print("UnstructuredMesh::buildCellLabelMap: multiple entry detected, cell label ",
-                          self.cellList[v].label)
+                    print("UnstructuredMesh::buildCellLabelMap: multiple entry detected, cell label ", label)
             else:
-                self._cellDict[self.cellList[v].label] = v
+                self._cellDict[label] = v
 
     def vertexLabel2Number(self, label):
         """
@@ -606,7 +899,10 @@ class UnstructuredMesh(Mesh,HeavyConvertible):
         is component label so that the entities with the same ID could be easily identified.
 
         :param Mesh mesh: Source mesh for merging
+
+        .. note:: Receiver with compact storage is converted to vertex and cell objects first.
         """
+        self._expand()
         # build vertex2local reciver map first
         if not self._vertexDict:
             self.__buildVertexLabelMap__()
@@ -658,8 +954,7 @@ class UnstructuredMesh(Mesh,HeavyConvertible):
                 self._cellDict[ccopy.label] = indx
         print()
         # last step: invalidate receiver
-        self._vertexOctree = None
-        self._cellOctree = None
+        self._setDirty()
 
     def getVTKRepresentation(self):
         """
@@ -677,11 +972,11 @@ class UnstructuredMesh(Mesh,HeavyConvertible):
         triangles = []
 
         # oop over receiver vertices and create list of vertex coordinates
-        for v in range(len(self.vertexList)):
-            vertices.append(self.vertexList[v].coords)
+        for v in range(self.getNumberOfVertices()):
+            vertices.append(self.getVertex(v).coords)
         # loop over receiver cells
-        for c in range(len(self.cellList)):
-            cell = self.cellList[c]
+        for c in range(self.getNumberOfCells()):
+            cell = self.getCell(c)
             cgt = cell.getGeometryType()
             if cgt == cellgeometrytype.CGT_TRIANGLE_1:
                 triangles.append(cell.vertices)
@@ -789,9 +1084,15 @@ class UnstructuredMesh(Mesh,HeavyConvertible):
         return ret
 
     def dataDigest(self):
-        """Internal function returning hash digest of all internal data, for the purposes of identity test."""
-        mvc, (mct, mci) = self.getVertices(), self.getCells()
-        return util.sha1digest([mvc,mct,mci])
+        """
+        Internal function returning hash digest of all internal data, for the purposes of identity test. The digest (see :obj:`mupif.util.digestAlgorithm`) is cached until the mesh is modified through its methods (:obj:`setup`, :obj:`setupCompact`, :obj:`merge`).
+
+        .. warning:: Modifying mesh data in-place (e.g. replacing items of *vertexList* or changing the compact arrays) is not detected, and the stale cached digest is returned; set the mesh up again after such modification.
+        """
+        if self._dataDigest is None or self._dataDigest[0] != util.digestAlgorithm:
+            mvc, (mct, mci) = self.getVertices(), self.getCells()
+            self._dataDigest = (util.digestAlgorithm, util.dataDigest([mvc, mct, mci]))
+        return self._dataDigest[1]
 
     def asHdf5Object(self, parentgroup, heavyMesh=False):
         """
@@ -838,22 +1139,8 @@ class UnstructuredMesh(Mesh,HeavyConvertible):
         """
         # instantiate the right Mesh subclass
         import importlib
-        from mupif.vertex import Vertex
-        from mupif.cell import Cell
         assert UnstructuredMesh.isHere(h5grp=h5grp)
         klass = getattr(importlib.import_module(h5grp.attrs['__module__']), h5grp.attrs['__class__'])
         ret = klass()
-        mvc, mct, mci = h5grp['vertex_coords'], h5grp['cell_types'], h5grp['cell_vertices']
-        # construct vertices
-        vertices = [Vertex(number=vi, label=None, coords=tuple(mvc[vi])) for vi in range(mvc.shape[0])]
-        cells = [
-            Cell.getClassForCellGeometryType(mct[ci])(
-                mesh=ret,
-                number=ci,
-                label=None,
-                # vertices=tuple(mci[ci])
-                vertices=[vertices[i].number for i in mci[ci]]
-            ) for ci in range(mct.shape[0])
-        ]
-        ret.setup(vertexList=vertices, cellList=cells)
+        ret.setupCompact(h5grp['vertex_coords'][()], h5grp['cell_types'][()], h5grp['cell_vertices'][()])
         return ret
@@ -92,12 +92,15 @@ class ModelServer (modelserverbase.ModelServerBase):
             maxJobs=1,
             daemon=None,
             includeFiles=None,
+            warmPool=0,
             # overrideNsPort=0
     ):
         """
         Constructor.
 
         See :func:`ModelServer.__init__`
+
+        :param int warmPool: number of idle worker processes kept ready (with mupif and the model class imported), so that :obj:`allocateJob` does not have to wait for a new process to start up; idle workers do not count towards *maxJobs*
         """
         super().__init__(appName=appName, workDir=workDir, maxJobs=maxJobs)
         self.ns = ns
@@ -109,11 +112,14 @@ class ModelServer (modelserverbase.ModelServerBase):
         self.server = server
         self.acceptingJobs = True
         self.includeFiles = includeFiles
+        self.warmPool = warmPool
+        self.idleWorkers = collections.deque()
 
         app = appClass()
         self.modelMetadata = app.getAllMetadata()
 
         threading.Thread(target=self._childMonitorLoop, daemon=True).start()
+        self._replenishPool()
 
         log.debug('ModelServer: initialization done for application name %s' % self.applicationName)
 
@@ -126,26 +132,32 @@ class ModelServer (modelserverbase.ModelServerBase):
         return pyroutil.runJobManagerServer(jobman=self, ns=self.ns)
 
     class SpawnedProcessArgs(pydantic.BaseModel):
-        """Args passed to child processes via Popen"""
-        uriFileName: str
+        """Args passed to child processes via their stdin"""
+        jobLogName: str
         nsUri: str
         appName: str
         jobID: str
         cwd: str
         appClass: object
 
-        def pickle(self):
-            # protocol=0 so that there are no NULLs
-            return pickle.dumps(self.model_dump(), protocol=0)
-
-        @classmethod
-        def unpickle(cls, data): return cls(**pickle.loads(bytes(data, encoding='ascii')))
-
     @staticmethod
-    def _spawnedProcessPopen():
+    def _spawnedProcessWorker():
+        """
+        Entry point of worker processes. The model class (pickled in the last argument) is imported first, then the worker waits for :obj:`SpawnedProcessArgs` on stdin (it exits if stdin is closed before), starts the model and sends its URI back as one line on stdout.
+        """
         import sys
         import mupif  # this will use MUPIF_LOG_PYRO, but mupif would be imported by unpickling anyway
-        args = ModelServer.SpawnedProcessArgs.unpickle(sys.argv[-1])
+        # stdout is reserved for passing the URI; output of the model goes to stderr (the log) instead
+        ctrl = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        pickle.loads(bytes(sys.argv[-1], encoding='ascii'))  # imports the model module
+        try:
+            args = ModelServer.SpawnedProcessArgs(**pickle.load(sys.stdin.buffer))
+        except EOFError:
+            return  # idle worker being shut down
+        logFd = os.open(args.jobLogName, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+        for fd in (sys.stdout.fileno(), sys.stderr.fileno()): os.dup2(logFd, fd)
+        os.close(logFd)
         log.info(f'New subprocess: nameserver {args.nsUri}, cwd {args.cwd}')
         os.chdir(args.cwd)
         app = args.appClass()
@@ -155,8 +167,58 @@ class ModelServer (modelserverbase.ModelServerBase):
             appName=args.jobID,
             ns=Pyro5.api.Proxy(args.nsUri)
         )
-        open(args.uriFileName+'~', 'w').write(str(uri))
-        os.rename(args.uriFileName+'~', args.uriFileName)
+        ctrl.write(str(uri)+'\n')
+        ctrl.close()
+
+    def _spawnWorker(self, logName, remoteLogUri=None):
+        """
+        Start new worker process (see :obj:`_spawnedProcessWorker`), with stderr going to *logName*.
+        """
+        # this env trickery add sys.path to PYTHONPATH so that if some module is only importable because of modified sys.path
+        # the subprocess will be able to import it as well
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join(sys.path)+((os.pathsep+env['PYTHONPATH']) if 'PYTHONPATH' in env else '')
+        # this will redirect logs the moment mupif is imported on the remote side
+        if remoteLogUri:
+            env['MUPIF_LOG_PYRO'] = remoteLogUri
+        # to be tuned?
+        env['MUPIF_LOG_LEVEL'] = 'DEBUG'
+        with open(logName, 'a') as workerLog:
+            # protocol=0 so that there are no NULLs
+            return subprocess.Popen([sys.executable, '-c', 'import mupif; mupif.ModelServer._spawnedProcessWorker()', '-', pickle.dumps(self.applicationClass, protocol=0).decode('ascii')], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=workerLog, env=env)
+
+    def _replenishPool(self):
+        'Spawn idle workers up to :obj:`warmPool`; they start up in the background.'
+        if not self.acceptingJobs: return
+        while self.idleWorkers and self.idleWorkers[0].poll() is not None:
+            self._discardWorker(self.idleWorkers.popleft())
+        while len(self.idleWorkers) < self.warmPool:
+            self.idleWorkers.append(self._spawnWorker(self.workDir+'/_mupif_pool.log'))
+
+    def _popIdleWorker(self):
+        'Return idle worker from the pool, skipping those which exited meanwhile; None if there is no live idle worker.'
+        while self.idleWorkers:
+            proc = self.idleWorkers.popleft()
+            if proc.poll() is None: return proc
+            self._discardWorker(proc)
+        return None
+
+    def _discardWorker(self, proc):
+        'Close pipes of idle worker which exited.'
+        log.error(f'Idle worker exited with status {proc.returncode}, see {self.workDir}/_mupif_pool.log.')
+        proc.stdin.close()
+        proc.stdout.close()
+
+    def _shutdownPool(self):
+        'Terminate idle workers.'
+        while self.idleWorkers:
+            proc = self.idleWorkers.popleft()
+            proc.stdin.close()  # worker exits when reading EOF
+            try:
+                proc.wait(2)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            proc.stdout.close()
 
     def __checkTicket(self, ticket):
         """ Returns true, if ticket is valid, false otherwise"""
@@ -279,36 +341,35 @@ class ModelServer (modelserverbase.ModelServerBase):
                     raise
                     # return JOBMAN_ERR, None
                 try:
+                    jobLogName = targetWorkDir+'/_mupif_job.log'
                     args = ModelServer.SpawnedProcessArgs(
-                        uriFileName=targetWorkDir+'/_mupif_uri',
+                        jobLogName=jobLogName,
                         nsUri=str(self.ns._pyroUri),
                         jobID=jobID,
                         cwd=targetWorkDir,
                         appName=self.applicationName,
                         appClass=self.applicationClass,
                     )
-                    jobLogName = targetWorkDir+'/_mupif_job.log'
-                    jobLog = open(jobLogName, 'w')
+                    open(jobLogName, 'w').close()
                     log.info(f'Logging into {jobLogName} (+ {remoteLogUri} remotely)')
-                    # this env trickery add sys.path to PYTHONPATH so that if some module is only importable because of modified sys.path
-                    # the subprocess will be able to import it as well
-                    env = os.environ.copy()
-                    env['PYTHONPATH'] = os.pathsep.join(sys.path)+((os.pathsep+env['PYTHONPATH']) if 'PYTHONPATH' in env else '')
-                    # this will redirect logs the moment mupif is imported on the remote side
-                    if remoteLogUri:
-                        env['MUPIF_LOG_PYRO'] = remoteLogUri
-                    # to be tuned?
-                    env['MUPIF_LOG_LEVEL'] = 'DEBUG'
-                    proc = subprocess.Popen([sys.executable, '-c', 'import mupif; mupif.ModelServer._spawnedProcessPopen()', '-', args.pickle()], stdout=jobLog, stderr=subprocess.STDOUT, env=env)
-                    t0 = time.time()
+                    # idle workers have mupif imported already, thus cannot log remotely
+                    if not remoteLogUri and (proc := self._popIdleWorker()) is not None:
+                        log.info('Using idle worker from the pool.')
+                    else:
+                        proc = self._spawnWorker(jobLogName, remoteLogUri=remoteLogUri)
+                    proc.stdin.write(pickle.dumps(args.model_dump()))
+                    # the worker reads nothing else from stdin
+                    proc.stdin.close()
+                    self._replenishPool()
+                    # read the URI in a separate thread, to allow for timeout
                     tMax = 10
-                    while time.time()-t0 < tMax:
-                        if os.path.exists(args.uriFileName):
-                            uri = open(args.uriFileName, 'r').read()
-                            os.remove(args.uriFileName)
-                            break
-                        else:
-                            time.sleep(.1)
+                    reply = []
+                    reader = threading.Thread(target=lambda: reply.append(proc.stdout.readline()), daemon=True)
+                    reader.start()
+                    reader.join(tMax)
+                    if reply and reply[0]:
+                        uri = reply[0].decode('ascii').strip()
+                        proc.stdout.close()
                     else:
                         log.error('This is the subprocess log file contents: \n'+open(jobLogName, 'r').read())
                         raise RuntimeError(f'Timeout waiting {tMax}s for URI from spawned process'+(f' (process died meanwhile with exit status {proc.returncode})' if proc.poll() else '')+'. The process log inline follows:\n'+open(jobLogName, 'r').read())
@@ -389,6 +450,7 @@ class ModelServer (modelserverbase.ModelServerBase):
         self._updateActiveJobs()
         self.acceptingJobs = False
         log.info('No more jobs will be accepted.')
+        self._shutdownPool()
         if not force and self.activeJobs:
             raise RuntimeError(f'There are {len(self.activeJobs)} active jobs; call terminate(force=True) to kill them.')
         try:
@@ -443,7 +505,7 @@ class ModelServer (modelserverbase.ModelServerBase):
         See :func:`JobManager.uploadFile`
         """
         targetFileName = self.jobManWorkDir+os.path.sep+jobID+os.path.sep+filename
-        PyroFile.copy(targetFileName, pyroFile)
+        PyroFile.transfer(pyroFile, targetFileName)
 
     def getLogFile(self, jobID):
         pf = PyroFile(filename=self.doneJobs[jobID].jobLogName, mode='rb', bufSize=2**20)
@@ -457,7 +519,8 @@ class ModelServer (modelserverbase.ModelServerBase):
         """
         targetFileName = self.getJobWorkDir(jobID)+os.path.sep+filename
         log.info('ModelServer:getPyroFile ' + targetFileName)
-        pfile = PyroFile(targetFileName, mode, buffSize)
+        # the file is always accessed in binary mode; it can be transferred with PyroFile.transfer
+        pfile = PyroFile(filename=targetFileName, mode=(mode if mode.endswith('b') else mode+'b'), bufSize=buffSize)
         self.pyroDaemon.register(pfile)
 
         return pfile
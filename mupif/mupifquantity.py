@@ -4,6 +4,7 @@ Enumeration defining supported types of field and property values, e.g. scalar,
 from enum import IntEnum
 
 from . import units
+from . import util
 from . import data
 import typing
 import pydantic
@@ -106,13 +107,5 @@ class MupifQuantity(data.Data):
         return self.quantity.unit
 
     def dataDigest(self, *args):
-        def numpyHash(*_args):
-            """Return concatenated hash (hexdigest) of all args, which must be numpy arrays. This function is used to
-            find an identical mesh which was already stored."""
-            import hashlib
-            # print(f'{_args=}')
-            H = hashlib.sha1()
-            for arr in _args:
-                H.update(arr.view(np.uint8))
-            return H.hexdigest()
-        return numpyHash(self.quantity.value, np.frombuffer(bytes(self.quantity.unit), dtype=np.uint8), *args)
+        """Return hash digest (see :obj:`mupif.util.dataDigest`) of the value, unit and all *args*, which must be numpy arrays. This function is used to find identical data which were already stored."""
+        return util.dataDigest([self.quantity.value, np.frombuffer(bytes(self.quantity.unit), dtype=np.uint8), *args])
@@ -24,6 +24,7 @@ import math
 import itertools
 from . import bbox
 from . import localizer
+from . import baredata
 import Pyro5
 import pydantic
 import deprecated
@@ -257,7 +258,7 @@ class Octree(localizer.Localizer):
     #    """
     #    self.root.delete(item)
 
-    @pydantic.validate_call(config=dict(allow_arbitrary_types=True))
+    @baredata.validateCall(config=dict(allow_arbitrary_types=True))
     def getItemsInBBox(self, bbox: bbox.BBox):
         """
         Returns the set of objects inside the given bounding box. 
@@ -0,0 +1,189 @@
+#
+#           MuPIF: Multi-Physics Integration Framework
+#               Copyright (C) 2010-2015 Borek Patzak
+#
+#    Czech Technical University, Faculty of Civil Engineering,
+#  Department of Structural Mechanics, 166 29 Prague, Czech Republic
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA  02110-1301  USA
+#
+'''
+Opt-in process-parallel point location, which is the expensive part of :obj:`mupif.field.Field.evaluate`, :obj:`mupif.field.Field.mapTo`, :obj:`mupif.field.probeOperator` and others (they all use :obj:`mupif.mesh.Mesh.locatePoints`).
+
+Query points are split into contiguous chunks which are located by a pool of worker processes; results are concatenated in the original order. Mesh arrays (vertex coordinates, cell types and connectivity) and the cell localizer (:obj:`mupif.bvh.LinearBVH`) are not pickled to workers: they are written once per mesh to a temporary HDF5 file (in shared memory, where available) with contiguous datasets, which workers memory-map.
+
+Parallel execution is off by default; set :obj:`numWorkers` (or the ``MUPIF_WORKERS`` environment variable) to enable it. Since the worker pool uses :obj:`multiprocessing`, scripts must guard their main code by ``if __name__=='__main__':`` on platforms where workers are not forked.
+'''
+from . import bvh
+from . import mesh
+import numpy as np
+import h5py
+import os
+import atexit
+import tempfile
+import threading
+import collections
+import multiprocessing
+import concurrent.futures
+import logging
+
+log = logging.getLogger(__name__)
+
+#: number of worker processes for :obj:`locatePoints`; 0 or 1 disables parallel execution, negative value uses all CPU cores; initialized from the ``MUPIF_WORKERS`` environment variable
+numWorkers = int(os.environ.get('MUPIF_WORKERS', '0'))
+#: minimum number of points located by one worker; smaller queries are processed serially
+minChunk = 20000
+#: number of chunks per worker, so that the load is balanced if some chunks are more expensive than others
+chunksPerWorker = 4
+#: multiprocessing start method for the worker pool (platform default if None)
+startMethod = None
+#: number of meshes kept exported (in this process) and memory-mapped (in each worker)
+meshCacheSize = 4
+
+_pool = None
+_poolWorkers = 0
+_lock = threading.Lock()
+# this process: mesh digest → exported file name
+_exported = collections.OrderedDict()
+# worker processes: exported file name → (coords,types,conn,localizer)
+_opened = collections.OrderedDict()
+
+
+def _resolveWorkers(workers):
+    if workers is None: workers = numWorkers
+    if workers < 0: workers = os.cpu_count() or 1
+    return workers
+
+
+def useParallel(numPoints, workers=None):
+    '''
+    Tell whether locating *numPoints* points should be distributed to worker processes.
+
+    :param int workers: number of workers (:obj:`numWorkers` if not given)
+    :rtype: bool
+    '''
+    return _resolveWorkers(workers) > 1 and numPoints >= 2*minChunk
+
+
+def getPool(workers=None):
+    '''
+    Return process pool with *workers* processes (:obj:`numWorkers` if not given). The pool is created on first use and kept for subsequent calls (re-created if the number of workers changes).
+
+    :rtype: concurrent.futures.ProcessPoolExecutor
+    '''
+    global _pool, _poolWorkers
+    workers = _resolveWorkers(workers)
+    with _lock:
+        if _pool is None or _poolWorkers != workers:
+            if _pool is not None: _pool.shutdown(wait=False)
+            ctx = (multiprocessing.get_context(startMethod) if startMethod else None)
+            _pool, _poolWorkers = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=ctx), workers
+        return _pool
+
+
+def _removeFile(fn):
+    try: os.remove(fn)
+    except OSError: log.warning(f'Unable to remove exported mesh {fn}.')
+
+
+def shutdown():
+    '''
+    Shut down the worker pool and remove all exported meshes. Called automatically at exit.
+    '''
+    global _pool
+    with _lock:
+        if _pool is not None: _pool.shutdown(wait=True)
+        _pool = None
+        while _exported: _removeFile(_exported.popitem()[1])
+
+
+atexit.register(shutdown)
+
+
+def _exportMesh(m):
+    '''
+    Write arrays of mesh *m* and its cell localizer to a temporary HDF5 file, unless already done for the same mesh data; return the file name.
+    '''
+    key = m.dataDigest()
+    with _lock:
+        if (fn := _exported.get(key, None)) is not None:
+            _exported.move_to_end(key)
+            return fn
+    coords, types, conn = m._getCellArrays()
+    loc = m.getCellLocalizer()
+    if not isinstance(loc, bvh.LinearBVH): loc = bvh.LinearBVH(m.getCellBBoxes())
+    fd, fn = tempfile.mkstemp(prefix='mupif-mesh-', suffix='.h5', dir=('/dev/shm' if os.access('/dev/shm', os.W_OK) else None))
+    os.close(fd)
+    # contiguous uncompressed datasets, so that they can be memory-mapped
+    with h5py.File(fn, 'w') as h5:
+        for name, arr in (('coords', coords), ('types', types), ('conn', conn)): h5.create_dataset(name, data=np.asarray(arr))
+        loc.toHdf5Group(h5.create_group('localizer'))
+    with _lock:
+        # exported concurrently by another thread meanwhile: use that file and remove ours
+        if (fn2 := _exported.get(key, None)) is not None:
+            _exported.move_to_end(key)
+            _removeFile(fn)
+            return fn2
+        _exported[key] = fn
+        while len(_exported) > meshCacheSize: _removeFile(_exported.popitem(last=False)[1])
+    return fn
+
+
+def _openMesh(fn):
+    'Memory-map mesh arrays exported by :obj:`_exportMesh` (in worker process).'
+    if (ret := _opened.get(fn, None)) is not None:
+        _opened.move_to_end(fn)
+        return ret
+    with h5py.File(fn, 'r') as h5:
+        ret = tuple(bvh._datasetArray(h5[name], mmap=True) for name in ('coords', 'types', 'conn'))+(bvh.LinearBVH.makeFromHdf5group(h5['localizer'], mmap=True),)
+    _opened[fn] = ret
+    while len(_opened) > meshCacheSize: _opened.popitem(last=False)
+    return ret
+
+
+def _locateChunk(fn, points, eps):
+    'Locate *points* in mesh exported to *fn* (in worker process); returns :obj:`mupif.mesh.PointLocation` as plain tuple.'
+    coords, types, conn, loc = _openMesh(fn)
+    return tuple(mesh._locatePointsArrays(coords, types, conn, loc, points, eps=eps))
+
+
+def locatePoints(m, points, eps=0.0, workers=None):
+    '''
+    Parallel implementation of :obj:`mupif.mesh.Mesh.locatePoints`; the result is identical to the serial one. Chunks containing cells without vectorized implementation (which need cell objects) are located in this process.
+
+    :param mupif.mesh.Mesh m: mesh to locate points in
+    :param numpy.ndarray points: (N,dim) array of point coordinates
+    :param float eps: tolerance for selecting candidate cells by their bounding box
+    :param int workers: number of worker processes (:obj:`numWorkers` if not given)
+    :rtype: mupif.mesh.PointLocation
+    '''
+    points = np.asarray(points, dtype=np.float64)
+    workers = _resolveWorkers(workers)
+    fn = _exportMesh(m)
+    npts = points.shape[0]
+    nChunks = max(1, min(workers*chunksPerWorker, npts//minChunk))
+    bounds = np.linspace(0, npts, nChunks+1).astype(np.int64)
+    pool = getPool(workers)
+    futures = [(b0, b1, pool.submit(_locateChunk, fn, points[b0:b1], eps)) for b0, b1 in zip(bounds[:-1], bounds[1:])]
+    parts = []
+    for b0, b1, fut in futures:
+        try:
+            loc = mesh.PointLocation(*fut.result())
+        except NotImplementedError:
+            coords, types, conn = m._getCellArrays()
+            loc = mesh._locatePointsArrays(coords, types, conn, m.getCellLocalizer(), points[b0:b1], eps=eps, mesh=m)
+        parts.append(loc._replace(points=loc.points+b0))
+    return mesh.PointLocation(*(np.concatenate(a) for a in zip(*parts)))
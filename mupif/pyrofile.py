@@ -34,13 +34,117 @@ import deprecated
 import pydantic
 import requests
 import uuid
+import os
 import os.path
+import hashlib
+import threading
+import collections
+import concurrent.futures
 from .baredata import Utility
 from typing import Optional
 from .dataid import DataID
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
 log = logging.getLogger(__name__)
 
+#: codecs usable by :obj:`PyroFile.transfer`, in the order of preference, as (compress,decompress) functions;
+#: 'none' is always available, zstd and lz4 if the respective modules are installed
+codecs = {}
+if zstandard:
+    codecs['zstd'] = (lambda b: zstandard.ZstdCompressor(level=1).compress(b), lambda b: zstandard.ZstdDecompressor().decompress(b))
+if lz4:
+    codecs['lz4'] = (lz4.frame.compress, lz4.frame.decompress)
+codecs['zlib'] = (lambda b: zlib.compress(b, 1), zlib.decompress)
+codecs['none'] = (lambda b: b, lambda b: b)
+
+#: hash algorithm for verifying transfers
+digestAlgorithm = 'sha256'
+
+
+def _tobytes(buffer):
+    # https://pyro5.readthedocs.io/en/stable/tipstricks.html#binary-data-transfer-file-transfer
+    if type(buffer) == dict: return serpent.tobytes(buffer)
+    return buffer
+
+
+class PyroFileReader(object):
+    """
+    Read-only file-like object accessing (remote) :obj:`PyroFile` by range requests (see :obj:`PyroFile.getRange`) on demand, keeping recently used blocks cached. It can be passed to ``h5py.File`` to read only the parts of remote HDF5 file which are actually accessed.
+    """
+    def __init__(self, remote, blockSize=2**16, cacheBlocks=1024, codec=None):
+        """
+        :param remote: PyroFile (usually Pyro5.api.Proxy) opened for reading
+        :param int blockSize: granularity of requests
+        :param int cacheBlocks: maximum number of blocks kept in the cache
+        :param str codec: codec for transferred data; if None, the first one supported by both sides is used
+        """
+        self.remote, self.blockSize, self.cacheBlocks = remote, blockSize, cacheBlocks
+        self.codec = codec if codec is not None else [c for c in remote.getCodecs() if c in codecs][0]
+        self.size = remote.getSize()
+        self.pos = 0
+        self.cache = collections.OrderedDict()
+        #: statistics: number of bytes read from *remote* (before decompression)
+        self.bytesTransferred = 0
+        self.closed = False
+
+    def readable(self): return True
+    def seekable(self): return True
+    def writable(self): return False
+    def tell(self): return self.pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET: self.pos = offset
+        elif whence == os.SEEK_CUR: self.pos += offset
+        elif whence == os.SEEK_END: self.pos = self.size+offset
+        else: raise ValueError(f'Invalid whence {whence}.')
+        return self.pos
+
+    def _fetch(self, first, last):
+        'Make sure blocks first…last (inclusive) are cached; consecutive missing blocks are read by a single request.'
+        if isinstance(self.remote, Pyro5.api.Proxy): self.remote._pyroClaimOwnership()
+        b = first
+        while b <= last:
+            if b in self.cache:
+                self.cache.move_to_end(b)
+                b += 1
+                continue
+            e = b
+            while e+1 <= last and e+1 not in self.cache: e += 1
+            data = _tobytes(self.remote.getRange(b*self.blockSize, (e-b+1)*self.blockSize, self.codec))
+            self.bytesTransferred += len(data)
+            data = codecs[self.codec][1](data)
+            for i in range(b, e+1):
+                self.cache[i] = data[(i-b)*self.blockSize:(i-b+1)*self.blockSize]
+            b = e+1
+        while len(self.cache) > max(self.cacheBlocks, last-first+1): self.cache.popitem(last=False)
+
+    def read(self, size=-1):
+        if size < 0 or self.pos+size > self.size: size = max(self.size-self.pos, 0)
+        if size == 0: return b''
+        first, last = self.pos//self.blockSize, (self.pos+size-1)//self.blockSize
+        self._fetch(first, last)
+        data = b''.join(self.cache[i] for i in range(first, last+1))
+        off = self.pos-first*self.blockSize
+        self.pos += size
+        return data[off:off+size]
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        memoryview(b).cast('B')[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.cache.clear()
+        self.closed = True
+
 
 class PyroFile(Utility):
     """
@@ -54,11 +158,13 @@ class PyroFile(Utility):
 
     def __init__(self, **kw):
         super().__init__(**kw)
-        if self.mode not in ('rb', 'wb'):
-            raise ValueError(f"mode must be 'rb' or 'wb' (not '{self.mode}').")
+        if self.mode not in ('rb', 'wb', 'r+b'):
+            raise ValueError(f"mode must be 'rb', 'wb' or 'r+b' (not '{self.mode}').")
         self.fileobj = open(self.filename, self.mode)
         self.compressor = None
         self.decompressor = None
+        # protects file position for random access (getRange, setRange) from concurrent calls
+        self._rangeLock = threading.Lock()
 
     @Pyro5.api.expose
     def getDataID(self):
@@ -104,9 +210,7 @@ class PyroFile(Utility):
 
         :param str buffer: data chunk to append
         """
-        # https://pyro5.readthedocs.io/en/stable/tipstricks.html#binary-data-transfer-file-transfer
-        if type(buffer) == dict:
-            buffer = serpent.tobytes(buffer)
+        buffer = _tobytes(buffer)
         if self.compressFlag:
             if not self.decompressor:
                 self.decompressor = zlib.decompressobj()
@@ -114,6 +218,74 @@ class PyroFile(Utility):
         else:
             self.fileobj.write(buffer)
 
+    @Pyro5.api.expose
+    def getSize(self):
+        """
+        :return: current size of the file, in bytes
+        :rtype: int
+        """
+        if self.mode != 'rb': self.fileobj.flush()
+        return os.fstat(self.fileobj.fileno()).st_size
+
+    @Pyro5.api.expose
+    def getCodecs(self):
+        """
+        :return: names of codecs supported for :obj:`getRange` and :obj:`setRange`, in the order of preference
+        :rtype: list
+        """
+        return list(codecs.keys())
+
+    @Pyro5.api.expose
+    def getRange(self, offset, size, codec='none'):
+        """
+        Reads data at given position of the file; this call is independent of :obj:`getChunk` and can be called concurrently.
+
+        :param int offset: starting position
+        :param int size: number of bytes to read (less is returned at the end of file)
+        :param str codec: codec used for compressing the data (see :obj:`getCodecs`)
+        :return: (compressed) data
+        :rtype: bytes
+        """
+        with self._rangeLock:
+            self.fileobj.seek(offset)
+            data = self.fileobj.read(size)
+        return codecs[codec][0](data)
+
+    @Pyro5.api.expose
+    def setRange(self, offset, buffer, codec='none'):
+        """
+        Writes data at given position of the file; this call is independent of :obj:`setChunk` and can be called concurrently.
+
+        :param int offset: starting position
+        :param bytes buffer: (compressed) data to write
+        :param str codec: codec used for compressing the data (see :obj:`getCodecs`)
+        """
+        data = codecs[codec][1](_tobytes(buffer))
+        with self._rangeLock:
+            self.fileobj.seek(offset)
+            self.fileobj.write(data)
+
+    @Pyro5.api.expose
+    def truncate(self, size):
+        """
+        Truncates the file (open for writing) to given size.
+        """
+        with self._rangeLock:
+            self.fileobj.truncate(size)
+
+    @Pyro5.api.expose
+    def getDigest(self):
+        """
+        :return: hex digest of the file content (see :obj:`digestAlgorithm`)
+        :rtype: str
+        """
+        if self.mode != 'rb': self.fileobj.flush()
+        h = hashlib.new(digestAlgorithm)
+        with open(self.filename, 'rb') as f:
+            while data := f.read(2**22):
+                h.update(data)
+        return h.hexdigest()
+
     @Pyro5.api.expose
     @deprecated.deprecated('PyroFile.setBuffSize is deprecated, use setBufSize instead')
     def setBuffSize(self, bs): self.setBufSize(bs)
@@ -170,6 +342,86 @@ class PyroFile(Utility):
             dst.setChunk(data)
         dst.close()
 
+    @staticmethod
+    def transfer(src: typing.Union[PyroFile, Pyro5.api.Proxy, str, pathlib.Path],
+                 dst: typing.Union[PyroFile, Pyro5.api.Proxy, str, pathlib.Path],
+                 codec=None, chunkSize=2**22, inFlight=4, resume=False, verify=True):
+        """
+        Copy the content of *src* to *dst*, like :obj:`copy`, keeping several chunks in flight: chunks are read from *src* by *inFlight* concurrent range requests (see :obj:`getRange`) and written to *dst* in order, by a separate thread. If either side does not support range requests (older mupif), falls back to :obj:`copy`.
+
+        :param codec: codec for the transferred data; if None, the first one supported by both sides is used (see :obj:`codecs`); use 'none' on fast networks
+        :param int chunkSize: size of chunks (uncompressed)
+        :param int inFlight: number of chunks being read concurrently
+        :param bool resume: if *dst* is partially written already (by an interrupted transfer), only copy the remaining part; this requires *dst* to be local path or PyroFile opened with mode ``'r+b'``
+        :param bool verify: compare :obj:`getDigest` of both sides after the transfer, raise ``IOError`` if they are different
+        """
+        if isinstance(src, (str, pathlib.Path)) and isinstance(dst, (str, pathlib.Path)):
+            shutil.copy(src, dst)
+            return
+        # files opened here are closed here
+        ownSrc = isinstance(src, (str, pathlib.Path))
+        if ownSrc:
+            src = PyroFile(filename=src, mode='rb')
+        try:
+            if isinstance(dst, (str, pathlib.Path)):
+                dst = PyroFile(filename=dst, mode=('r+b' if resume and os.path.exists(dst) else 'wb'))
+            if not (hasattr(src, 'getRange') and hasattr(dst, 'setRange')):
+                log.info('Range requests not supported by peer, using PyroFile.copy.')
+                PyroFile.copy(src, dst)
+                return
+            PyroFile._transferRanges(src, dst, codec=codec, chunkSize=chunkSize, inFlight=inFlight, resume=resume, verify=verify)
+        except Exception:
+            if not isinstance(dst, (str, pathlib.Path)):
+                try: dst.close()
+                except Exception: log.exception('Error closing transfer destination.')
+            raise
+        finally:
+            if ownSrc: src.close()
+
+    @staticmethod
+    def _transferRanges(src, dst, codec, chunkSize, inFlight, resume, verify):
+        'Implementation of :obj:`transfer` for opened *src* and *dst* supporting range requests.'
+        if codec is None:
+            dstCodecs = dst.getCodecs()
+            codec = [c for c in src.getCodecs() if c in dstCodecs][0]
+        size = src.getSize()
+        start = (min(dst.getSize(), size)//chunkSize)*chunkSize if resume else 0
+
+        # Pyro proxies cannot be shared between threads, each thread uses its own one (released when the transfer ends)
+        tls, proxies = threading.local(), []
+
+        def _threadLocal(f):
+            if not isinstance(f, Pyro5.api.Proxy): return f
+            if (ret := getattr(tls, str(f._pyroUri), None)) is None:
+                setattr(tls, str(f._pyroUri), ret := Pyro5.api.Proxy(f._pyroUri))
+                proxies.append(ret)
+            return ret
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=inFlight) as readers, concurrent.futures.ThreadPoolExecutor(max_workers=1) as writer:
+                reads, writes = collections.deque(), collections.deque()
+                offsets = iter(range(start, size, chunkSize))
+                for off in offsets:
+                    reads.append((off, readers.submit(lambda off: _threadLocal(src).getRange(off, chunkSize, codec), off)))
+                    if len(reads) >= inFlight: break
+                while reads:
+                    off, fut = reads.popleft()
+                    writes.append(writer.submit(lambda off, data: _threadLocal(dst).setRange(off, data, codec), off, fut.result()))
+                    for off in offsets:
+                        reads.append((off, readers.submit(lambda off: _threadLocal(src).getRange(off, chunkSize, codec), off)))
+                        break
+                    # limit number of chunks held in memory
+                    while len(writes) > inFlight: writes.popleft().result()
+                while writes: writes.popleft().result()
+        finally:
+            # worker threads have finished, their proxies can be taken over by this thread
+            for p in proxies:
+                p._pyroClaimOwnership()
+                p._pyroRelease()
+        dst.truncate(size)
+        if verify and (srcDigest := src.getDigest()) != (dstDigest := dst.getDigest()):
+            raise IOError(f'PyroFile transfer: digest mismatch ({digestAlgorithm} {srcDigest} (source) != {dstDigest} (destination)).')
+        dst.close()
+
     @staticmethod
     def makeFromUrl(url):
         r = requests.get(url, allow_redirects=True)
@@ -35,6 +35,7 @@ import random
 import urllib.parse
 import os.path
 import deprecated
+import concurrent.futures
 from . import model
 from . import modelserverbase
 from . import util
@@ -273,10 +274,114 @@ def connectApp(ns, name, connectionTestTimeOut=10.):
     return _connectApp(ns, name, connectionTestTimeOut)
 
 
+#: timeout (in seconds) for probing candidate servers in :obj:`_connectAppWithMetadata`; servers not responding within this time are skipped
+probeTimeOut = 2.
+#: time (in seconds) for which liveness and latency of probed servers are cached and re-used (0 disables caching); the number of free jobs is queried on every probe
+probeCacheTTL = 5.
+#: maximum number of servers probed concurrently
+probeMaxWorkers = 32
+
+#: Result of :obj:`probeServer`: *name* and *uri* of the server, whether it is *alive*, number of *freeJobs* (None if the server does not report it, i.e. is not a model server), round-trip *latency* of the signature call (in seconds) and *time* when liveness and latency were measured.
+ServerProbe = collections.namedtuple('ServerProbe', 'name uri alive freeJobs latency time')
+
+# uri → ServerProbe
+_probeCache = {}
+_probeLock = threading.Lock()
+
+
+def clearProbeCache():
+    """
+    Discard all cached results of :obj:`probeServer`.
+    """
+    with _probeLock:
+        _probeCache.clear()
+
+
+def _cacheProbe(probe):
+    with _probeLock:
+        _probeCache[probe.uri] = probe
+
+
+def probeServer(name, uri, timeOut=None, useCache=True):
+    """
+    Check whether server registered as *name* with *uri* is responding and query its free capacity (via ``getNumberOfFreeJobs``, if the server provides it). Liveness and latency are cached for :obj:`probeCacheTTL` seconds: servers which did not respond are not probed again within that time, responding ones are only asked for free capacity (which is never cached, as it changes with every allocation).
+
+    :param str name: name under which the server is registered
+    :param str uri: URI of the server
+    :param float timeOut: timeout for each call (:obj:`probeTimeOut` if not given)
+    :param bool useCache: use cached liveness and latency, if not expired
+    :rtype: ServerProbe
+    """
+    uri = str(uri)
+    cached = None
+    if useCache:
+        with _probeLock:
+            if (p := _probeCache.get(uri, None)) is not None and time.time()-p.time < probeCacheTTL: cached = p
+        if cached is not None and not cached.alive: return cached
+    t0 = time.time()
+    alive, freeJobs, latency = False, None, None
+    try:
+        with Pyro5.api.Proxy(uri) as app:
+            app._pyroTimeout = (probeTimeOut if timeOut is None else timeOut)
+            if cached is None:
+                app.getApplicationSignature()
+                latency = time.time()-t0
+            else:
+                latency, t0 = cached.latency, cached.time
+            alive = True
+            try: freeJobs = app.getNumberOfFreeJobs()
+            # server not responding (any more), or object not registered there
+            except (Pyro5.errors.CommunicationError, Pyro5.errors.DaemonError): raise
+            # not a model server
+            except Exception: pass
+    except Exception as e:
+        log.info(f'Server {name} ({uri}) not responding: {e}')
+        alive, latency, t0 = False, None, time.time()
+    ret = ServerProbe(name=name, uri=uri, alive=alive, freeJobs=freeJobs, latency=latency, time=t0)
+    _cacheProbe(ret)
+    return ret
+
+
+def probeServers(candidates, timeOut=None, useCache=True):
+    """
+    Probe all *candidates* concurrently with :obj:`probeServer`. Servers which did not respond within *timeOut* are reported as not alive, so that the function returns in about *timeOut* seconds even if some servers are hung.
+
+    :param dict candidates: name → (uri, metadata) mapping, as returned by the nameserver's ``yplookup``
+    :param float timeOut: timeout for each probe (:obj:`probeTimeOut` if not given)
+    :param bool useCache: passed to :obj:`probeServer`
+    :return: probe results, in the same order as *candidates*
+    :rtype: list[ServerProbe]
+    """
+    if timeOut is None: timeOut = probeTimeOut
+    items = [(name, str(val[0])) for name, val in candidates.items()]
+    if not items: return []
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=min(len(items), probeMaxWorkers))
+    try:
+        futures = [pool.submit(probeServer, name, uri, timeOut, useCache) for name, uri in items]
+        # the deadline is more than timeOut, since a probe makes several calls (connect, signature, free jobs)
+        concurrent.futures.wait(futures, timeout=2*timeOut+.5)
+        t = time.time()
+        return [(f.result() if f.done() else ServerProbe(name=name, uri=uri, alive=False, freeJobs=None, latency=None, time=t)) for (name, uri), f in zip(items, futures)]
+    finally:
+        # do not wait for hung probes
+        pool.shutdown(wait=False)
+
+
+def _rankServers(probes, scores={}):
+    """
+    Return alive servers from *probes*, best first: by *scores* (name → score, higher is better), then servers reporting no free jobs last, then by free jobs (more is better) and by latency.
+    """
+    def key(p):
+        return (-scores.get(p.name, 0), (p.freeJobs is not None and p.freeJobs <= 0), -(p.freeJobs or 0), p.latency)
+    return sorted([p for p in probes if p.alive], key=key)
+
+
 def _connectAppWithMetadata(ns, requiredMData, optionalMData=[], connectionTestTimeOut=10.):
     """
     Connects to a remote service with required (and optional) metadata.
 
+    All candidates are probed concurrently (see :obj:`probeServers`, with timeout of at most :obj:`probeTimeOut`) and ranked by the number of matching optional metadata, then by free capacity (for model servers) and round-trip latency; the best one passing the connection test is returned.
+
     :param Pyro5.naming.Nameserver ns: Instance of a nameServer
     :param set[str] requiredMData: list of compulsory, required metadata the service should match
     :param set[str] optionalMData: list of optional metadata of the service 
@@ -285,51 +390,30 @@ def _connectAppWithMetadata(ns, requiredMData, optionalMData=[], connectionTestT
     :rtype: Instance of an application
     :raises Exception: When cannot find registered server or Cannot connect to application or Timeout passes
     """
-    try:
-        candidates = ns.yplookup(meta_all=requiredMData)
-        if not candidates:
-            raise Exception('_connectAppWithMetadata: NS yplookup failed')
-        # now to select optimal candidate
-        # if optionalMData are empty select random one
-        candidateScores = {}
-        print("Candidates:", candidates)
-        # assign each candidate a score 
-        for key, value in candidates.items():
-            name = key
-            if (not optionalMData):
-                candidateScores[name]=1 # all candidates will have the same score if no optional metedata 
-            else:
-                # value[0] URI, value[1] metadata
-                # select the optimal one as the one matching max number of optionalMData entries
-                score = len(optionalMData.intersection(value[1]))
-                candidateScores[name]=score
-        
-        # now sort candidates (makes sense onbly if optional metadata exist)
-        if (not optionalMData):
-            orderedCandidates = candidates
-        else:
-            orderedCandidates = collections.OrderedDict(sorted(candidates.items(), key=lambda item: item[1], reverse=True))
-        
-        #ok now go over orderedCandidates and try to connect 
-        for key, val in orderedCandidates.items():
-            name = key
-            uri=val[0]
-            app = Pyro5.api.Proxy(uri)
-            log.info(f"Trying to Connect to application {name} with {uri}")
-            try:
-                app._pyroTimeout = connectionTestTimeOut
-                sig = app.getApplicationSignature()
-                app._pyroTimeout = None
-                log.info("Connected to " + sig + " with the application " + name)
-                return app
-            except Exception as e:
-                log.exception(f"Cannot connect to application {name}. Is the server running?")
-                continue
-        # we ended here withou succesfull connection
-        raise Exception("PyroUtil::Cannot connect to any suitable candidate")
-    
-    except Exception as e:
-        raise
+    candidates = ns.yplookup(meta_all=requiredMData)
+    if not candidates:
+        raise Exception('_connectAppWithMetadata: NS yplookup failed')
+    log.debug(f'Candidates: {candidates}')
+    # value[0] URI, value[1] metadata
+    # score is the number of matching optionalMData entries
+    scores = {name: len(set(optionalMData).intersection(value[1])) for name, value in candidates.items()}
+    ranked = _rankServers(probeServers(candidates, timeOut=min(probeTimeOut, connectionTestTimeOut)), scores)
+    for best in ranked:
+        app = Pyro5.api.Proxy(best.uri)
+        try:
+            # liveness might come from the cache: test the connection before returning
+            app._pyroTimeout = min(probeTimeOut, connectionTestTimeOut)
+            app.getApplicationSignature()
+            app._pyroTimeout = None
+        except Exception as e:
+            log.info(f"Cannot connect to application {best.name} with {best.uri}, trying next candidate: {e}")
+            _cacheProbe(best._replace(alive=False, latency=None, time=time.time()))
+            continue
+        log.info(f"Connected to application {best.name} with {best.uri} (free jobs {best.freeJobs}, latency {best.latency:.3g} s)")
+        return app
+    # we ended here without succesfull connection
+    raise Exception("PyroUtil::Cannot connect to any suitable candidate")
+
 
 def connectAppWithMetadata(ns, requiredMData, optionalMData=[], connectionTestTimeOut=10.):
     return _connectAppWithMetadata(ns, requiredMData, optionalMData, connectionTestTimeOut)
@@ -1,6 +1,7 @@
 from .data import Data
-from .field import Field, FieldType
+from .field import Field, FieldType, probeOperator
 from .units import Quantity
+from . import heavydata
 from .heavydata import HeavyDataBase
 from .mesh import UnstructuredMesh
 from .heavymesh import HeavyUnstructuredMesh
@@ -12,6 +13,12 @@ import pickle
 import Pyro5.api
 import numpy as np
 import os.path
+import collections
+import threading
+import concurrent.futures
+import logging
+
+log = logging.getLogger(__name__)
 
 
 class _FieldLocation(pydantic.BaseModel):
@@ -34,43 +41,254 @@ class _FieldMetadata(pydantic.BaseModel):
 
 @Pyro5.api.expose
 class TemporalField(Data):
+    """
+    Sequence of fields in time, stored in some container (implemented in derived classes). Fields are created from the container on demand and kept in a LRU cache bounded by :obj:`cacheBytes`; meshes are shared between fields which have the same mesh (by its digest) in the container. Time lookups use sorted time index.
+    """
     fieldMeta: typing.List[_FieldMetadata] = []
+    #: approximate upper bound of memory (bytes) used by cached fields and their meshes (heavy data are counted by their size in the container)
+    cacheBytes: int = 2**30
+    #: number of following time steps loaded in background thread when a field is requested by :obj:`getField`
+    prefetch: int = 0
 
     def __init__(self, *a, **kw):
         super().__init__(*a, **kw)
-        self._cache={}
+        self._initCache()
+
+    def _initCache(self):
+        # index into fieldMeta -> (field, bytes), in LRU order
+        self._cache = collections.OrderedDict()
+        self._cacheUsed = 0
+        # mesh location -> [mesh, number of cached fields using it, bytes]
+        self._meshes = {}
+        # sorted time index: number of fieldMeta items indexed, times (in seconds), indices into fieldMeta
+        self._timeIndex = (0, np.zeros((0,)), np.zeros((0,), dtype=np.int64))
+        self._cacheLock = threading.RLock()
+        self._prefetchExecutor = None
+        self._prefetching = {}
+        # probe operators (see _probe)
+        self._probes = {}
+
+    def _sortedTimes(self):
+        'Return (times,indices) with times of fieldMeta (in seconds) sorted, updated if fieldMeta was appended to.'
+        n, tt, ii = self._timeIndex
+        if n != len(self.fieldMeta):
+            tt = np.array([md['time'].to_value(au.s) for md in self.fieldMeta], dtype=np.float64)
+            ii = np.argsort(tt, kind='stable')
+            tt = tt[ii]
+            self._timeIndex = (len(self.fieldMeta), tt, ii)
+        return tt, ii
+
     def timeList(self) -> typing.List[Quantity]:
         return [md['time'] for md in self.fieldMeta]
-    def timeMetadata(self, time, epsTime=0.0*au.s) -> dict:
-        mmd=[md for md in self.fieldMeta if np.abs(md['time']-time)<=epsTime]
-        if len(mmd)>=2: raise ValueError('Ambiguous time specification {time} with given eps={eps} ({len(mmd)} fields matching).')
-        assert len(mmd)<2
-        if len(mmd)==1: return mmd[0]
+
+    def _timeMetadataIndex(self, time, epsTime=0.0*au.s):
+        'Return index of fieldMeta item matching *time* (within *epsTime*), or None.'
+        tt, ii = self._sortedTimes()
+        t, eps = time.to_value(au.s), epsTime.to_value(au.s)
+        i0, i1 = np.searchsorted(tt, t-eps, side='left'), np.searchsorted(tt, t+eps, side='right')
+        if i1-i0 >= 2: raise ValueError(f'Ambiguous time specification {time} with given eps={epsTime} ({i1-i0} fields matching).')
+        if i1-i0 == 1: return int(ii[i0])
         return None
+
+    def timeMetadata(self, time, epsTime=0.0*au.s) -> dict:
+        ix = self._timeMetadataIndex(time, epsTime)
+        return None if ix is None else self.fieldMeta[ix]
+
     def getField(self, time: Quantity, epsTime=0.0*au.s):
-        # don't fetch field we already have
-        if time in self._cache:
-            return self._cache[time]
         # get metadata, raise exception if no data for given time
-        md = self.timeMetadata(time)
-        if md is None:
+        ix = self._timeMetadataIndex(time, epsTime)
+        if ix is None:
             raise ValueError(f'Field not defined for time {time}')
-        # construct field from location
-        self._cache[time] = self._field_make_from_loc(md['loc'])
-        return self._cache[time]
+        ret = self._getFieldByIndex(ix)
+        if self.prefetch > 0: self._prefetchAfter(ix)
+        return ret
+
+    def _getFieldByIndex(self, ix):
+        'Return field for fieldMeta[ix], from the cache or loaded (waiting for prefetch in progress, if any).'
+        with self._cacheLock:
+            # don't fetch field we already have
+            if ix in self._cache:
+                self._cache.move_to_end(ix)
+                return self._cache[ix][0]
+            fut = self._prefetching.get(ix, None)
+        if fut is not None:
+            fut.result()
+            with self._cacheLock:
+                if ix in self._cache: return self._cache[ix][0]
+        return self._loadField(ix)
+
+    def _loadField(self, ix):
+        'Construct field for fieldMeta[ix] from its location and put it into the cache.'
+        loc = self.fieldMeta[ix]['loc']
+        with self._cacheLock:
+            m = self._meshes.get(loc['mesh'], None)
+            if m is not None: m[1] += 1  # keep the mesh alive while loading
+        try:
+            field = self._field_make_from_loc(loc, meshObj=(None if m is None else m[0]))
+        except Exception:
+            if m is not None:
+                with self._cacheLock: self._releaseMesh(loc['mesh'])
+            raise
+        with self._cacheLock:
+            if m is None:
+                if (m := self._meshes.get(loc['mesh'], None)) is not None: m[1] += 1  # loaded concurrently
+                else:
+                    m = self._meshes[loc['mesh']] = [field.getMesh(), 1, self._meshBytes(field.getMesh())]
+                    self._cacheUsed += m[2]
+            if ix in self._cache:  # loaded concurrently
+                self._releaseMesh(loc['mesh'])
+                return self._cache[ix][0]
+            nb = self._fieldBytes(field)
+            self._cache[ix] = (field, nb)
+            self._cacheUsed += nb
+            # evict least recently used fields, but keep the one just loaded
+            while self._cacheUsed > self.cacheBytes and len(self._cache) > 1:
+                jx, (f, nb) = self._cache.popitem(last=False)
+                self._cacheUsed -= nb
+                self._releaseMesh(self.fieldMeta[jx]['loc']['mesh'])
+        return field
+
+    def _releaseMesh(self, meshLoc):
+        m = self._meshes[meshLoc]
+        m[1] -= 1
+        if m[1] == 0:
+            del self._meshes[meshLoc]
+            self._cacheUsed -= m[2]
+
+    def _prefetchAfter(self, ix):
+        'Load fields of :obj:`prefetch` time steps following fieldMeta[ix] in background thread.'
+        tt, ii = self._sortedTimes()
+        pos = int(np.nonzero(ii == ix)[0][0])
+        with self._cacheLock:
+            if self._prefetchExecutor is None:
+                self._prefetchExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='TemporalField-prefetch')
+            for jx in ii[pos+1:pos+1+self.prefetch]:
+                jx = int(jx)
+                if jx in self._cache or jx in self._prefetching: continue
+                fut = self._prefetchExecutor.submit(self._loadField, jx)
+                self._prefetching[jx] = fut
+                fut.add_done_callback(lambda f, jx=jx: self._prefetchDone(jx))
+
+    def _prefetchDone(self, jx):
+        with self._cacheLock:
+            fut = self._prefetching.pop(jx)
+        if (exc := fut.exception()) is not None: log.warning(f'Prefetching field for time {self.fieldMeta[jx]["time"]} failed: {exc}')
+
+    def waitPrefetch(self):
+        'Block until background loading of fields (see :obj:`prefetch`) finishes.'
+        with self._cacheLock:
+            futs = list(self._prefetching.values())
+        concurrent.futures.wait(futs)
+
+    @staticmethod
+    def _fieldBytes(field):
+        'Approximate memory of field values (heavy values by their size in the container).'
+        q = field.quantity
+        if (ds := getattr(q, 'dataset', None)) is not None: return ds.nbytes
+        return np.asarray(q.value).nbytes
+
+    @staticmethod
+    def _meshBytes(mesh):
+        'Approximate memory of mesh data (heavy mesh by its size in the container).'
+        if isinstance(mesh, HeavyUnstructuredMesh):
+            return sum(mesh._h5grp[g].nbytes for g in (mesh.GRP_VERTS, mesh.GRP_CELL_OFFSETS, mesh.GRP_CELL_CONN)) if mesh._hasData() else 0
+        return sum(a.nbytes for a in mesh._getCellArrays())
 
     def getCachedTimes(self):
-        return set(self._cache.keys())
+        with self._cacheLock:
+            return set(self.fieldMeta[ix]['time'] for ix in self._cache.keys())
     def evaluate(self,time: Quantity, positions, eps: float=0.0, epsTime=0.0*au.s):
         return self.getField(time,epsTime=epsTime).evaluate(positions=positions,eps=eps)
+
+    def _probe(self, ix, positions, eps):
+        """
+        Return (op,rows,found) for evaluating field fieldMeta[ix] at *positions*: *op* (see :obj:`mupif.field.probeOperator`) is restricted to columns *rows* (the only values needed). Operators are kept for meshes in the cache (by mesh location, i.e. digest), so points are not located again for fields sharing the mesh.
+        """
+        field = self._getFieldByIndex(ix)
+        key = (self.fieldMeta[ix]['loc']['mesh'], field.fieldType, positions.tobytes(), positions.shape, eps)
+        with self._cacheLock:
+            if (ret := self._probes.get(key, None)) is not None: return field, ret
+        op, found = probeOperator(field.getMesh(), positions, field.fieldType, eps=eps)
+        rows = np.unique(op.indices)
+        ret = (op[:, rows], rows, found)
+        with self._cacheLock:
+            self._probes[key] = ret
+            while len(self._probes) > 16: self._probes.pop(next(iter(self._probes)))
+        return field, ret
+
+    @staticmethod
+    def _probeValues(field, op, rows):
+        'Apply probe operator to field values; for heavy field, only *rows* of the dataset are read.'
+        if (ds := getattr(field.quantity, 'dataset', None)) is not None:
+            vals = heavydata.readRows(ds, rows)
+        else:
+            vals = np.asarray(field.value)[rows]
+        if vals.ndim == 1: vals = vals[:, np.newaxis]
+        return op@vals
+
+    def _probePositions(self, positions, ix):
+        'Convert positions to (N,dim) array in mesh units.'
+        if isinstance(positions, Quantity):
+            m = self._getFieldByIndex(ix).getMesh()
+            if m.unit is None: raise RuntimeError(f'position has unit "{positions.unit}" but mesh has no unit defined.')
+            positions = positions.to(m.unit).value
+        return np.atleast_2d(np.asarray(positions, dtype=np.float64))
+
+    def _probeResult(self, field, vals, found, returnMask):
+        if not found.all():
+            vals = vals.astype(np.result_type(vals.dtype, np.float64))
+            vals[~found] = np.nan
+            if not returnMask: raise ValueError(f'No source cell found for {np.count_nonzero(~found)} of {found.shape[0]} positions.')
+        ret = Quantity(value=vals, unit=field.getUnit())
+        return (ret, ~found) if returnMask else ret
+
+    def evaluateInterpolated(self, time: Quantity, positions, eps: float=0.0, returnMask: bool=False):
+        """
+        Evaluate at *time* (which need not be stored) by linear interpolation between fields at the nearest stored times before and after. All *positions* are processed at once; points are located only once when both fields share the mesh (and re-used in subsequent calls), and only the values needed are read from heavy fields.
+
+        :param positions: (N,dim) array of positions (or :obj:`Quantity` with length units)
+        :param bool returnMask: if True, return mask of positions outside of the mesh (where values are NaN) along with the values; otherwise raise ValueError if there are such positions
+        :return: (N,nComp) values (and the mask, if *returnMask* is True)
+        :rtype: Quantity or (Quantity,numpy.ndarray)
+        """
+        tt, ii = self._sortedTimes()
+        t = time.to_value(au.s)
+        if tt.shape[0] == 0 or t < tt[0] or t > tt[-1]: raise ValueError(f'Time {time} out of stored range.')
+        i1 = int(np.searchsorted(tt, t, side='left'))
+        i0 = i1 if tt[i1] == t else i1-1
+        positions = self._probePositions(positions, int(ii[i0]))
+        f0, (op0, rows0, found0) = self._probe(int(ii[i0]), positions, eps)
+        v0 = self._probeValues(f0, op0, rows0)
+        if i0 == i1: return self._probeResult(f0, v0, found0, returnMask)
+        f1, (op1, rows1, found1) = self._probe(int(ii[i1]), positions, eps)
+        v1 = self._probeValues(f1, op1, rows1)*f1.getUnit().to(f0.getUnit())
+        w = (t-tt[i0])/(tt[i1]-tt[i0])
+        return self._probeResult(f0, (1-w)*v0+w*v1, found0 & found1, returnMask)
+
+    def iterProbes(self, positions, tMin: typing.Optional[Quantity]=None, tMax: typing.Optional[Quantity]=None, eps: float=0.0, returnMask: bool=False):
+        """
+        Iterate over stored times between *tMin* and *tMax* (inclusive; all times if not given) in ascending order, yielding (time,values) with values at *positions* (as in :obj:`evaluateInterpolated`). Point location is done once for each distinct mesh, and only the values needed are read from heavy fields.
+
+        :return: generator of (time,values) or (time,values,mask) if *returnMask* is True
+        """
+        tt, ii = self._sortedTimes()
+        i0 = 0 if tMin is None else int(np.searchsorted(tt, tMin.to_value(au.s), side='left'))
+        i1 = tt.shape[0] if tMax is None else int(np.searchsorted(tt, tMax.to_value(au.s), side='right'))
+        if i0 >= i1: return
+        positions = self._probePositions(positions, int(ii[i0]))
+        for i in range(i0, i1):
+            ix = int(ii[i])
+            field, (op, rows, found) = self._probe(ix, positions, eps)
+            ret = self._probeResult(field, self._probeValues(field, op, rows), found, returnMask)
+            yield (self.fieldMeta[ix]['time'],)+(ret if returnMask else (ret,))
     def addField(self,field,userMetadata):
         time=field.getTime()
         if self.timeMetadata(time): raise ValueError(f'Field already saved for time {time}')
         loc=self._field_save_return_loc(field) # TODO: save userMetadata to the container redundantly
         self.fieldMeta.append({'time':time,'loc':loc,'user':userMetadata})
-    def _field_make_from_loc(self,loc):
+    def _field_make_from_loc(self,loc,meshObj=None):
         fieldGrp,meshGrp=self._loc_to_h5_groups(loc)
-        return Field.makeFromHdf5_groups(fieldGrp=fieldGrp,meshGrp=meshGrp,heavy=True)
+        return Field.makeFromHdf5_groups(fieldGrp=fieldGrp,meshGrp=meshGrp,heavy=True,meshObj=meshObj)
 
 class DirTemporalField(TemporalField):
     """Implementation of TemporalField which stored all data in local files"""
@@ -91,7 +309,7 @@ class SingleFileTemporalField(TemporalField,HeavyDataBase):
     def __init__(self,*a,**kw):
         TemporalField.__init__(self,*a,**kw)
         HeavyDataBase.__init__(self,*a,**kw)
-        self._cache={} # hack
+        self._initCache() # hack
     def _loc_to_h5_groups(self,loc):
         self._ensureData()
         return (self._h5obj[loc["field"]],self._h5obj[loc["mesh"]])
@@ -113,13 +331,21 @@ class SingleFileTemporalField(TemporalField,HeavyDataBase):
         self.openData(mode=self.mode)
         return self
     def __exit__(self, exc_type, exc_value, traceback): self.closeData()
+    def closeData(self):
+        # fields being prefetched need the storage open
+        self.waitPrefetch()
+        HeavyDataBase.closeData(self)
     def openData(self,mode=typing.Optional[HeavyDataBase.ModeChoice]):
+        import h5py
         self.openStorage(mode=mode)
         if 'fields' in self._h5obj:
             for f in self._h5obj['fields']:
                 grp=self._h5obj['fields'][f]
                 print(f'{grp.name=}')
-                self.fieldMeta.append({'time':pickle.loads(grp.attrs['time'].tobytes()),'loc':{'field':grp.name,'mesh':grp.name+'/mesh'}})
+                # resolve the mesh link to the deduplicated mesh group (meshes/<digest>), so that fields with the same mesh share it
+                lnk=grp.get('mesh',getlink=True)
+                mLoc=lnk.path.lstrip('/') if isinstance(lnk,h5py.SoftLink) else grp.name+'/mesh'
+                self.fieldMeta.append({'time':pickle.loads(grp.attrs['time'].tobytes()),'loc':{'field':grp.name,'mesh':mLoc}})
     def writeXdmf(self,xdmf=None,timeUnit=au.s):
         self._ensureData()
         from pathlib import Path
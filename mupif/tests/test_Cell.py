@@ -231,6 +231,18 @@ class Quad_2d_lin_TestCase(unittest.TestCase):
         self.assertEqual(self.cell.containsPoint((0.,5.)),True,'Error in contains point(0.,5.)')
         self.assertEqual(self.cell.containsPoint((4.01,2.)),False,'Error in contains point(4.01,2.)')
         
+    def test_glob2locBatch(self):
+        pts = np.array([(0., 0.), (2., 0.), (3., 1.), (2., 2.), (0., 3.), (0., -0.2), (4.01, 2.)])
+        coords = np.array([v.getCoordinates() for v in self.cell.getVertices()])
+        inside, lc = cell.Quad_2d_lin.glob2locBatch(np.broadcast_to(coords, (len(pts),)+coords.shape), pts)
+        for p, ins, l in zip(pts, inside, lc):
+            self.assertEqual(ins, self.cell.containsPoint(tuple(p)))
+            if ins:
+                self.assertTrue(np.allclose(l, self.cell.glob2loc(tuple(p))[1]))
+        N = cell.Quad_2d_lin.evalNBatch(lc[inside])
+        self.assertEqual(N.shape, (np.count_nonzero(inside), 4))
+        self.assertTrue(np.allclose(N.sum(axis=1), 1.))
+
     def test_getTransformationJacobian(self):
         self.assertEqual(self.cell.getTransformationJacobian((1.0,1.0)),2.5,'error in getTransformationJacobian for (1.0,1.0)')
         self.assertEqual(self.cell.getTransformationJacobian((-1.0,-1.0)),3.5,'error in getTransformationJacobian for (-1.0,-1.0)')        
@@ -472,6 +484,18 @@ class Brick_3d_lin_TestCase(unittest.TestCase):
         self.assertEqual(self.cell.containsPoint((0.,3.01,0.)),False,'error in containsPoint for (0,3.01,0)')
        
         
+    def test_glob2locBatch(self):
+        pts = np.array([(0., 0., 0.), (2.5, 1.5, -1.), (1., 1., 0.), (2.5, 2., -1.5), (0., 3.01, 0.), (5., 3., -2.)])
+        coords = np.array([v.getCoordinates() for v in self.cell.getVertices()])
+        inside, lc = cell.Brick_3d_lin.glob2locBatch(np.broadcast_to(coords, (len(pts),)+coords.shape), pts)
+        for p, ins, l in zip(pts, inside, lc):
+            self.assertEqual(ins, self.cell.containsPoint(tuple(p)))
+            if ins:
+                self.assertTrue(np.allclose(l, self.cell.glob2loc(tuple(p))[1]))
+        N = cell.Brick_3d_lin.evalNBatch(lc[inside])
+        self.assertEqual(N.shape, (np.count_nonzero(inside), 8))
+        self.assertTrue(np.allclose(N.sum(axis=1), 1.))
+
     def test_getTransformationJacobian(self):
         print(self.cell.getTransformationJacobian((-1.0, 1.0, 1.0)))
         self.assertEqual(self.cell.getTransformationJacobian((-1.0, 1.0, 1.0)), 30.0/8.0, 'error in getTransformationJacobian')
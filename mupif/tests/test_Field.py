@@ -1,5 +1,7 @@
 import unittest
 import tempfile
+import numpy as np
+import h5py
 from mupif import *
 import mupif
 
@@ -133,6 +135,53 @@ class Field_TestCase(unittest.TestCase):
         self.assertEqual(self.f1.evaluate((1000, 2500, 0)*au.mm).getValue(), (93.5,))
         self.assertRaises(au.UnitConversionError, lambda: self.f1.evaluate((1, 2, 3)*au.s))
 
+    def test_evaluateBatch(self):
+        pts = [(1., 2.5, 0.), (3., 1., 0.), (2., 4., 0.), (.5, 5.2, 0.)]
+        ans = self.f1.evaluate(pts)
+        self.assertEqual(ans.shape, (4, 1))
+        for p, a in zip(pts, ans):
+            self.assertAlmostEqual(a[0].value, self.f1.evaluate(p).getValue()[0], delta=1e-8)
+        ans = self.f6.evaluateBatch(np.array([(2., 2., 2.), (1.5, 1.5, 1.5)]))
+        self.assertTrue(np.allclose(ans.value[:, 0], (24., 18.)))
+        # point outside of the mesh
+        self.assertRaises(ValueError, lambda: self.f1.evaluateBatch([(1., 2.5, 0.), (10., 10., 0.)]))
+        ans, outside = self.f1.evaluateBatch([(1., 2.5, 0.), (10., 10., 0.)], returnMask=True)
+        self.assertEqual(outside.tolist(), [False, True])
+        self.assertAlmostEqual(ans[0, 0].value, 93.5)
+        self.assertTrue(np.isnan(ans[1, 0].value))
+
+    def test_mapTo(self):
+        src = mupif.UniformRectilinearMesh(origin=(0., 0., 0.), spacing=(.1, .1, .1), dims=(11, 11, 11))
+        tgt = mupif.UniformRectilinearMesh(origin=(.05, .05, .05), spacing=(.13, .13, .13), dims=(7, 7, 7))
+        vc = src.getVertexCoords()
+        fv = field.Field(mesh=src, fieldID=DataID.FID_Temperature, valueType=ValueType.Scalar, quantity=Quantity(value=(vc@(1., 2., 3.))[:, np.newaxis], unit=mupif.U.K))
+        # trilinear interpolation of linear function is exact
+        mv = fv.mapTo(tgt)
+        self.assertEqual(mv.getUnit(), mupif.U.K)
+        self.assertTrue(np.allclose(mv.value[:, 0], tgt.getVertexCoords()@(1., 2., 3.)))
+        # the operator is cached
+        nCache = len(field._mappingCache)
+        op = field.mappingOperator(src, tgt, FieldType.FT_vertexBased, FieldType.FT_vertexBased)[0]
+        self.assertEqual(len(field._mappingCache), nCache)
+        self.assertEqual(op.shape, (tgt.getNumberOfVertices(), src.getNumberOfVertices()))
+        # vertex-based to cell-based (values at centroids)
+        mc = fv.mapTo(tgt, fieldType=FieldType.FT_cellBased)
+        self.assertEqual(mc.value.shape, (tgt.getNumberOfCells(), 1))
+        self.assertAlmostEqual(mc.value[0, 0], .115*6)
+        # cell-based, averaging and conservative
+        fc = field.Field(mesh=src, fieldID=DataID.FID_Temperature, valueType=ValueType.Scalar, fieldType=FieldType.FT_cellBased, quantity=Quantity(value=np.arange(1000.), unit=mupif.U.K))
+        ma = fc.mapTo(tgt, method='average')
+        mcons = fc.mapTo(tgt, method='conservative')
+        self.assertEqual(ma.value.shape, mcons.value.shape)
+        self.assertTrue(np.all((mcons.value >= 0) & (mcons.value <= 999)))
+        self.assertRaises(ValueError, lambda: fv.mapTo(tgt, method='conservative'))
+        # target partially outside
+        out = mupif.UniformRectilinearMesh(origin=(.5, .5, .5), spacing=(.3, .3, .3), dims=(3, 3, 3))
+        self.assertRaises(ValueError, lambda: fv.mapTo(out))
+        mo, outside = fv.mapTo(out, returnMask=True)
+        self.assertEqual(np.count_nonzero(outside), 27-8)
+        self.assertTrue(np.isnan(mo.value[outside]).all())
+
     def test_getVertexValue(self):
         self.assertEqual(self.f1.getVertexValue(0).getValue(), (0,))
         self.assertEqual(self.f1.getVertexValue(1).getValue(), (12,))
@@ -149,6 +198,15 @@ class Field_TestCase(unittest.TestCase):
         self.f4.setRecord(3, [5])
         self.assertEqual(self.f4.getVertexValue(3).getValue(), (5,))
 
+    def test_dataDigest(self):
+        d0=self.f1.dataDigest()
+        self.assertEqual(self.f1.dataDigest(),d0)
+        self.f1.setRecord(0,(1.,))
+        d1=self.f1.dataDigest()
+        self.assertNotEqual(d1,d0)
+        self.f1.time=14*mupif.Q.s
+        self.assertNotEqual(self.f1.dataDigest(),d1)
+
     def test_getUnit(self):
         self.assertEqual(self.f1.getUnit(), mupif.U.m)
         self.assertEqual(self.f2.getUnit(), mupif.U['kg/(m*s**2)'])
@@ -188,6 +246,16 @@ class Field_TestCase(unittest.TestCase):
         self.f1.toHdf5(fileName=f)
         res = self.f1.makeFromHdf5(fileName=f)[0]
         self._compareFields(self.f1, res)
+        # contiguous dataset is read at once, or memory-mapped (copy-on-write) on request
+        with h5py.File(f, 'r') as h5:
+            ds = h5['component1/part1/fields/1/vertex_values']
+            self.assertFalse(isinstance(field.Field._readHdf5Dataset(ds), np.memmap))
+            self.assertTrue(isinstance(field.Field._readHdf5Dataset(ds, mmap=True), np.memmap))
+        self.assertFalse(isinstance(res.value, np.memmap))
+        res = self.f1.makeFromHdf5(fileName=f, mmap=True)[0]
+        self._compareFields(self.f1, res)
+        res.setRecord(0, (1.,))
+        self.assertEqual(self.f1.makeFromHdf5(fileName=f)[0].getRecord(0)[0], self.f1.getRecord(0)[0])
 
     @unittest.skipIf(meshio is None, 'meshio not importable')
     def test_ioMeshio(self):
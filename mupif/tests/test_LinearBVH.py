@@ -0,0 +1,63 @@
+import sys
+sys.path.append('../..')
+
+import unittest
+from mupif import *
+import mupif as mp
+import numpy as np
+
+
+class LinearBVH_TestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.rng = rng
+        self.boxes = {}
+        for dim in (2, 3):
+            c = rng.random((2000, dim))
+            self.boxes[dim] = np.stack((c, c+rng.random((2000, dim))*.05), axis=1)
+
+    def _bruteForce(self, boxes, ll, ur):
+        return np.nonzero(np.all(boxes[:, 0] <= ur, axis=1) & np.all(ll <= boxes[:, 1], axis=1))[0]
+
+    def test_batch(self):
+        for dim, boxes in self.boxes.items():
+            loc = bvh.LinearBVH(boxes, leafSize=4)
+            ll = self.rng.random((300, dim))-.1
+            ur = ll+self.rng.random((300, dim))*.3
+            offsets, items = loc.getItemsInBBoxBatch(ll, ur)
+            self.assertEqual(offsets.shape, (301,))
+            for i in range(300):
+                self.assertTrue(np.array_equal(items[offsets[i]:offsets[i+1]], self._bruteForce(boxes, ll[i], ur[i])))
+
+    def test_getItemsInBBox(self):
+        boxes = self.boxes[3]
+        loc = bvh.LinearBVH(boxes)
+        # whole domain
+        self.assertEqual(loc.getItemsInBBox(bbox.BBox((-1., -1., -1.), (2., 2., 2.))), set(range(boxes.shape[0])))
+        # nothing
+        self.assertEqual(loc.getItemsInBBox(bbox.BBox((3., 3., 3.), (4., 4., 4.))), set())
+        # touching box intersects, as in BBox.intersects
+        self.assertIn(17, loc.getItemsInBBox(bbox.BBox(tuple(boxes[17, 1]), tuple(boxes[17, 1]+1.))))
+
+    def test_degenerate(self):
+        # no items
+        loc = bvh.LinearBVH(np.zeros((0, 2, 3)))
+        self.assertEqual(loc.getItemsInBBox(bbox.BBox((0., 0., 0.), (1., 1., 1.))), set())
+        # identical point boxes (all have the same Morton code)
+        loc = bvh.LinearBVH(np.zeros((100, 2, 2)))
+        self.assertEqual(loc.getItemsInBBox(bbox.BBox((0., 0.), (0., 0.))), set(range(100)))
+        self.assertRaises(NotImplementedError, lambda: loc.insert(0, bbox.BBox((0., 0.), (1., 1.))))
+        self.assertRaises(ValueError, lambda: bvh.LinearBVH(np.zeros((10, 3))))
+
+    def test_meshLocalizer(self):
+        m = mp.UniformRectilinearMesh(origin=(0, 0, 0), spacing=(.1, .2, .3), dims=(6, 5, 4))
+        um = mesh.UnstructuredMesh()
+        um.setup([m.getVertex(i) for i in range(m.getNumberOfVertices())], [m.getCell(i) for i in range(m.getNumberOfCells())])
+        self.assertTrue(isinstance(um.getCellLocalizer(), bvh.LinearBVH))
+        bb = bbox.BBox((.15, .15, .15), (.25, .25, .25))
+        cells = um.getCellLocalizer().getItemsInBBox(bb)
+        self.assertEqual(cells, set(i for i in range(um.getNumberOfCells()) if um.getCell(i).getBBox().intersects(bb)))
+
+
+if __name__ == '__main__':
+    unittest.main()
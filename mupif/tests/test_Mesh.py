@@ -24,6 +24,13 @@ class UniformRectilinearMesh(unittest.TestCase):
         # from rich.pretty import pprint
         # pprint(dict([(i,self.m1.getVertex(i).coords) for i in range(0,self.m1.getNumberOfVertices())]))
         # self.assertTrue(False)
+    def test_getVertexCoords(self):
+        vc=self.m1.getVertexCoords()
+        self.assertEqual(vc.shape,(60,3))
+        for i in (0,7,59): self.assertTrue(np.allclose(vc[i],self.m1.getVertex(i).getCoordinates()))
+        bb=self.m1.getGlobalBBox()
+        self.assertTrue(np.allclose(bb.coords_ll,(-3,-2,-1)))
+        self.assertTrue(np.allclose(bb.coords_ur,(-1.8,-1.4,-.8)))
     # TODO: more tests
 
 class Mesh_TestCase(unittest.TestCase):
@@ -88,6 +95,21 @@ class Mesh_TestCase(unittest.TestCase):
         self.res=self.mesh3.getCell(0)
         self.assertEqual(self.res.getNumberOfVertices(),3)
         self.assertEqual(self.res.getVertices(),mkCell(self.mesh3,5,22,(0,1,2)).getVertices())        
+    def test_getVertexCoords(self):
+        self.assertEqual(self.mesh1.getVertexCoords().tolist(),[[0.,0.],[2.,0.],[0.,5.]])
+        self.assertEqual(self.mesh5.getVertexCoords().shape,(4,3))
+        bb=self.mesh5.getGlobalBBox()
+        self.assertEqual((bb.coords_ll,bb.coords_ur),((3.,1.,0.),(545.,72.,0.)))
+
+    def test_getCellBBoxes(self):
+        for m in (self.mesh3,self.mesh5):
+            bbs=m.getCellBBoxes()
+            self.assertEqual(bbs.shape,(2,2,m.getVertexCoords().shape[1]))
+            for i,bb in enumerate(bbs):
+                cbb=m.getCell(i).getBBox()
+                self.assertTrue(np.allclose(bb,(cbb.coords_ll,cbb.coords_ur)))
+        self.assertEqual(self.mesh1.getCellBBoxes().shape,(0,2,2))
+
     def test_getVertexLocalizer(self):
         self.res=self.mesh2.getVertexLocalizer()
         s=self.res.getItemsInBBox(bbox.BBox((0.,0.,2.),(3.,5.,2.)))
@@ -125,6 +147,92 @@ class Mesh_TestCase(unittest.TestCase):
         self.assertEqual(self.mesh3.getCell(2).getVertices()[0].label, 16)
         self.assertEqual(self.mesh3.getCell(2).getVertices()[1].label, 5)
 
+    def test_dataDigest(self):
+        d0=self.mesh3.dataDigest()
+        self.assertEqual(self.mesh3._dataDigest,(util.digestAlgorithm,d0))
+        self.assertEqual(self.mesh3.dataDigest(),d0)
+        # modification invalidates the cached digest
+        self.mesh3.merge(self.mesh1)
+        d1=self.mesh3.dataDigest()
+        self.assertNotEqual(d1,d0)
+        m=mesh.UnstructuredMesh()
+        m.setupCompact([(0.,0.),(1.,0.),(0.,1.)],[cellgeometrytype.CGT_TRIANGLE_1],[(0,1,2)])
+        d2=m.dataDigest()
+        m.setupCompact([(0.,0.),(2.,0.),(0.,1.)],[cellgeometrytype.CGT_TRIANGLE_1],[(0,1,2)])
+        self.assertNotEqual(m.dataDigest(),d2)
+        self.mesh3.setup(self.mesh5.vertexList,self.mesh5.cellList)
+        self.assertEqual(self.mesh3.dataDigest(),self.mesh5.dataDigest())
+        # other algorithms are recorded in the digest
+        util.digestAlgorithm='blake2b'
+        try:
+            self.assertTrue(self.mesh5.dataDigest().startswith('blake2b-'))
+            self.assertNotEqual(self.mesh5.dataDigest(),self.mesh3._dataDigest[1])
+        finally: util.digestAlgorithm='sha1'
+        self.assertRaises(ValueError,lambda: util.dataDigest([],algorithm='foo'))
+
+    def test_arrays(self):
+        import h5py, tempfile
+        m=mesh.UnstructuredMesh()
+        m.setupCompact([(0.,0.),(1.,0.),(1.,1.),(0.,1.),(2.,0.),(2.,1.)],[cellgeometrytype.CGT_QUAD,cellgeometrytype.CGT_TRIANGLE_1,cellgeometrytype.CGT_TRIANGLE_1],[(0,1,2,3),(1,4,2),(4,5,2)])
+        types,offsets,verts=m.getCellsCSR()
+        self.assertEqual(offsets.tolist(),[0,4,7,10])
+        self.assertEqual(verts.tolist(),[0,1,2,3,1,4,2,4,5,2])
+        m2=mesh.UnstructuredMesh()
+        m2.setupCompact(m.getVertexCoords(),types,verts,cellOffsets=offsets)
+        self.assertEqual(m2.getCell(2).vertices,(4,5,2))
+        self.assertRaises(ValueError,lambda: m2.setupCompact(m.getVertexCoords(),types,verts,cellOffsets=[0,3,7,10]))
+        # meshio roundtrip, with cells grouped by type
+        points,cells=m.toMeshioPointsCells()
+        self.assertEqual(points.shape,(6,3))
+        self.assertEqual([(t,c.tolist()) for t,c in cells],[('quad',[[0,1,2,3]]),('triangle',[[1,4,2],[4,5,2]])])
+        m3=mesh.Mesh.makeFromMeshioMesh(meshio.Mesh(points,cells))
+        self.assertTrue(m3.isCompact())
+        self.assertTrue(all(m3.getCell(i).vertices==m.getCell(i).vertices for i in range(3)))
+        # HDF5 roundtrip
+        with tempfile.TemporaryDirectory() as tmp:
+            with h5py.File(tmp+'/mesh.h5','w') as h5:
+                m.toHdf5Group(h5.create_group('mesh'))
+                m4=mesh.Mesh.makeFromHdf5group(h5['mesh'])
+        self.assertTrue(m4.isCompact())
+        self.assertEqual(m4.dataDigest(),m.dataDigest())
+        self.assertTrue(isinstance(m4.getCell(0),cell.Quad_2d_lin))
+
+    def test_compact(self):
+        import pickle
+        m=self.mesh3.copy()
+        m.compact()
+        self.assertTrue(m.isCompact())
+        self.assertEqual(m.vertexList,[])
+        self.assertEqual(m.getNumberOfVertices(),4)
+        self.assertEqual(m.getNumberOfCells(),2)
+        for i in range(4):
+            self.assertEqual(m.getVertex(i).label,self.mesh3.getVertex(i).label)
+            self.assertEqual(m.getVertex(i).coords,self.mesh3.getVertex(i).coords)
+        for i in range(2):
+            c,c0=m.getCell(i),self.mesh3.getCell(i)
+            self.assertEqual(type(c),type(c0))
+            self.assertEqual((c.number,c.label,c.vertices),(i,c0.label,c0.vertices))
+        self.assertEqual(m.vertexLabel2Number(16),3)
+        self.assertEqual(m.cellLabel2Number(18),1)
+        self.assertTrue(np.array_equal(m.getCellBBoxes(),self.mesh3.getCellBBoxes()))
+        self.assertEqual(m.getCellLocalizer().getItemsInBBox(bbox.BBox((3.,4.),(4.,5.))),{0,1})
+        for m2 in (pickle.loads(pickle.dumps(m)),mp.UnstructuredMesh.from_dict(m.to_dict()),m.copy()):
+            self.assertTrue(m2.isCompact())
+            self.assertEqual(m2.getCell(1).vertices,(1,2,3))
+            self.assertEqual(m2.getVertex(3).label,16)
+            self.assertTrue(m2.getCell(1).mesh is m2)
+        # mixed topology, no labels
+        m=mesh.UnstructuredMesh()
+        m.setupCompact([(0.,0.),(1.,0.),(1.,1.),(0.,1.),(2.,0.)],[cellgeometrytype.CGT_QUAD,cellgeometrytype.CGT_TRIANGLE_1],[(0,1,2,3),(1,4,2)])
+        self.assertEqual(m.getCell(1).vertices,(1,4,2))
+        self.assertTrue(isinstance(m.getCell(0),cell.Quad_2d_lin))
+        self.assertEqual(m.getVertex(4).label,None)
+        self.assertRaises(ValueError,lambda: m.setupCompact([(0.,0.)],[cellgeometrytype.CGT_TRIANGLE_1],[(0,1,2)]))
+        # merging converts to objects
+        self.mesh5.compact()
+        self.mesh3.merge(self.mesh5)
+        self.assertEqual(self.mesh3.getCell(2).getVertices()[0].label, 16)
+
     @unittest.skipIf(vtk is None,'vtk not importable')
     def test_asVtkUnstructuredGrid(self):
         # @todo: not working with mesh1 because points have only two coordinates
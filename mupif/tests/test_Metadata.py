@@ -108,6 +108,21 @@ class Metadata_TestCase(unittest.TestCase):
         propeucid = self.tm2.get(objectTypeID=DataID.PID_Time_step, time=1.*mupif.U.s).getMetadata('Execution.Use_case_ID')
         self.assertEqual(propeucid, self.tm2.getMetadata('Execution.Use_case_ID'))
 
+    def test_access(self):
+        # containers are returned as copies, unless requested otherwise
+        self.tm2.getMetadata('Solver')['Language'] = 'C++'
+        self.assertEqual(self.tm2.getMetadata('Solver.Language'), 'Python3')
+        self.assertIs(self.tm2.getMetadata('Solver', deepcopy=False), self.tm2.metadata['Solver'])
+        self.assertEqual(self.tm2.getMetadata('Solver.Foo', default='x'), 'x')
+        self.assertRaises(KeyError, self.tm2.getMetadata, 'Solver.Foo')
+        self.assertTrue(self.tm2.hasMetadata('Solver.Language'))
+        self.assertFalse(self.tm2.hasMetadata('Foo.Language'))
+        self.assertFalse(self.tm2.hasMetadata('Name.Foo'))
+        self.tm2.setMetadataMany({'Solver.Language': 'C++', 'Foo.Bar': 1})
+        self.assertEqual(self.tm2.getMetadataMany(['Solver.Language', 'Foo.Bar', 'Foo.Baz']), {'Solver.Language': 'C++', 'Foo.Bar': 1, 'Foo.Baz': None})
+        self.tm2.updateMetadata({'Foo': {'Baz': 2}})
+        self.assertEqual(self.tm2.getMetadata('Foo'), {'Bar': 1, 'Baz': 2})
+
 
 # python test_Metadata.py for stand-alone test being run
 if __name__ == '__main__':
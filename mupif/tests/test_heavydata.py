@@ -143,6 +143,29 @@ class Hdf5Quantity_TestCase(unittest.TestCase):
         self.assertIsNotNone(self.hq.h5uri)
         self.assertNotEqual(self.hq.h5path,hq2.h5path) # storage should have been copied
 
+    def test_12_lazyRemoteAccess(self):
+        C=self.__class__
+        hq=mp.Hdf5OwningRefQuantity(mode='create',h5loc='/big')
+        hq.allocateDataset(shape=(200000,3),dtype='f8',unit='m/s')
+        hq.value[:]=np.arange(600000.).reshape(-1,3)
+        hq.closeData()
+        p=Pyro5.api.Proxy(C.daemon.register(hq))
+        mp.heavydata.lazyRemoteAccess=True
+        try: hq2=p.copyRemote()
+        finally: mp.heavydata.lazyRemoteAccess=False
+        # nothing downloaded, still refers to the remote
+        self.assertIsNotNone(hq2.h5uri)
+        hq2.openData(mode='readonly')
+        self.assertEqual(list(hq2.value[100000]),[300000.,300001.,300002.])
+        # only small fraction of the file was transferred
+        self.assertLess(hq2._remoteFile.bytesTransferred,os.path.getsize(hq.h5path)/10)
+        hq2.closeData()
+        # writing downloads the whole file
+        hq2.openData(mode='readwrite')
+        self.assertIsNone(hq2.h5uri)
+        hq2.value[0]=(1,2,3)
+        self.assertEqual(list(hq2.value[199999]),[599997.,599998.,599999.])
+        hq2.closeData()
     def test_20_makeFromQuantity2d(self):
         q=mp.Quantity(value=np.array([[1,2,3],[4,5,6],[7,8,9]]),unit='m/s')
         hq=mp.Hdf5OwningRefQuantity.makeFromQuantity(q)
@@ -629,6 +652,35 @@ class HeavyStruct_TestCase(unittest.TestCase):
             self.assertEqual(valOld.unit,valNew.unit)
             np.testing.assert_almost_equal(valOld.value,valNew.value)
 
+    def test_41_columns(self):
+        with mp.HeavyStruct(schemaName='org.mupif.sample.atom',schemasJson=sampleSchemas_json,mode='create-memory') as atoms:
+            atoms.resize(100)
+            # whole columns, with unit conversion
+            atoms.setColumns({'identity.element':np.array([b'H',b'N']*50),'properties.topology.position':np.arange(300).reshape(-1,3)*u.nm})
+            self.assertEqual(atoms[3].getIdentity().getElement(),'N')
+            np.testing.assert_allclose(atoms[3].getProperties().getTopology().getPosition().to(u.nm).value,[9,10,11])
+            pos=atoms.getColumn('properties.topology.position')
+            self.assertEqual(pos.unit,u.Unit('Angstrom'))
+            self.assertEqual(pos.shape,(100,3))
+            # index arrays: unordered, repeated, boolean masks
+            np.testing.assert_allclose(atoms.getColumn('properties.topology.position',rows=[5,3,5]).to(u.nm).value[:,0],[15,9,15])
+            atoms.setColumn('properties.topology.name','abc',rows=np.arange(100)%7==0)
+            self.assertEqual(list(atoms.getColumn('properties.topology.name',rows=[0,1,7])),[b'abc',b'',b'abc'])
+            # variable-length column
+            atoms.setColumn('properties.topology.structure',[np.arange(i) for i in range(3)],rows=[98,2,50])
+            self.assertEqual(list(atoms[50].getProperties().getTopology().getStructure()),[0,1])
+            self.assertEqual(list(atoms[98].getProperties().getTopology().getStructure()),[])
+            # nested context: names are relative; indexed context: single row
+            self.assertEqual(set(atoms.getProperties().getTopology().getColumns(rows=slice(0,2)).keys()),{'parent','type','name','position','velocity','structure'})
+            self.assertEqual(atoms[4].getColumns(['identity.element']),{'identity.element':b'H'})
+            self.assertRaises(IndexError,lambda: atoms[4].getColumn('identity.element',rows=[1]))
+            self.assertRaises(IndexError,lambda: atoms.getColumn('identity.element',rows=[100]))
+            self.assertRaises(KeyError,lambda: atoms.getColumn('identity.atomicNumber'))
+            # dump/inject roundtrip goes through the bulk path
+            a2=mp.HeavyStruct(schemaName='org.mupif.sample.atom',schemasJson=sampleSchemas_json).openData(mode='create-memory')
+            a2.inject(atoms)
+            self.assertEqual(str(a2.to_dump()),str(atoms.to_dump()))
+            self.assertEqual(str(atoms[50].to_dump()),str(a2.to_dump()[50]))
 
     def test_50_schema(self):
         import jsonschema
@@ -665,4 +717,130 @@ class HeavyMesh_TestCase(unittest.TestCase):
         val1=fields[0].evaluate((.1,.1,.1))
         self.assertEqual(val0,val1)
         mesh.closeData()
-
+    def test_localizerStorage(self):
+        cls=self.__class__
+        h5path=f'{cls.tmp}/02-mesh.h5'
+        bb=mp.BBox((.1,.1,.1),(.3,.3,.3))
+        with mp.HeavyUnstructuredMesh(h5path=h5path,mode='overwrite') as mesh:
+            mesh.fromMeshioMesh(cls.box)
+            cells0=mesh.getCellLocalizer().getItemsInBBox(bb)
+            self.assertTrue(mesh.GRP_LOCALIZER+'/'+mesh.dataDigest() in mesh._h5grp)
+        # stored localizer is memory-mapped from the file
+        mesh,fields=mp.HeavyUnstructuredMesh.load(h5path)
+        loc=mesh.getCellLocalizer()
+        self.assertTrue(isinstance(loc.items,np.memmap))
+        self.assertEqual(loc.getItemsInBBox(bb),cells0)
+        mesh.closeData()
+        # modification invalidates the stored localizer
+        with mp.HeavyUnstructuredMesh(h5path=h5path,mode='readwrite') as mesh:
+            self.assertTrue(mesh.GRP_LOCALIZER in mesh._h5grp)
+            mesh.appendVertices(np.array([[5.,5.,5.]]))
+            self.assertFalse(mesh.GRP_LOCALIZER in mesh._h5grp)
+            self.assertEqual(mesh.getVertexLocalizer().getItemsInBBox(mp.BBox((4.,4.,4.),(6.,6.,6.))),{mesh.getNumberOfVertices()-1})
+
+    def test_appendCells(self):
+        cls=self.__class__
+        h5path=f'{cls.tmp}/03-mesh.h5'
+        CGT=mp.cellgeometrytype
+        verts=np.array([(0,0,0),(2,0,0),(0,5,0),(4,2,0),(5,4,0),(.5,5.5,0)],dtype='f8')
+        types=[CGT.CGT_TRIANGLE_1,CGT.CGT_QUAD,CGT.CGT_TRIANGLE_1]
+        conn=[(0,1,2),(2,3,4,5),(1,2,3)]
+        with mp.HeavyUnstructuredMesh(h5path=h5path,mode='overwrite') as mesh:
+            mesh.appendVertices(verts)
+            # mixed types as list of sequences
+            mesh.appendCells(types=types,conn=conn)
+            # homogeneous block
+            mesh.appendCells(types=CGT.CGT_TRIANGLE_1,conn=np.array([(3,4,5),(0,2,5)]))
+            # pre-encoded XDMF connectivity (copied from the storage itself)
+            offsets,xconn=mesh._h5grp[mesh.GRP_CELL_OFFSETS][:3],mesh._h5grp[mesh.GRP_CELL_CONN][:13]
+            mesh.appendMixedCells(offsets,xconn)
+            self.assertEqual(mesh.getNumberOfCells(),8)
+            self.assertEqual(mesh._h5grp[mesh.GRP_CELL_CONN].shape[0],2*13+2*4)
+            allConn=conn+[(3,4,5),(0,2,5)]+conn
+            for i,cc in enumerate(allConn):
+                self.assertEqual(tuple(mesh.getCell(i).vertices),cc)
+            self.assertRaises(RuntimeError,lambda: mesh.appendCells(types=[CGT.CGT_QUAD],conn=[(0,1,2)]))
+            self.assertRaises(RuntimeError,lambda: mesh.appendCells(types=CGT.CGT_QUAD,conn=np.array([(0,1,2)])))
+            self.assertEqual(mesh.getNumberOfCells(),8)
+    def test_storageProfile(self):
+        cls=self.__class__
+        h5path=f'{cls.tmp}/04-mesh.h5'
+        with mp.HeavyUnstructuredMesh(h5path=h5path,mode='overwrite',storageProfile='fast-write') as mesh:
+            mesh.fromMeshioMesh(cls.box)
+            self.assertEqual(mesh._h5obj.attrs[mp.heavydata.storageProfileAttr],'fast-write')
+            self.assertEqual(mesh._h5grp[mesh.GRP_VERTS].compression,'lzf')
+            fieldP=mesh.makeHeavyField(unit='Pa',fieldID=mp.DataID.FID_Pressure,fieldType=mp.FieldType.FT_cellBased,valueType=mp.ValueType.Scalar)
+            self.assertEqual(fieldP.quantity.dataset.compression,'lzf')
+        # profile recorded in the file is used for new datasets
+        with mp.HeavyUnstructuredMesh(h5path=h5path,mode='readwrite') as mesh:
+            fieldV=mesh.makeHeavyField(unit='m/s',fieldID=mp.DataID.FID_Velocity,fieldType=mp.FieldType.FT_vertexBased,valueType=mp.ValueType.Vector)
+            self.assertEqual(fieldV.quantity.dataset.compression,'lzf')
+        with mp.HeavyUnstructuredMesh(h5path=h5path,mode='overwrite',storageProfile='random-access') as mesh:
+            mesh.fromMeshioMesh(cls.box)
+            ds=mesh._h5grp[mesh.GRP_VERTS]
+            self.assertEqual(ds.compression,None)
+            # row-aligned chunks
+            self.assertEqual(ds.chunks,(2**14//(8*3),3))
+        self.assertRaises(ValueError,lambda: mp.HeavyUnstructuredMesh(h5path=h5path,mode='overwrite',storageProfile='foo').openData(mode='overwrite'))
+        # default profile keeps previous settings of each call site
+        with mp.HeavyUnstructuredMesh(h5path=h5path,mode='overwrite') as mesh:
+            mesh.fromMeshioMesh(cls.box)
+            ds=mesh._h5grp[mesh.GRP_VERTS]
+            self.assertEqual((ds.compression,ds.compression_opts),('gzip',9))
+        hq=mp.Hdf5OwningRefQuantity.makeFromQuantity(mp.Quantity(value=np.zeros((10,3)),unit='m'))
+        self.assertEqual((hq.dataset.compression,hq.dataset.chunks),(None,None))
+        with mp.HeavyStruct(h5path=f'{cls.tmp}/04-grain.h5',h5group='test',mode='create',schemaName='org.mupif.sample.grain',schemasJson=sampleSchemas_json) as grains:
+            grains.resize(size=2)
+            self.assertEqual((grains.ctx.dataset.compression,grains.ctx.dataset.compression_opts),('gzip',4))
+
+    def test_outOfCore(self):
+        cls=self.__class__
+        h5path=f'{cls.tmp}/05-mesh.h5'
+        pts=np.random.default_rng(0).random((500,3))*(1,2,3)-.05
+        with mp.HeavyUnstructuredMesh(h5path=h5path,mode='overwrite') as mesh:
+            mesh.fromMeshioMesh(cls.box)
+            fieldP=mesh.makeHeavyField(unit='Pa',fieldID=mp.DataID.FID_Pressure,fieldType=mp.FieldType.FT_cellBased,valueType=mp.ValueType.Scalar)
+            fieldP.value[:]=np.linspace(0,1,mesh.getNumberOfCells())
+            fieldV=mesh.makeHeavyField(unit='m',fieldID=mp.DataID.FID_Displacement,fieldType=mp.FieldType.FT_vertexBased,valueType=mp.ValueType.Vector)
+            fieldV.value[:]=mesh.getVertexCoords()
+            loc0=mesh.locatePoints(pts)
+            p0,mask0=fieldP.evaluateBatch(pts,returnMask=True)
+            mesh.buildTiles(cellsPerTile=100)
+            self.assertEqual(len(mesh._h5grp[mesh.GRP_TILES]['bboxes']),(mesh.getNumberOfCells()+99)//100)
+        # tiles are used from the (read-only) file, nothing else is read in whole
+        mesh,fields=mp.HeavyUnstructuredMesh.load(h5path)
+        mesh.outOfCore=True
+        loc1=mesh.locatePoints(pts)
+        for a,b in zip(loc0,loc1): self.assertTrue(np.array_equal(a,b))
+        self.assertIsNone(mesh._cellOctree)
+        self.assertIsNone(mesh._vertexCoords)
+        fields={f.fieldID:f for f in fields}
+        p1,mask1=fields[mp.DataID.FID_Pressure].evaluateBatch(pts,returnMask=True)
+        self.assertTrue(np.array_equal(mask0,mask1))
+        np.testing.assert_allclose(p1.value[~mask1],p0.value[~mask0])
+        v1=fields[mp.DataID.FID_Displacement].evaluateBatch(pts[~mask1])
+        np.testing.assert_allclose(v1.value,pts[~mask1])
+        mesh.closeData()
+        # read-only storage without tiles: tiles are built in a temporary file
+        with mp.HeavyUnstructuredMesh(h5path=f'{cls.tmp}/06-mesh.h5',mode='overwrite') as mesh:
+            mesh.fromMeshioMesh(cls.box)
+        mesh,fields=mp.HeavyUnstructuredMesh.load(f'{cls.tmp}/06-mesh.h5')
+        mesh.outOfCore=True
+        loc2=mesh.locatePoints(pts)
+        for a,b in zip(loc0,loc2): self.assertTrue(np.array_equal(a,b))
+        self.assertFalse(mesh.GRP_TILES in mesh._h5grp)
+        # digest is computed by streaming through the datasets, the same as of whole datasets
+        chunk,mp.heavymesh.streamChunk=mp.heavymesh.streamChunk,7
+        try: d=mesh.dataDigest()
+        finally: mp.heavymesh.streamChunk=chunk
+        self.assertEqual(d,mp.util.dataDigest([mesh._h5grp[g][()] for g in (mesh.GRP_VERTS,mesh.GRP_CELL_OFFSETS,mesh.GRP_CELL_CONN)]))
+        tmpPath=mesh._tempTiles.filename
+        self.assertTrue(os.path.exists(tmpPath))
+        mesh.closeData()
+        self.assertFalse(os.path.exists(tmpPath))
+        # modification removes tiles
+        with mp.HeavyUnstructuredMesh(h5path=f'{cls.tmp}/06-mesh.h5',mode='overwrite') as mesh:
+            mesh.fromMeshioMesh(cls.box)
+            mesh.buildTiles()
+            mesh.appendVertices(np.array([[5.,5.,5.]]))
+            self.assertFalse(mesh.GRP_TILES in mesh._h5grp)
@@ -0,0 +1,45 @@
+import sys
+sys.path.append('../..')
+
+import unittest
+import numpy as np
+import mupif as mp
+from mupif import U
+
+
+class MemoryLookupTable_TestCase(unittest.TestCase):
+    def setUp(self):
+        # value = p1 + 2*p2 on 3×2 grid (p2 in mm)
+        self.lut = mp.MemoryLookupTable(data=[[p1+2*p2, p1, p2] for p2 in (0., 1.) for p1 in (0., 1., 2.)], units=[U.s, U.m, U.mm])
+
+    def test_evaluate(self):
+        self.assertEqual(self.lut.evaluate([1.*U.m, 1.*U.mm]), 3.*U.s)
+        self.assertEqual(self.lut.evaluate([2000.*U.mm, 0.*U.mm]), 2.*U.s)
+        self.assertEqual(self.lut.evaluate([1.5*U.m, 1.*U.mm]), None)
+        self.assertRaises(ValueError, self.lut.evaluate, [1.*U.m])
+
+    def test_evaluateBatch(self):
+        val, mask = self.lut.evaluateBatch([np.array([0., 1., 1.5])*U.m, 1.*U.mm], returnMask=True)
+        np.testing.assert_array_equal(val.value[:2], [2., 3.])
+        np.testing.assert_array_equal(mask, [False, False, True])
+        # plain array in table units, default value for tuples not found
+        self.lut.default_value = -1.
+        np.testing.assert_array_equal(self.lut.evaluateBatch(np.array([[2., 1.], [2., .5]])).value, [4., -1.])
+
+    def test_interpolate(self):
+        self.lut.interpolate = True
+        np.testing.assert_allclose(self.lut.evaluateBatch(np.array([[1.5, .5], [.2, .9]])).value, [2.5, 2.])
+        self.assertEqual(self.lut.evaluate([3.*U.m, 0.*U.mm]), None)
+        # scattered records: linear interpolation over triangulation
+        lut = mp.MemoryLookupTable(data=[[0., 0., 0.], [1., 1., 0.], [1., 0., 1.], [2., 1., 1.], [1., .5, .5]], units=[U.s, U.m, U.m], interpolate=True)
+        np.testing.assert_allclose(lut.evaluateBatch(np.array([[.2, .3], [.7, .9]])).value, [.5, 1.6])
+
+    def test_setData(self):
+        self.lut.evaluate([1.*U.m, 1.*U.mm])
+        self.lut._setData([[5., 1., 1.]])
+        self.assertEqual(self.lut.evaluate([1.*U.m, 1.*U.mm]), 5.*U.s)
+        self.assertRaises(ValueError, self.lut._setData, [[1., 2.], [1.]])
+
+
+if __name__ == '__main__':
+    unittest.main()
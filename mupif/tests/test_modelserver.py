@@ -197,6 +197,40 @@ class ModelServer_TestCase(unittest.TestCase):
         self.assertTrue('THIS-IS-STDOUT' in dta)
         self.assertTrue('THIS-IS-STDERR' in dta)
 
+    def test_warmPool(self):
+        cls=self.__class__
+        jobManWarm=mp.ModelServer(ns=cls.ns,appName='appWarm',workDir=cls.tmp,appClass=StdOutErrModel,maxJobs=2,warmPool=1)
+        try:
+            self.assertEqual(len(jobManWarm.idleWorkers),1)
+            time.sleep(3) # let the idle worker import everything
+            t0=time.time()
+            (retCode,jobId,port)=jobManWarm.allocateJob(user='user')
+            self.assertEqual(retCode,mp.jobmanager.JOBMAN_OK)
+            self.assertLess(time.time()-t0,2)
+            # pool was replenished
+            self.assertEqual(len(jobManWarm.idleWorkers),1)
+            mod=Pyro5.api.Proxy(jobManWarm.getStatus()[0]['uri'])
+            mod.solveStep()
+            jobManWarm.terminateJob(jobId)
+            self.assertTrue('THIS-IS-STDOUT' in open(jobManWarm.doneJobs[jobId].jobLogName).read())
+            # pipes to the job process are not kept open
+            proc=jobManWarm.doneJobs[jobId].proc
+            self.assertTrue(proc.stdin.closed and proc.stdout.closed)
+            # idle worker which died is skipped, new worker is spawned instead
+            dead=jobManWarm.idleWorkers[0]
+            dead.kill()
+            dead.wait()
+            (retCode,jobId,port)=jobManWarm.allocateJob(user='user')
+            self.assertEqual(retCode,mp.jobmanager.JOBMAN_OK)
+            self.assertTrue(dead.stdin.closed and dead.stdout.closed)
+            self.assertTrue(dead not in jobManWarm.idleWorkers)
+            jobManWarm.terminateJob(jobId)
+        finally:
+            idle=list(jobManWarm.idleWorkers)
+            jobManWarm.terminate(force=True)
+        self.assertEqual(len(jobManWarm.idleWorkers),0)
+        self.assertTrue(all(p.poll() is not None for p in idle))
+
     def test_timeout(self):
         cls=self.__class__
         jobManTime=mp.ModelServer(ns=cls.ns,appName='appTimeout',workDir=cls.tmp,appClass=TimeoutModel,maxJobs=1)
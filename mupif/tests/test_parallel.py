@@ -0,0 +1,82 @@
+import sys
+sys.path.append('../..')
+
+import unittest
+import unittest.mock
+import threading
+import os
+from mupif import *
+import mupif as mp
+import numpy as np
+
+
+class Parallel_TestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.minChunk = parallel.minChunk
+        # small chunks so that the test runs quickly
+        parallel.minChunk = 100
+
+    @classmethod
+    def tearDownClass(cls):
+        parallel.minChunk = cls.minChunk
+        parallel.shutdown()
+
+    def setUp(self):
+        m = mp.UniformRectilinearMesh(origin=(0, 0, 0), spacing=(.1, .2, .3), dims=(6, 5, 4))
+        self.mesh = mesh.UnstructuredMesh()
+        self.mesh.setupCompact(m.getVertexCoords(), *m.getCells())
+        self.points = np.random.default_rng(0).random((2000, 3))*(.5, .8, .9)
+
+    def test_locatePoints(self):
+        self.assertFalse(parallel.useParallel(2000, workers=0))
+        self.assertFalse(parallel.useParallel(150, workers=2))
+        self.assertTrue(parallel.useParallel(2000, workers=2))
+        ser = self.mesh.locatePoints(self.points, workers=0)
+        par = self.mesh.locatePoints(self.points, workers=2)
+        for a, b in zip(ser, par):
+            self.assertTrue(np.array_equal(a, b))
+        # the mesh is exported only once
+        self.assertEqual(len(parallel._exported), 1)
+        self.mesh.locatePoints(self.points, workers=2)
+        self.assertEqual(len(parallel._exported), 1)
+
+    def test_exportConcurrent(self):
+        m = mp.UniformRectilinearMesh(origin=(0, 0, 0), spacing=(.1, .1, .1), dims=(3, 3, 3))
+        um = mesh.UnstructuredMesh()
+        um.setupCompact(m.getVertexCoords(), *m.getCells())
+        # both threads miss the cache and export the mesh
+        barrier, getCellArrays, mkstemp = threading.Barrier(2), mesh.UnstructuredMesh._getCellArrays, parallel.tempfile.mkstemp
+        def _getCellArrays(self):
+            barrier.wait(5)
+            return getCellArrays(self)
+        created, fns = [], []
+        def _mkstemp(**kw):
+            created.append((ret := mkstemp(**kw))[1])
+            return ret
+        with unittest.mock.patch.object(mesh.UnstructuredMesh, '_getCellArrays', _getCellArrays), unittest.mock.patch.object(parallel.tempfile, 'mkstemp', _mkstemp):
+            tt = [threading.Thread(target=lambda: fns.append(parallel._exportMesh(um))) for i in range(2)]
+            for t in tt: t.start()
+            for t in tt: t.join()
+        # both get the same file, the other one is removed
+        try:
+            self.assertEqual(len(created), 2)
+            self.assertEqual(fns[0], fns[1])
+            self.assertEqual(parallel._exported[um.dataDigest()], fns[0])
+            self.assertEqual([os.path.exists(fn) for fn in created], [fn == fns[0] for fn in created])
+        finally: parallel.shutdown()
+
+    def test_evaluate(self):
+        f = field.Field(mesh=self.mesh, fieldID=DataID.FID_Temperature, valueType=ValueType.Scalar, fieldType=field.FieldType.FT_vertexBased, unit=U.K, value=self.mesh.getVertexCoords()[:, :1].copy())
+        ser = f.evaluate(self.points)
+        try:
+            parallel.numWorkers = 2
+            par = f.evaluate(self.points)
+        finally:
+            parallel.numWorkers = 0
+        np.testing.assert_allclose(par.value, ser.value)
+        np.testing.assert_allclose(par.value[:, 0], self.points[:, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import unittest.mock
 import mupif as mp
 import numpy as np
 import sys
@@ -6,6 +7,7 @@ import multiprocessing
 import threading
 import time
 import Pyro5.api
+import Pyro5.client
 import json
 import time, random
 import tempfile
@@ -131,6 +133,48 @@ class PyroFile_TestCase(unittest.TestCase):
         mp.PyroFile.copy(srcP,ddstP[3],compress=False)
         for i in range(4):
             self.assertEqual(C.Adata,open(aa[i],'rb').read())
+    def test_pyroFile_transfer(self):
+        C=self.__class__
+        data=os.urandom(10000)+bytes(10000)
+        a=C.tmp+'/T0'
+        open(a,'wb').write(data)
+        src=Pyro5.api.Proxy(C.daemon.register(mp.PyroFile(filename=a,mode='rb')))
+        self.assertIn('none',src.getCodecs())
+        for i,codec in enumerate(('none','zlib',None)):
+            dst=C.tmp+f'/T1{i}'
+            mp.PyroFile.transfer(src,dst,codec=codec,chunkSize=999,inFlight=3)
+            self.assertEqual(data,open(dst,'rb').read())
+        # remote destination
+        dst=C.tmp+'/T20'
+        mp.PyroFile.transfer(a,Pyro5.api.Proxy(C.daemon.register(mp.PyroFile(filename=dst,mode='wb'))),chunkSize=1000)
+        self.assertEqual(data,open(dst,'rb').read())
+        # resume interrupted transfer: correct prefix is not transferred again
+        dst=C.tmp+'/T30'
+        open(dst,'wb').write(data[:4500]+b'garbage')
+        mp.PyroFile.transfer(src,dst,chunkSize=1000,resume=True)
+        self.assertEqual(data,open(dst,'rb').read())
+        open(dst,'wb').write(b'x'*1000+data[1000:2500])
+        mp.PyroFile.transfer(src,dst,chunkSize=1000,resume=True,verify=False)
+        self.assertNotEqual(data,open(dst,'rb').read())
+        open(dst,'wb').write(b'x'*1000+data[1000:2500])
+        self.assertRaises(IOError,lambda: mp.PyroFile.transfer(src,dst,chunkSize=1000,resume=True))
+        # proxies used by transfer threads are released
+        created,init=[],Pyro5.client.Proxy.__init__
+        def _init(self,*a,**kw):
+            init(self,*a,**kw)
+            created.append(self)
+        with unittest.mock.patch.object(Pyro5.client.Proxy,'__init__',_init):
+            mp.PyroFile.transfer(src,C.tmp+'/T31',chunkSize=1000,inFlight=3)
+        self.assertTrue(created)
+        self.assertTrue(all(p._pyroConnection is None for p in created))
+        # local source opened by transfer is closed again, also on error
+        if os.path.exists('/proc/self/fd'):
+            nfd=len(os.listdir('/proc/self/fd'))
+            for i in range(5):
+                mp.PyroFile.transfer(a,Pyro5.api.Proxy(C.daemon.register(mp.PyroFile(filename=C.tmp+f'/T4{i}',mode='wb'))),chunkSize=1000)
+            open(dst,'wb').write(b'x'*1000+data[1000:2500])
+            self.assertRaises(IOError,lambda: mp.PyroFile.transfer(a,mp.PyroFile(filename=dst,mode='r+b'),chunkSize=1000,resume=True))
+            self.assertEqual(nfd,len(os.listdir('/proc/self/fd')))
     def test_pyroFile_basename(self):
         'PyroFile.getBasename()'
         C=self.__class__
@@ -165,8 +209,87 @@ class PyroTestClass(object):
         return mp.String(value='foobar',dataID=mp.DataID.ID_None)
     def getPyroProxyAsReturnValue(self,uri):
         return Pyro5.api.Proxy(uri)
+    @mp.baredata.validateCall
+    def validatedInt(self,i:int):
+        return type(i).__name__
+    def callsValidatedInt(self,i):
+        return self.validatedInt(i)
+
 
 
+@Pyro5.api.expose
+class PyroTestServer(object):
+    def __init__(self,freeJobs):
+        self.freeJobs=freeJobs
+    def getApplicationSignature(self):
+        return 'PyroTestServer'
+    def getNumberOfFreeJobs(self):
+        return self.freeJobs
+
+
+class ServerSelection_TestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import socket
+        cls.daemon=mp.pyroutil.getDaemon()
+        # hung server: accepts connections (backlog) but never answers
+        cls.hung=socket.socket()
+        cls.hung.bind(('127.0.0.1',0))
+        cls.hung.listen(10)
+        # dead server: nothing listens on the port
+        s=socket.socket()
+        s.bind(('127.0.0.1',0))
+        cls.deadPort=s.getsockname()[1]
+        s.close()
+    @classmethod
+    def tearDownClass(cls):
+        cls.hung.close()
+    def setUp(self):
+        mp.pyroutil.clearProbeCache()
+    def test_connectAppWithMetadata(self):
+        C=self.__class__
+        class FakeNS(object):
+            def __init__(self,candidates): self.candidates=candidates
+            def yplookup(self,meta_all): return self.candidates
+        free=PyroTestServer(3)
+        cand={
+            'busy':(C.daemon.register(PyroTestServer(0)),{'type:jobmanager'}),
+            'hung':(f'PYRO:obj@127.0.0.1:{C.hung.getsockname()[1]}',{'type:jobmanager'}),
+            'dead':(f'PYRO:obj@127.0.0.1:{C.deadPort}',{'type:jobmanager'}),
+            'free':(C.daemon.register(free),{'type:jobmanager'}),
+            'free1':(C.daemon.register(PyroTestServer(1)),{'type:jobmanager','foo'}),
+        }
+        probeTimeOut=mp.pyroutil.probeTimeOut
+        try:
+            mp.pyroutil.probeTimeOut=.5
+            t0=time.time()
+            probes={p.name:p for p in mp.pyroutil.probeServers(cand)}
+            self.assertLess(time.time()-t0,1.6)
+            self.assertEqual([n for n,p in probes.items() if p.alive],['busy','free','free1'])
+            self.assertEqual(probes['free'].freeJobs,3)
+            # the server with most free jobs is selected
+            app=mp.pyroutil._connectAppWithMetadata(FakeNS(cand),{'type:jobmanager'})
+            self.assertEqual(str(app._pyroUri),str(cand['free'][0]))
+            # matching optional metadata take precedence
+            app=mp.pyroutil._connectAppWithMetadata(FakeNS(cand),{'type:jobmanager'},{'foo'})
+            self.assertEqual(str(app._pyroUri),str(cand['free1'][0]))
+            # probe results are cached: the hung server does not delay the call
+            t0=time.time()
+            mp.pyroutil._connectAppWithMetadata(FakeNS(cand),{'type:jobmanager'})
+            self.assertLess(time.time()-t0,.3)
+            # free jobs are not cached
+            free.freeJobs=0
+            app=mp.pyroutil._connectAppWithMetadata(FakeNS(cand),{'type:jobmanager'})
+            self.assertEqual(str(app._pyroUri),str(cand['free1'][0]))
+            # server which disappeared while cached as alive is skipped
+            C.daemon.unregister(cand['free1'][0].object)
+            free.freeJobs=2
+            app=mp.pyroutil._connectAppWithMetadata(FakeNS(cand),{'type:jobmanager'})
+            self.assertEqual(str(app._pyroUri),str(cand['free'][0]))
+            self.assertRaises(Exception,lambda: mp.pyroutil._connectAppWithMetadata(FakeNS({k:cand[k] for k in ('hung','dead')}),{'type:jobmanager'}))
+        finally:
+            mp.pyroutil.probeTimeOut=probeTimeOut
+
 
 class MupifObject_TestCase(unittest.TestCase):
     @classmethod
@@ -199,4 +322,40 @@ class MupifObject_TestCase(unittest.TestCase):
         pro1=Pyro5.api.Proxy(uri)
         pro2=pro1.getPyroProxyAsReturnValue(uri)
         self.assertEqual(pro2.strValue().getValue(),'foobar')
+    def test_trustedMode(self):
+        C=self.__class__
+        obj=PyroTestClass()
+        pro=Pyro5.api.Proxy(C.daemon.register(obj))
+        trusted=mp.baredata.trustedMode
+        try:
+            mp.util.trustedModeOff()
+            self.assertEqual(obj.validatedInt('1'),'int')
+            self.assertEqual(pro.callsValidatedInt('1'),'int')
+            mp.util.trustedModeOn()
+            # local calls are not validated (nor coerced)
+            self.assertEqual(obj.validatedInt('1'),'str')
+            # calls through Pyro are
+            self.assertEqual(pro.validatedInt('1'),'int')
+            # but not calls made while serving them
+            self.assertEqual(pro.callsValidatedInt('1'),'str')
+        finally:
+            mp.baredata.trustedMode=trusted
+    def test_binaryArrays(self):
+        C=self.__class__
+        val=np.arange(3000.).reshape(1000,3)
+        prop=mp.Property(propID=mp.DataID.PID_Concentration,valueType=mp.ValueType.Vector,quantity=mp.Quantity(value=val,unit='m'))
+        # local dump uses lists (JSON-compatible), binary on request
+        self.assertIn('arr',prop.to_dict()['quantity']['value'])
+        dic=prop.to_dict(binaryArrays=True)
+        self.assertIn('npy',dic['quantity']['value'])
+        self.assertTrue(np.array_equal(mp.BareData.from_dict(dic).quantity.value,val))
+        self.assertTrue(np.array_equal(prop.deepcopy().quantity.value,val))
+        # object arrays can only be dumped as lists
+        self.assertIn('arr',mp.baredata.ndarray_to_dict(np.array([1,None],dtype=object)))
+        # remote copy: client announces binary support
+        self.assertFalse(mp.baredata.binaryArraysAccepted())
+        pro=Pyro5.api.Proxy(C.daemon.register(prop))
+        prop2=pro.copyRemote()
+        self.assertTrue(np.array_equal(prop2.quantity.value,val))
+        self.assertEqual(prop2.quantity.value.dtype,val.dtype)
 
@@ -119,6 +119,69 @@ class TemporalField_TestCase(unittest.TestCase):
             self.assertEqual(set(tf.timeList()), set([f.getTime() for f in self.displ]))
             tf.writeXdmf(timeUnit=au.Unit('ms'))
 
+    def test_04_cache(self):
+        with mp.SingleFileTemporalField(mode='overwrite', h5path=self.tmp+'/single-04.h5') as tf:
+            for f in self.displ:
+                tf.addField(f, userMetadata={})
+            # lookup with time tolerance
+            self.assertEqual(tf.timeMetadata(1.01*au.s, epsTime=.1*au.s)['time'], 1*au.s)
+            self.assertEqual(tf.timeMetadata(1000*au.ms), tf.timeMetadata(1*au.s))
+            self.assertEqual(tf.timeMetadata(1.5*au.s, epsTime=.1*au.s), None)
+            self.assertRaises(ValueError, lambda: tf.timeMetadata(1.5*au.s, epsTime=1*au.s))
+            f1 = tf.getField(time=1.01*au.s, epsTime=.1*au.s)
+            self.assertTrue(tf.getField(time=1*au.s) is f1)
+            # mesh is shared between fields
+            f2 = tf.getField(time=2*au.s)
+            self.assertTrue(f1.getMesh() is f2.getMesh())
+            self.assertEqual(tf.getCachedTimes(), {1*au.s, 2*au.s})
+            # cache size is bounded, least recently used fields are evicted
+            tf.cacheBytes = tf._cacheUsed+1
+            tf.getField(time=1*au.s)
+            tf.getField(time=5*au.s)
+            self.assertEqual(tf.getCachedTimes(), {1*au.s, 5*au.s})
+            tf.cacheBytes = 0
+            tf.getField(time=10*au.s)
+            self.assertEqual(tf.getCachedTimes(), {10*au.s})
+            # background loading of following time steps
+            tf.cacheBytes, tf.prefetch = 2**30, 2
+            tf.getField(time=0*au.s)
+            tf.waitPrefetch()
+            self.assertEqual(tf.getCachedTimes(), {0*au.s, 1*au.s, 2*au.s, 10*au.s})
+            self.assertEqual(tf.getField(time=2*au.s).getRecord(0), self.displ[2].getRecord(0))
+        # mesh is shared between fields after reopening, and counted only once
+        with mp.SingleFileTemporalField(mode='readonly', h5path=self.tmp+'/single-04.h5') as tf:
+            f1, f2 = tf.getField(time=1*au.s), tf.getField(time=2*au.s)
+            self.assertTrue(f1.getMesh() is f2.getMesh())
+            self.assertEqual(len(tf._meshes), 1)
+
+    def test_05_probes(self):
+        pos = np.array([(.1, .1, 0), (1., 1., 0), (2., 3., 0)])
+        with mp.SingleFileTemporalField(mode='overwrite', h5path=self.tmp+'/single-05.h5') as tf:
+            for f in self.displ:
+                tf.addField(f, userMetadata={})
+            # interpolation in time
+            v1, v2 = self.displ[1].evaluateBatch(pos), self.displ[2].evaluateBatch(pos)
+            self.assertTrue(np.allclose(tf.evaluateInterpolated(1.25*au.s, pos), .75*v1+.25*v2))
+            self.assertTrue(np.allclose(tf.evaluateInterpolated(2*au.s, pos), v2))
+            self.assertRaises(ValueError, lambda: tf.evaluateInterpolated(51*au.s, pos))
+            self.assertRaises(ValueError, lambda: tf.evaluateInterpolated(1.5*au.s, [(100., 100., 0.)]))
+            vv, mask = tf.evaluateInterpolated(1.5*au.s, [(100., 100., 0.), (.1, .1, 0.)], returnMask=True)
+            self.assertEqual(mask.tolist(), [True, False])
+            self.assertTrue(np.isnan(vv.value[0, 0]))
+            # time history at probes, points located only once (same mesh)
+            tf._probes.clear()
+            hist = list(tf.iterProbes(pos, tMin=2*au.s, tMax=20*au.s))
+            self.assertEqual([h[0] for h in hist], [t*au.s for t in (2, 5, 10, 20)])
+            for (t, v), f in zip(hist, self.displ[2:]):
+                self.assertTrue(np.allclose(v, f.evaluateBatch(pos)))
+            self.assertEqual(len(tf._probes), 1)
+        # the same after reopening: fields share the mesh, points located only once
+        with mp.SingleFileTemporalField(mode='readonly', h5path=self.tmp+'/single-05.h5') as tf:
+            for (t, v), f in zip(tf.iterProbes(pos), self.displ):
+                self.assertTrue(np.allclose(v, f.evaluateBatch(pos)))
+            self.assertTrue(np.allclose(tf.evaluateInterpolated(1.25*au.s, pos), .75*v1+.25*v2))
+            self.assertEqual(len(tf._probes), 1)
+
 
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -0,0 +1,94 @@
+import sys
+sys.path.append('../..')
+
+import unittest
+import time
+import Pyro5.api
+from mupif import *
+import mupif as mp
+
+
+@Pyro5.api.expose
+class SleepModel(model.Model):
+    """ Model which sleeps in solveStep; provides PID_Demo_Value (input+1) and records order of solved steps """
+
+    def __init__(self, name, log, sleep=.2):
+        super().__init__(metadata={'Name': name, 'ID': name})
+        self._name, self._log, self._sleep, self._input = name, log, sleep, 0.
+
+    def set(self, obj, objectID=''):
+        self._input += obj.getValue()
+
+    def get(self, objectTypeID, time=None, objectID=''):
+        return mp.ConstantProperty(value=self._input+1, propID=DataID.PID_Demo_Value, valueType=ValueType.Scalar, unit=mp.U.none, time=time)
+
+    def solveStep(self, tstep, stageID=0, runInBackground=False):
+        self._log.append(('start', self._name))
+        time.sleep(self._sleep)
+        self._log.append(('end', self._name))
+
+    def finishStep(self, tstep):
+        self._log.append(('finish', self._name))
+
+    def getApplicationSignature(self):
+        return self._name
+
+    def getAPIVersion(self):
+        return 1
+
+
+class Workflow_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.log = []
+        self.wf = workflow.Workflow(metadata={'Name': 'graph workflow', 'ID': 'graph'})
+        for n in 'ABC': self.wf.registerModel(SleepModel(n, self.log), label=n)
+        self.tstep = mp.TimeStep(time=1., dt=1., targetTime=1., unit=mp.U.s)
+
+    def test_solveStepGraph(self):
+        self.wf.addStepDependency('C', 'A', objectTypeID=DataID.PID_Demo_Value)
+        self.wf.addStepDependency('C', 'B', objectTypeID=DataID.PID_Demo_Value)
+        t0 = time.time()
+        self.wf.solveStep(self.tstep)
+        # A and B run concurrently: critical path is 2 steps, not 3
+        self.assertLess(time.time()-t0, .55)
+        self.assertEqual(set(self.log[:2]), {('start', 'A'), ('start', 'B')})
+        self.assertEqual(self.log[-2:], [('start', 'C'), ('end', 'C')])
+        self.assertEqual(self.wf.getModel('C')._input, 2.)
+        tim = self.wf.getStepTimings()
+        self.assertEqual(set(tim.keys()), {'A', 'B', 'C'})
+        self.assertGreaterEqual(tim['C']['start'], max(tim['A']['end'], tim['B']['end']))
+        self.assertGreater(tim['A']['solveStep'], .15)
+        self.assertGreater(tim['A']['get'], 0.)
+
+    def test_remote(self):
+        # models served over Pyro: each task uses its own proxy, the workflow's ones stay usable in this thread
+        daemon = mp.pyroutil.getDaemon()
+        wf = workflow.Workflow(metadata={'Name': 'graph workflow', 'ID': 'graph'})
+        local = {n: SleepModel(n, self.log, sleep=.05) for n in 'ABC'}
+        wf.registerModel(Pyro5.api.Proxy(daemon.register(local['A'])), label='A')
+        wf.registerModel(model.RemoteModel(Pyro5.api.Proxy(daemon.register(local['B']))), label='B')
+        wf.registerModel(local['C'], label='C')
+        wf.addStepDependency('B', 'A', objectTypeID=DataID.PID_Demo_Value)
+        wf.addStepDependency('C', 'B', objectTypeID=DataID.PID_Demo_Value)
+        wf.solveStep(self.tstep)
+        self.assertEqual(local['C']._input, 2.)
+        wf.finishStep(self.tstep)
+        self.assertEqual(sorted(e for e in self.log if e[0] == 'finish'), [('finish', n) for n in 'ABC'])
+        self.assertEqual(wf.getModel('A').getApplicationSignature(), 'A')
+
+    def test_errors(self):
+        self.assertRaises(KeyError, self.wf.addStepDependency, 'C', 'D')
+        self.wf.addStepDependency('B', 'A')
+        self.wf.addStepDependency('C', 'B')
+        self.assertRaises(ValueError, self.wf.addStepDependency, 'A', 'C')
+        self.assertEqual(len(self.wf.getStepDependencies()), 2)
+
+        def fail(*args, **kw): raise RuntimeError('failed')
+        self.wf.getModel('B').solveStep = fail
+        self.assertRaises(RuntimeError, self.wf.solveStep, self.tstep)
+        # C was not started after B failed
+        self.assertNotIn(('start', 'C'), self.log)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -61,6 +61,11 @@ class UniformRectilinearMesh(Mesh,HeavyConvertible):
     def getVertex(self, i):
         # assert self.dims.shape==(3,)
         return vertex.Vertex(number=i,coords=tuple(self.origin+self.i2ijk(i)*self.spacing))
+    def getVertexCoords(self):
+        'See :obj:`Mesh.getVertexCoords`. Computed directly from the grid definition.'
+        if getattr(self,'_vertexCoords',None) is None:
+            self._vertexCoords=np.array(self.origin,dtype=np.float64)+self.i2ijk(np.arange(self.getNumberOfVertices())).T*np.array(self.spacing,dtype=np.float64)
+        return self._vertexCoords
     def box_xyz2ijk(self,xyz0,xyz1):
         dims_1=self.dims-np.ones_like(self.dims)
         ijk0=np.max([np.floor(np.divide(np.array(xyz0)-self.origin,self.spacing)).astype('int'),np.zeros_like(self.dims,dtype='int')],axis=0)
@@ -104,7 +109,7 @@ class UniformRectilinearMesh(Mesh,HeavyConvertible):
             vertices=(viA,viA+1,viA+d0+1,viA+d0)
             return cell.Quad_2d_lin(mesh=self,label=i,number=i,vertices=vertices)
     def dataDigest(self) -> str:
-        return util.sha1digest([self.origin,self.spacing,self.dims])
+        return util.dataDigest([self.origin,self.spacing,self.dims])
     def copyToHeavy(self,*,h5grp):
         mhash=self.dataDigest()
         if mhash in h5grp: return h5grp[mhash]
@@ -27,6 +27,7 @@ import sys
 import pathlib
 from . import pyrolog
 from . import octree
+from . import baredata
 
 import Pyro5
 
@@ -194,15 +195,34 @@ def getVersion():
     raise RuntimeError('Unable to get version data (did you install via "pip install mupif"?).')
 
 
-def sha1digest(objs: Union[List,Generator]):
+#: hash algorithm used by :obj:`dataDigest` (and by ``dataDigest`` of meshes and fields): ``sha1`` (default), ``blake2b`` (faster, from hashlib) or ``xxh3`` (much faster non-cryptographic hash, requires the xxhash module); digests other than ``sha1`` are prefixed by the algorithm name (e.g. ``blake2b-…``), so that the algorithm is recorded wherever the digest is used as a name
+digestAlgorithm = 'sha1'
+
+
+def _digestHasher(algorithm):
     import hashlib
-    import h5py
+    if algorithm == 'sha1': return hashlib.sha1()
+    if algorithm == 'blake2b': return hashlib.blake2b(digest_size=20)
+    if algorithm == 'xxh3':
+        import xxhash
+        return xxhash.xxh3_128()
+    raise ValueError(f'Unknown digest algorithm {algorithm} (must be one of: sha1, blake2b, xxh3).')
+
+
+def dataDigest(objs: Union[List,Generator], algorithm=None):
+    """
+    Return hex digest of *objs* (str, bytes, numpy arrays, whose buffers are hashed without copying if contiguous, or files given as pathlib.Path).
+
+    :param algorithm: hash algorithm (see :obj:`digestAlgorithm`, which is used if not given)
+    :rtype: str
+    """
     import numpy as np
-    H = hashlib.sha1()
+    if algorithm is None: algorithm = digestAlgorithm
+    H = _digestHasher(algorithm)
     for o in objs:
         if isinstance(o, str): H.update(o.encode('utf-8'))
         elif isinstance(o, bytes): H.update(o)
-        elif isinstance(o, np.ndarray): H.update(o.view(np.uint8))
+        elif isinstance(o, np.ndarray): H.update(np.ascontiguousarray(o).view(np.uint8))
         elif isinstance(o, pathlib.Path):
             with open(o, 'rb') as f:
                 while True:
@@ -212,7 +232,11 @@ def sha1digest(objs: Union[List,Generator]):
                     H.update(chunk)
         else:
             raise ValueError(f'Unhandled type for digest: {o.__class__.__module__}.{o.__class__.__name__}')
-    return H.hexdigest()
+    return H.hexdigest() if algorithm == 'sha1' else f'{algorithm}-{H.hexdigest()}'
+
+
+def sha1digest(objs: Union[List,Generator]):
+    return dataDigest(objs, algorithm='sha1')
 
 
 def accelOn():
@@ -235,3 +259,17 @@ def accelOn():
 def accelOff():
     # revert any accelerations applied in accelOn
     octree.Octant = octree.Octant_py
+
+
+def trustedModeOn():
+    """
+    Skip argument validation of frequently called methods for local calls, see :obj:`mupif.baredata.trustedMode`.
+    """
+    baredata.trustedMode = True
+
+
+def trustedModeOff():
+    """
+    Validate arguments of all calls (the default, unless the ``MUPIF_TRUSTED`` environment variable is set).
+    """
+    baredata.trustedMode = False
@@ -29,6 +29,9 @@ import logging
 import importlib
 import pydantic
 import time as timeTime
+import threading
+import collections
+import concurrent.futures
 
 from . import model
 from . import timestep
@@ -41,6 +44,16 @@ from .meta import WorkflowMeta
 
 log = logging.getLogger()
 
+#: Data dependency between child models within one time step, see :obj:`Workflow.addStepDependency`: before *target* solves the step, object *objectTypeID* (with *objectID*) is obtained from *source* (after *source* solved the step) and set to *target* (as *targetObjectID*, or *objectID* if not given); with *objectTypeID* None, only the order is prescribed.
+StepDependency = collections.namedtuple('StepDependency', 'target source objectTypeID objectID targetObjectID', defaults=(None, '', None))
+
+
+def _taskModel(m):
+    'Return object through which the calling (worker) thread calls model *m*: a new Pyro proxy for remote models (proxies are owned by one thread, and that of the caller is left alone), the model itself otherwise.'
+    if isinstance(m, model.RemoteModel): m = m._decoratee
+    if isinstance(m, Pyro5.api.Proxy): return copy.copy(m)
+    return m
+
 
 workflow_input_targetTime_metadata = {
     'Type': 'mupif.Property', 'Type_ID': 'mupif.DataID.PID_Time', 'Name': 'targetTime', 'Description': 'Target time value',
@@ -76,6 +89,8 @@ class Workflow(model.Model):
         self._jobmans = {}
         self._exec_targetTime = 1.*units.U.s
         self._exec_dt = None
+        self._stepDependencies = []
+        self._stepTimings = {}
 
     def _generateNewModelName(self, base='m'):
         i = 0
@@ -250,6 +265,129 @@ class Workflow(model.Model):
         self.setMetadata('Status', 'Finished')
         self.setMetadata('Date_time_end', timeTime.strftime("%Y-%m-%d %H:%M:%S", timeTime.gmtime()))
 
+    def solveStep(self, tstep, stageID=0, runInBackground=False):
+        """
+        Solves the problem for given time step. If step dependencies were declared (see :obj:`addStepDependency`), child models are stepped by :obj:`solveStepGraph`; otherwise derived classes should override this method.
+
+        :param timestep.TimeStep tstep: Solution step
+        :param int stageID: optional argument identifying solution stage (default 0) for multi-stage problems
+        :param bool runInBackground: optional argument, default False (unused with step dependencies)
+        """
+        if self._stepDependencies:
+            self.solveStepGraph(tstep, stageID=stageID)
+            return
+        super().solveStep(tstep, stageID=stageID, runInBackground=runInBackground)
+
+    def addStepDependency(self, target, source, objectTypeID=None, objectID='', targetObjectID=None):
+        """
+        Declare that, in every time step solved by :obj:`solveStepGraph`, the model labeled *target* needs data from model labeled *source*: after *source* solves the step, ``source.get(objectTypeID,time,objectID)`` is passed to ``target.set(obj,targetObjectID)`` before *target* solves the step. Models without (transitive) dependency between them solve the step concurrently.
+
+        :param str target: label of the receiving model
+        :param str source: label of the providing model
+        :param DataID objectTypeID: object to transfer; if None, *target* only solves the step after *source*
+        :param str objectID: object ID passed to *source*'s get
+        :param str targetObjectID: object ID passed to *target*'s set (*objectID* if not given)
+        """
+        for label in (target, source):
+            if label not in self._models: raise KeyError(f'No model labeled "{label}".')
+        if target == source: raise ValueError(f'Model "{target}" cannot depend on itself.')
+        self._stepDependencies.append(StepDependency(target=target, source=source, objectTypeID=objectTypeID, objectID=objectID, targetObjectID=targetObjectID))
+        # fail early on cycles
+        try: self._stepOrder()
+        except ValueError:
+            self._stepDependencies.pop()
+            raise
+
+    def getStepDependencies(self):
+        """
+        :return: declared step dependencies
+        :rtype: list of StepDependency
+        """
+        return list(self._stepDependencies)
+
+    def _stepOrder(self):
+        'Return model labels in dependency order; raises ValueError if dependencies are cyclic.'
+        labels = list(self._models.keys())
+        sources = {l: set(d.source for d in self._stepDependencies if d.target == l) for l in labels}
+        ret, done = [], set()
+        while len(ret) < len(labels):
+            ready = [l for l in labels if l not in done and sources[l] <= done]
+            if not ready: raise ValueError(f'Cyclic step dependencies among models: {", ".join(l for l in labels if l not in done)}.')
+            ret += ready
+            done.update(ready)
+        return ret
+
+    def solveStepGraph(self, tstep, stageID=0, maxWorkers=None, finishStep=False):
+        """
+        Solve the time step with all child models, honoring dependencies declared via :obj:`addStepDependency`. Each model is a task (data transfers from its sources, then its solveStep), which is started in a thread pool as soon as all its sources are finished; calls to one model are serialized, and each task calls remote (Pyro) models through its own proxies. The time step thus takes as long as the critical path of the dependency graph, rather than the sum over all models.
+
+        Time spent in each call is recorded, see :obj:`getStepTimings`. If any task fails, running tasks are waited for, others are not started and the exception is re-raised.
+
+        :param timestep.TimeStep tstep: Solution step
+        :param int stageID: passed to the models' solveStep
+        :param int maxWorkers: maximum number of concurrent tasks (number of models if not given)
+        :param bool finishStep: also call finishStep of each model at the end of its task (normally, :obj:`solve` calls :obj:`finishStep` for all models after the step)
+        """
+        self._stepOrder()  # check for cycles
+        labels = list(self._models.keys())
+        deps = {l: [d for d in self._stepDependencies if d.target == l] for l in labels}
+        locks = {l: threading.Lock() for l in labels}
+        timings = {l: {'start': None, 'end': None, 'get': 0., 'set': 0., 'solveStep': 0., 'finishStep': 0.} for l in labels}
+        t0 = timeTime.time()
+
+        def _task(label):
+            # models as seen from this thread
+            models = {}
+
+            def _call(label, what, fn):
+                if label not in models: models[label] = _taskModel(self._models[label])
+                with locks[label]:
+                    t = timeTime.time()
+                    try: return fn(models[label])
+                    finally: timings[label][what] += timeTime.time()-t
+
+            timings[label]['start'] = timeTime.time()-t0
+            try:
+                for d in deps[label]:
+                    if d.objectTypeID is None: continue
+                    obj = _call(d.source, 'get', lambda m, d=d: m.get(objectTypeID=d.objectTypeID, time=tstep.getTime(), objectID=d.objectID))
+                    _call(label, 'set', lambda m, d=d: m.set(obj, objectID=(d.objectID if d.targetObjectID is None else d.targetObjectID)))
+                _call(label, 'solveStep', lambda m: m.solveStep(tstep, stageID=stageID))
+                if finishStep: _call(label, 'finishStep', lambda m: m.finishStep(tstep))
+            finally:
+                for m in models.values():
+                    if isinstance(m, Pyro5.api.Proxy): m._pyroRelease()
+            timings[label]['end'] = timeTime.time()-t0
+
+        waiting = {l: set(d.source for d in deps[l]) for l in labels}
+        done, error = set(), None
+        with concurrent.futures.ThreadPoolExecutor(max_workers=(maxWorkers or max(len(labels), 1))) as pool:
+            running = {}
+            while True:
+                if error is None:
+                    for l in [l for l, w in waiting.items() if w <= done]:
+                        del waiting[l]
+                        running[pool.submit(_task, l)] = l
+                if not running: break
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for fut in finished:
+                    label = running.pop(fut)
+                    if (exc := fut.exception()) is not None:
+                        log.error(f'Model "{label}" failed in time step {tstep.getNumber()}: {exc}')
+                        if error is None: error = exc
+                    else: done.add(label)
+        self._stepTimings = timings
+        if error is not None: raise error
+        log.debug(f'Step {tstep.getNumber()} solved in {timeTime.time()-t0:g} s: '+', '.join(f'{l} {t["start"]:g}…{t["end"]:g} s' for l, t in timings.items()))
+
+    def getStepTimings(self):
+        """
+        Return timing of the last step solved by :obj:`solveStepGraph`, for each model label: *start* and *end* of its task (relative to the start of the step, in seconds; None if it did not run) and total time spent in its *get* (serving other models), *set*, *solveStep* and *finishStep* calls.
+
+        :rtype: dict
+        """
+        return copy.deepcopy(self._stepTimings)
+
     def set(self, obj, objectID=""):
         if obj.isInstance(Property):
             if obj.getPropertyID() == DataID.PID_Time:
@@ -362,14 +500,14 @@ class Workflow(model.Model):
         dependencies = []
         for key_name, _model in self.getDictOfModels().items():
             if isinstance(_model, (model.Model, Workflow, model.RemoteModel)):
+                # single (remote) call for all metadata needed
+                md = _model.getMetadataMany(['Name', 'ID', 'Version_date', 'Solver.Version_date'], default='')
                 # Temporary fix due to compatibility
-                if not _model.hasMetadata('Version_date') and not isinstance(model, Workflow):
-                    if _model.hasMetadata('Solver.Version_date'):
-                        _model.setMetadata('Version_date', _model.getMetadata('Solver.Version_date'))
+                if md['Version_date'] == '' and md['Solver.Version_date'] != '':
+                    _model.setMetadata('Version_date', md['Solver.Version_date'])
+                    md['Version_date'] = md['Solver.Version_date']
 
-                md_name = _model.getMetadata('Name') if _model.hasMetadata('Name') else ''
-                md_id = _model.getMetadata('ID') if _model.hasMetadata('ID') else ''
-                md_ver = _model.getMetadata('Version_date') if _model.hasMetadata('Version_date') else ''
+                md_name, md_id, md_ver = md['Name'], md['ID'], md['Version_date']
 
                 m_r_id = {
                     'Label': str(key_name),
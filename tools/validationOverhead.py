@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of per-call overhead of argument validation in frequently called methods, with trusted mode (see mupif.baredata.trustedMode) off and on.
+
+Usage: validationOverhead.py [-n number]
+"""
+import sys
+sys.path.append('../..')  # Path to mupif if installed locally
+
+import argparse
+import timeit
+import numpy as np
+import Pyro5.api
+import mupif as mp
+
+
+@Pyro5.api.expose
+class ServerSide(object):
+    'Object served over Pyro, which calls validated methods internally (as a model does when serving a remote call).'
+    def __init__(self):
+        self.tree = mp.Octree((0., 0., 0.), 1., (1, 1, 1))
+        self.bb = mp.BBox((.45, .45, .45), (.55, .55, .55))
+
+    def getItemsInBBox(self, number):
+        for i in range(number): self.tree.getItemsInBBox(self.bb)
+
+
+def cases():
+    m = mp.UniformRectilinearMesh(origin=(0, 0, 0), spacing=(.1, .1, .1), dims=(11, 11, 11))
+    mesh = mp.UnstructuredMesh()
+    mesh.setupCompact(m.getVertexCoords(), *m.getCells())
+    f = mp.Field(mesh=mesh, fieldID=mp.DataID.FID_Temperature, valueType=mp.ValueType.Scalar, fieldType=mp.FieldType.FT_vertexBased, unit=mp.U.K, value=mesh.getVertexCoords()[:, :1].copy())
+    tree = mp.Octree((0., 0., 0.), 1., (1, 1, 1))
+    bb = mp.BBox((.45, .45, .45), (.55, .55, .55))
+    wm = mp.WithMetadata()
+    arr = np.random.default_rng(0).random((2000, 3))
+    pts = [tuple(p) for p in arr.tolist()]
+    server = Pyro5.api.Proxy(mp.pyroutil.getDaemon().register(ServerSide()))
+    # warm up caches (localizer etc.)
+    f.evaluate(arr)
+    return {
+        'Octree.getItemsInBBox': lambda: tree.getItemsInBBox(bb),
+        'Octree.getItemsInBBox (server side, 1000×)': lambda: server.getItemsInBBox(1000),
+        'WithMetadata._updateMetadata': lambda: wm._updateMetadata(dictionary={'Name': 'x', 'Solver': {'Language': 'Python3'}}),
+        'Field.evaluate (single point)': lambda: f.evaluate((.5, .5, .5)),
+        'Field.evaluate (2000 points, array)': lambda: f.evaluate(arr),
+        'Field.evaluate (2000 points, list of tuples)': lambda: f.evaluate(pts),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('-n', '--number', type=int, default=20, help='number of calls per measurement')
+    args = parser.parse_args()
+    print(f'{"method":48s} {"validated":>12s} {"trusted":>12s}')
+    for name, fn in cases().items():
+        res = []
+        for trusted in (False, True):
+            mp.baredata.trustedMode = trusted
+            res.append(min(timeit.repeat(fn, number=args.number, repeat=3))/args.number)
+        mp.baredata.trustedMode = False
+        print(f'{name:48s} {res[0]*1e6:9.1f} us {res[1]*1e6:9.1f} us')